@@ -0,0 +1,228 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# body_registry.py
+# This module defines a columnar store for the per-body quantities of a SimObjectDict.
+# Each field is one NumPy array with a row per body, and the rows are kept dense and in the
+# order the bodies were added, which is also the order of the dict and of the StateRing.
+# Each SimBody keeps its _state as a view into its row of the state column, so that bodies
+# propagating themselves write straight into the registry, and bulk readers take whole columns.
+import numpy as np
+
+DEF_REG_CAPACITY = 16       # initial number of rows, doubled whenever it runs out
+
+
+def depth_levels(parent):
+    """
+        Group the rows of a body tree by their depth, so that every parent comes in an
+        earlier group than its children.
+
+    Parameters
+    ----------
+    parent      : np.ndarray(N,)    the row of the parent of each row, -1 for a root
+
+    Returns
+    -------
+    list of np.ndarray  : the rows at depth 0 (the roots), depth 1, and so on
+    """
+    done = parent < 0
+    levels = [np.nonzero(done)[0]]
+    while not np.all(done):
+        ready = ~done & done[parent]
+        if not np.any(ready):
+            raise ValueError(f'>>>ERROR: the parent rows {parent} do not form a tree.')
+
+        levels.append(np.nonzero(ready)[0])
+        done |= ready
+
+    return levels
+
+
+def compose_positions(rel_pos, parent, levels, out=None):
+    """
+        Compose parent-relative positions into positions relative to the root, one vectorized
+        add per level of the tree. The roots themselves are placed at the origin.
+
+    Parameters
+    ----------
+    rel_pos     : np.ndarray(N, 3)  the position of each row relative to its parent
+    parent      : np.ndarray(N,)    the row of the parent of each row, -1 for a root
+    levels      : list              the rows grouped by depth, see depth_levels
+    out         : np.ndarray(N, 3)  where to put the result, allocated if not given
+
+    Returns
+    -------
+    np.ndarray(N, 3)    : the position of each row relative to its root
+    """
+    if out is None:
+        out = np.empty_like(rel_pos)
+
+    out[levels[0]] = 0.0
+    for idx in levels[1:]:
+        out[idx] = rel_pos[idx] + out[parent[idx]]
+
+    return out
+
+
+class BodyRegistry:
+    """
+        One array per body field, indexed by the row of each body.
+        The row of a body only changes when a body before it is removed.
+    """
+    def __init__(self, capacity=DEF_REG_CAPACITY):
+        self._bodies = []           # the SimBody of each row
+        self._index  = {}           # {body name: row}
+        self._levels = None         # rows grouped by depth in the tree, None when stale
+        self._pos_ok = False        # whether the composed positions match the states
+        self._alloc(max(1, capacity))
+
+    def _alloc(self, capacity):
+        """ Allocate the columns with room for capacity rows, keeping the rows in use. """
+        count = len(self._bodies)
+        cols = dict(state=np.zeros((capacity, 3, 3), dtype=np.float64),
+                    radius=np.zeros((capacity, 3), dtype=np.float64),
+                    parent=np.full((capacity,), -1, dtype=np.intp),
+                    pos=np.zeros((capacity, 3), dtype=np.float64),
+                    )
+        if count:
+            for key, col in cols.items():
+                col[:count] = getattr(self, '_' + key)[:count]
+
+        self._state, self._radius, self._parent = cols['state'], cols['radius'], cols['parent']
+        self._pos = cols['pos']
+        self._capacity = capacity
+        self._bind(0)
+
+    def _bind(self, start):
+        """ Point the state of every body from row start onwards at its row. """
+        for row in range(start, len(self._bodies)):
+            sb = self._bodies[row]
+            sb._state = self._state[row]
+            sb._row = row
+            sb._registry = self
+            self._index[sb.name] = row
+
+        self._levels = None
+        self._pos_ok = False
+
+    def add(self, sb):
+        """
+            Give a SimBody the next row, copying in whatever state it already has.
+
+        Parameters
+        ----------
+        sb          : SimBody   the body to add
+
+        Returns
+        -------
+        int         : the row of the body
+        """
+        if sb.name in self._index:
+            raise ValueError(f'>>>ERROR: {sb.name} is already registered.')
+
+        if len(self._bodies) == self._capacity:
+            self._alloc(2 * self._capacity)
+
+        row = len(self._bodies)
+        if np.shape(sb.state) == (3, 3):
+            self._state[row] = sb.state
+        else:
+            self._state[row] = 0.0
+        self._radius[row] = [r.to_value(sb.dist_unit) for r in sb.radius]
+        self._parent[row] = -1
+        self._bodies.append(sb)
+        self._bind(row)
+
+        return row
+
+    def remove(self, name):
+        """ Drop the row of a body, moving the rows after it up by one. """
+        row = self._index.pop(name)
+        count = len(self._bodies)
+        sb = self._bodies.pop(row)
+        sb._state = self._state[row].copy()         # the body keeps its last state
+        sb._row = None
+        sb._registry = None
+        for col in (self._state, self._radius, self._parent):
+            col[row:count - 1] = col[row + 1:count]
+
+        moved = self._parent[:count - 1]
+        moved[moved == row] = -1
+        moved[moved > row] -= 1
+        self._bind(row)
+
+    def set_parents(self, parent_names):
+        """
+            Record the row of the parent of each body.
+
+        Parameters
+        ----------
+        parent_names    : dict      {body name: parent name, or None for the primary}
+        """
+        for name, parent in parent_names.items():
+            self._parent[self._index[name]] = self._index.get(parent, -1)
+
+        self._levels = None
+        self._pos_ok = False
+
+    def invalidate_pos(self):
+        """ Mark the composed positions stale after any state has changed. """
+        self._pos_ok = False
+
+    def set_radius(self, sb):
+        """ Copy the radii of a body into its row after they have changed. """
+        self._radius[self._index[sb.name]] = [r.to_value(sb.dist_unit) for r in sb.radius]
+
+    def row(self, name):
+        return self._index[name]
+
+    def __len__(self):
+        return len(self._bodies)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    '''===== PROPERTIES ==========================================================================================='''
+
+    @property
+    def names(self):
+        return tuple(sb.name for sb in self._bodies)
+
+    @property
+    def state(self):
+        """ The (N, 3, 3) states of the bodies, a view into the registry. """
+        return self._state[:len(self._bodies)]
+
+    @property
+    def radius(self):
+        """ The (N, 3) radii (R, R_mean, R_polar) of the bodies in their dist_unit. """
+        return self._radius[:len(self._bodies)]
+
+    @property
+    def parent(self):
+        """ The row of the parent of each body, -1 for the primary. """
+        return self._parent[:len(self._bodies)]
+
+    @property
+    def levels(self):
+        if self._levels is None:
+            self._levels = depth_levels(self.parent)
+
+        return self._levels
+
+    @property
+    def pos(self):
+        """ The (N, 3) positions of the bodies relative to the primary, composed once
+            after each change of the states and cached until the next one.
+        """
+        count = len(self._bodies)
+        if not self._pos_ok:
+            compose_positions(self._state[:count, 0], self.parent, self.levels, out=self._pos[:count])
+            self._pos_ok = True
+
+        return self._pos[:count]
@@ -10,7 +10,7 @@
 
 # This module defines a "controller" class that is responsible for directing the operation of
 # he "model" and "viewer" class instances in the simulation
-from model_proc import ModelProcess
+from model_proc import ModelCommand, ModelProcess
 
 
 class SimController:
@@ -35,9 +35,9 @@ class SimController:
         self._model = None
         self._viewer = None
 
-    def generate_model(self, sim_data=None):
+    def generate_model(self, sim_data=None, tick_rate=None):
         """
-            This method creates an instance of ModelProcess,
+            This method creates an instance of ModelProcess and starts it,
             returns the Model Process.
         """
         # if no sim_data given, generate it
@@ -45,7 +45,34 @@ class SimController:
             from datastore import SystemDataStore
             sim_data = SystemDataStore()
 
+        kwargs = {} if tick_rate is None else {'tick_rate': tick_rate}
         self._model = ModelProcess(self._command_q,
                                    self._respond_q,
                                    # sim_data
-                                   )
+                                   **kwargs)
+        self._model.start()
+
+        return self._model
+
+    def send_command(self, op, *args, req_id=None):
+        """
+            Put a command on the queue to the model. The reply arrives on the response queue.
+        """
+        self._command_q.put(ModelCommand(op, args, req_id))
+
+    @property
+    def model_alive(self):
+        """ Whether the model process has been started and is still running. """
+        return self._model is not None and self._model.is_alive()
+
+    def shutdown_model(self, timeout=5.0):
+        """
+            Ask the model process to finish and wait for it to exit.
+        """
+        if self._model is not None and self._model.is_alive():
+            self.send_command('shutdown')
+            self._model.join(timeout)
+            if self._model.is_alive():
+                self._model.terminate()
+
+        self._model = None
@@ -17,12 +17,11 @@
 #
 #
 # x
-import logging
-import logging.config
+import hashlib
 import os
+import pickle
 import sys
 
-import autologging
 from astropy.time import Time
 from pathlib2 import Path
 from PIL import Image
@@ -35,22 +34,22 @@ from poliastro.frames.fixed import MoonFixed as LunaFixed
 from pyquaternion import Quaternion
 from vispy.geometry.meshdata import MeshData
 
+from sim_logging import get_logger
+
 # from viz_functs import get_tex_data
 
 P = Path("c:")
 SNS_SOURCE_PATH = P / '_Projects' / 'sns_dev' / 'src'  # "c:\\_Projects\\sns2\\src\\"
 os.chdir(SNS_SOURCE_PATH)
 
-# logging.basicConfig(filename=SNS_SOURCE_PATH / "../logs/sns_defs.log",
-#                     level=logging.ERROR,
-#                     format="%(funcName)s:\t%(levelname)s:%(asctime)s:\t%(message)s",
-#                     )
+_log = get_logger(__name__)
 
 #   Here's a few dreadful global variables
 DEF_UNITS = u.km
 DEF_EPOCH0 = J2000_TDB
 DEF_TEX_FNAME = P / "../resources/textures/2k_5earth_daymap.png"
-PICKL_FNAME = P / "_data_store.pkl"
+STORE_FNAME = SNS_SOURCE_PATH / "_data_store.pkl"
+STORE_SCHEMA = 2        # bump whenever the layout of the stored dict changes
 vec_type = type(np.zeros((3,), dtype=np.float64))
 DEF_CAM_STATE = {'center': (-8.0e+08, 0.0, 0.0),
                  'scale_factor': 0.5e+08,
@@ -83,27 +82,38 @@ class SystemDataStore:
         self._datastore  = self._setup_datastore()
 
     def _setup_datastore(self):
-        # attempt to read pickle file
-        # TODO:: FIX THIS!! I erased .pkl file, yet the code indicated it loaded data from disk...
-        if PICKL_FNAME.exists():
-            with open(PICKL_FNAME, 'rb') as f:
-                print("Loaded existing pickle file...")
-                return pickle.load(f)
-
-        # if the file doesn't exist, generate the data
-        else:
-            print("Existing pickle file not found. Generating a new one...")
-            # attempt to write pickle file
+        """ Read the stored body metadata if it was written by this schema from the same sources,
+            otherwise generate it and store it again. The store never holds texture images,
+            only TextureHandles that decode their file on first use.
+        """
+        src_hash = source_hash()
+        if STORE_FNAME.exists():
             try:
-                _data = self._generate_datastore()
-                with open("_data_store.pkl", 'wb') as f:
-                    pickle.dump(_data, f)
-                    print("New pickle file created...")
+                with open(STORE_FNAME, 'rb') as f:
+                    stored = pickle.load(f)
+                if stored.get('schema') == STORE_SCHEMA and stored.get('source_hash') == src_hash:
+                    _log.info('loaded the datastore file %s', STORE_FNAME)
+                    self._body_names = stored['data']['BODY_NAMES']
+                    return stored['data']
+
+                _log.info('the datastore file is out of date, generating a new one')
+
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError) as err:
+                _log.warning('could not read the datastore file %s: %s', STORE_FNAME, err)
+
+        else:
+            _log.info('no datastore file found, generating a new one')
 
-                return _data
+        _data = self._generate_datastore()
+        try:
+            with open(STORE_FNAME, 'wb') as f:
+                pickle.dump(dict(schema=STORE_SCHEMA, source_hash=src_hash, data=_data), f)
+                _log.info('wrote a new datastore file %s', STORE_FNAME)
 
-            except IOError:
-                print("Could not write pickle file...")
+        except OSError as err:
+            _log.warning('could not write the datastore file %s: %s', STORE_FNAME, err)
+
+        return _data
 
     def _generate_datastore(self):
         DEF_EPOCH = DEF_EPOCH0  # default epoch
@@ -256,7 +266,7 @@ class SystemDataStore:
             _body = _body_set[idx]
             _bod_prnt = _body.parent
 
-            logging.debug(f">LOADING STATIC DATA for {str(_bod_name)}")
+            _log.debug(">LOADING STATIC DATA for %s", _bod_name)
 
             # configure texture data
             try:
@@ -264,9 +274,9 @@ class SystemDataStore:
             except IndexError:
                 _tex_fname = _tex_path + _def_tex_fname
 
-            # the textures should be loaded later on
-            _tex_dat_set.update({_bod_name: get_texture_data(fname=_tex_fname)})
-            logging.debug(f"_tex_dat_set[{str(idx)}] = {str(_tex_fname)}")
+            # the textures are only decoded when first used
+            _tex_dat_set.update({_bod_name: TextureHandle(_tex_fname)})
+            _log.debug("_tex_dat_set[%s] = %s", idx, _tex_fname)
 
             # configure radius data
             if _body.parent is None:
@@ -306,12 +316,11 @@ class SystemDataStore:
                               )
             _vizz_params.update({_bod_name: _vizz_data})
 
-            # try this one? (All paramters for a body under its name key)
-            _body_params.update({_bod_name: [_body_data, _vizz_params]})
+            _body_params.update({_bod_name: _body_data})
 
             # configure the body type
-            if _body_data[0]['body_type'] not in _type_count.keys():  # identify types of bodies
-                _type_count[_body_data[0]['body_type']] = 0
+            if _body_data['body_type'] not in _type_count.keys():  # identify types of bodies
+                _type_count[_body_data['body_type']] = 0
             _type_count[_body_types[_type_set[idx]]] += 1  # count members of each type
             idx += 1
             _body_count += 1
@@ -328,11 +337,11 @@ class SystemDataStore:
             len(_tex_dat_set.keys()),
             len(_tex_fnames),
         ]
-        print("Check sets = ", _check_sets)
+        _log.debug('check sets: %s', _check_sets)
         assert _check_sets == ([_body_count, ] * (len(_check_sets) - 1) + [100, ])
-        print("\t>>>check sets check out!")
-        logging.debug("STATIC DATA has been loaded and verified...")
-        logging.debug("ALL data for the system have been collected...!")
+        _log.debug('check sets check out')
+        _log.debug("STATIC DATA has been loaded and verified...")
+        _log.debug("ALL data for the system have been collected...!")
         # compile all the data into a master dict structure
         return dict(DFLT_EPOCH=DEF_EPOCH,
                     SYS_PARAMS=SYS_PARAMS,
@@ -344,7 +353,7 @@ class SystemDataStore:
                     COLOR_DATA=_colorset_rgb,
                     TYPE_COUNT=_type_count,
                     BODY_PARAM=_body_params,
-                    # VIZZ_PARAM=_vizz_params,
+                    VIZZ_PARAM=_vizz_params,
                     )
 
     """ ---------------------  PROPERTIES  ---------------------------------------- """
@@ -472,22 +481,75 @@ def to_rpy_str(quat):
 
 def get_texture_data(fname=DEF_TEX_FNAME):
     with Image.open(fname) as im:
-        print(fname, im.format, f"{im.size}x{im.mode}")
+        _log.debug('%s %s %sx%s', fname, im.format, im.size, im.mode)
         return im.copy()
 
 
+class TextureHandle:
+    """ A texture file that is decoded the first time its image is asked for.
+        Only the file name is pickled, so handles are cheap to store and to send between processes.
+    """
+    def __init__(self, fname=DEF_TEX_FNAME):
+        self._fname = str(fname)
+        self._image = None
+
+    def __getstate__(self):
+        return dict(_fname=self._fname, _image=None)
+
+    def release(self):
+        """ Drop the decoded image; it is decoded again on the next use. """
+        self._image = None
+
+    @property
+    def fname(self):
+        return self._fname
+
+    @property
+    def loaded(self):
+        return self._image is not None
+
+    @property
+    def data(self):
+        if self._image is None:
+            self._image = get_texture_data(self._fname)
+        return self._image
+
+
+def resolve_texture(tex):
+    """ The image of a texture given either as a TextureHandle or as image data. """
+    if isinstance(tex, TextureHandle):
+        return tex.data
+    return tex
+
+
+def source_hash(tex_path="../resources/textures/"):
+    """ A hash of this module and of the texture files it lists, which the stored datastore must match. """
+    h = hashlib.sha1()
+    with open(__file__, 'rb') as f:
+        h.update(f.read())
+    if os.path.isdir(tex_path):
+        for fname in sorted(os.listdir(tex_path)):
+            st = os.stat(os.path.join(tex_path, fname))
+            h.update(f'{fname}:{st.st_size}:{st.st_mtime_ns}'.encode())
+
+    return h.hexdigest()
+
+
 def toTD(epoch=None):
     """
         This function converts an epoch into julian date since epoch and
     Parameters
     ----------
-    epoch
+    epoch       : Time or float     the epoch, or its TDB Julian date
 
     Returns
     -------
 
     """
-    d = (epoch - J2000_TDB).jd
+    if type(epoch) == Time:
+        d = (epoch - J2000_TDB).jd
+    else:
+        d = epoch - J2000_TDB.jd
     T = d / 36525
     return dict(T=T, d=d)
 
@@ -533,95 +595,110 @@ def get_size(obj, seen=None):
     return size
 
 
-def _latitude(rows=4, cols=8, radius=1, offset=False):
-    verts = np.empty((rows + 1, cols, 3), dtype=np.float32)
+def _radii3(radius):
+    """ Three plain floats from a radius given as one value or as three, with or without units. """
+    if np.ndim(radius) == 0:
+        radius = (radius,) * 3
+    return np.array([getattr(r, 'value', r) for r in radius], dtype=np.float64)
 
-    # compute vertices
-    phi = (np.arange(rows + 1) * np.pi / rows).reshape(rows + 1, 1)
-    s = radius * np.sin(phi)
-    verts[..., 2] = radius * np.cos(phi)
-    th = ((np.arange(cols) * 2 * np.pi / cols).reshape(1, cols))
-    if offset:
-        # rotate each row by 1/2 column
-        th = th + ((np.pi / cols) * np.arange(rows + 1).reshape(rows + 1, 1))
-    verts[..., 0] = s * np.cos(th)
-    verts[..., 1] = s * np.sin(th)
-    # remove redundant vertices from top and bottom
-    verts = verts.reshape((rows + 1) * cols, 3)[cols - 1:-(cols - 1)]
-
-    # compute faces
-    faces = np.empty((rows * cols * 2, 3), dtype=np.uint32)
-    rowtemplate1 = (((np.arange(cols).reshape(cols, 1) +
-                      np.array([[1, 0, 0]])) % cols) +
-                    np.array([[0, 0, cols]]))
-    rowtemplate2 = (((np.arange(cols).reshape(cols, 1) +
-                      np.array([[1, 0, 1]])) % cols) +
-                    np.array([[0, cols, cols]]))
-    for row in range(rows):
-        start = row * cols * 2
-        faces[start:start + cols] = rowtemplate1 + row * cols
-        faces[start + cols:start + 2 * cols] = rowtemplate2 + row * cols
-    # cut off zero-area triangles at top and bottom
-    faces = faces[cols:-cols]
-
-    # adjust for redundant vertices that were removed from top and bottom
-    vmin = cols - 1
-    faces[faces < vmin] = vmin
-    faces -= vmin
-    vmax = verts.shape[0] - 1
-    faces[faces > vmax] = vmax
-    return MeshData(vertices=verts, faces=faces)
 
+def axis_radii(rad_set):
+    """ The semi-axes along x, y and z of a body from its radius set (R, R_mean, R_polar):
+        the equatorial radius R along x and y and R_polar along z. One value is a sphere.
+    """
+    return _radii3(rad_set)[[0, 0, 2]]
 
-def _oblate_sphere(rows=4, cols=None, radius=(1200 * u.km,) * 3, offset=False):
-    verts = np.empty((rows + 1, cols + 1, 3), dtype=np.float32)
-    tcrds = np.empty((rows + 1, cols + 1, 2), dtype=np.float32)
-    norms = np.linalg.norm(verts)
-
-    # compute vertices
-    phi = (np.arange(rows + 1) * np.pi / rows).reshape(rows + 1, 1)
-    s = radius[0] * np.sin(phi)
-    verts[..., 2] = radius[2] * np.cos(phi)
-    th = ((np.arange(cols + 1) * 2 * np.pi / cols).reshape(1, cols + 1))
-    # if offset:
-    #     # rotate each row by 1/2 column
-    #     th = th + ((np.pi / cols) * np.arange(rows+1).reshape(rows+1, 1))
-    verts[..., 0] = s * np.cos(th)
-    verts[..., 1] = s * np.sin(th)
-    tcrds[..., 0] = th / (2 * np.pi)
-    tcrds[..., 1] = 1 - phi / np.pi
-    # remove redundant vertices from top and bottom
-    verts = verts.reshape((rows + 1) * (cols + 1), 3)  # [cols:-cols]
-    tcrds = tcrds.reshape((rows + 1) * (cols + 1), 2)  # [cols:-cols]
-
-    # compute faces
-    rowtemplate1 = (((np.arange(cols).reshape(cols, 1) + np.array([[1, 0, 0]])) % (cols + 2)) +
-                    np.array([[0, 0, cols + 1]]))
-    rowtemplate2 = (((np.arange(cols).reshape(cols, 1) + np.array([[1, 0, 1]])) % (cols + 2)) +
-                    np.array([[0, cols + 1, cols + 1]]))
-    # print(rowtemplate1.shape, "\n", rowtemplate2.shape)
-    faces = np.empty((rows * cols * 2, 3), dtype=np.uint32)
-    for row in range(rows):
-        start = row * cols * 2
-        if row != 0:
-            faces[start:start + cols] = rowtemplate1 + row * (cols + 1)
-        if row != rows - 1:
-            faces[start + cols:start + (2 * cols)] = rowtemplate2 + row * (cols + 1)
-    faces = faces[cols:-cols]
-
-    edges = MeshData(vertices=verts, faces=faces).get_edges()
-    eclrs = np.zeros((len(edges), 4), dtype=np.float32)
-    eclrs[np.arange(len(edges)), :] = (1, 1, 1, 1)
-
-    return dict(verts=verts,
-                norms=norms,
+
+def sphere_mesh(rows=4, cols=None, radius=1.0, offset=False, edge_rgb=(1, 0, 0)):
+    """
+        Build the buffers of a latitude/longitude mesh over an oblate spheroid in one pass of
+        array broadcasting. The grid has rows + 1 rings of cols + 1 vertices, the last column
+        repeating the first so the texture coordinates can run from 0 to 1 across the seam.
+        Row 0 is the +z pole. The triangles that would collapse at the poles are left out.
+
+    Parameters
+    ----------
+    rows, cols  : int               the number of rings and sectors; cols defaults to 2 * rows
+    radius      : float or (3,)     one radius, or a body radius set (R, R_mean, R_polar), which
+                                    gives the semi-axes (R, R, R_polar), see axis_radii
+    offset      : bool              rotate each ring by half a sector from the one above it
+    edge_rgb    : (3,)              the color of the edges, see ecolr below
+
+    Returns
+    -------
+    dict    : verts     np.ndarray(V, 3) of float32     vertex positions
+              norms     np.ndarray(V, 3) of float32     unit outward normals
+              tcord     np.ndarray(V, 2) of float32     texture coordinates
+              faces     np.ndarray(F, 3) of uint32      triangles, wound the same way
+              edges     np.ndarray(3F, 2) of uint32     the three edges of each face, in face order
+              h_edges   np.ndarray(H, 2) of uint32      the edges along the rings, poles excluded
+              v_edges   np.ndarray(R, 2) of uint32      the edges along the meridians
+              ecolr     np.ndarray(3F, 4) of float32    edge_rgb, opaque for the ring and meridian
+                                                        edges of each quad, clear for its diagonal
+    """
+    if cols is None:
+        cols = rows * 2
+    a, b, c = axis_radii(radius)
+
+    #   vertices, normals and texture coordinates of the (rows + 1, cols + 1) grid
+    phi = (np.arange(rows + 1) * np.pi / rows)[:, None]
+    th = (np.arange(cols + 1) * 2 * np.pi / cols)[None, :]
+    if offset:
+        th = th + (np.pi / cols) * np.arange(rows + 1)[:, None]
+    sin_phi, cos_phi = np.sin(phi), np.cos(phi)
+    unit = np.empty((rows + 1, cols + 1, 3), dtype=np.float64)
+    unit[..., 0] = sin_phi * np.cos(th)
+    unit[..., 1] = sin_phi * np.sin(th)
+    unit[..., 2] = cos_phi
+    verts = unit * (a, b, c)
+    norms = unit / (a, b, c)
+    norms /= np.linalg.norm(norms, axis=-1, keepdims=True)
+    tcord = np.empty((rows + 1, cols + 1, 2), dtype=np.float32)
+    tcord[..., 0] = (np.arange(cols + 1) / cols)[None, :]
+    tcord[..., 1] = (1 - np.arange(rows + 1) / rows)[:, None]
+
+    #   each quad (k1, k1 + 1 on this ring, k2, k2 + 1 on the next) makes an upper triangle,
+    #   except on the top ring, and a lower one, except on the bottom ring
+    k1 = (np.arange(rows)[:, None] * (cols + 1) + np.arange(cols)[None, :]).astype(np.uint32)
+    k2 = k1 + (cols + 1)
+    upper = np.stack([k1, k2, k1 + 1], axis=-1)
+    lower = np.stack([k1 + 1, k2, k2 + 1], axis=-1)
+    faces = np.stack([upper, lower], axis=1)                  # (rows, 2, cols, 3)
+    keep = np.ones((rows, 2), dtype=bool)
+    keep[0, 0] = False
+    keep[-1, 1] = False
+    faces = faces[keep].reshape(-1, 3)
+
+    edges = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    alpha = np.stack([np.array([1, 0, 1]), np.array([0, 0, 0])])[None, :, None, :]
+    alpha = np.broadcast_to(alpha, (rows, 2, cols, 3))[keep].reshape(-1)
+    ecolr = np.empty((len(edges), 4), dtype=np.float32)
+    ecolr[:, :3] = edge_rgb
+    ecolr[:, 3] = alpha
+    h_edges = np.stack([k1[1:], k1[1:] + 1], axis=-1).reshape(-1, 2)
+    v_edges = np.stack([k1, k2], axis=-1).reshape(-1, 2)
+
+    return dict(verts=verts.reshape(-1, 3).astype(np.float32),
+                norms=norms.reshape(-1, 3).astype(np.float32),
+                tcord=tcord.reshape(-1, 2),
                 faces=faces,
                 edges=edges,
-                ecolr=eclrs,
-                tcord=tcrds,
+                h_edges=h_edges,
+                v_edges=v_edges,
+                ecolr=ecolr,
                 )
 
 
+def _latitude(rows=4, cols=8, radius=1, offset=False):
+    mesh = sphere_mesh(rows, cols, radius, offset)
+
+    return MeshData(vertices=mesh['verts'], faces=mesh['faces'])
+
+
+def _oblate_sphere(rows=4, cols=None, radius=(1200 * u.km,) * 3, offset=False):
+    return sphere_mesh(rows, cols, radius, offset, edge_rgb=(1, 1, 1))
+
+
 def round_off(val, n_digits=3):
     factor = pow(10, n_digits)
     try:
@@ -689,48 +766,11 @@ def to_quat_str(quat):
     return ""
 
 
-
-log_config = {
-    "version": 1,
-    "formatters": {
-        "logformatter": {
-            "format":
-                "%(asctime)s:%(levelname)s:%(name)s:%(funcName)s:%(message)s",
-        },
-        "traceformatter": {
-            "format":
-                "%(asctime)s:%(process)s:%(levelname)s:%(filename)s:"
-                "%(lineno)s:%(name)s:%(funcName)s:%(message)s",
-        },
-    },
-    "handlers": {
-        "loghandler": {
-            "class": "logging.FileHandler",
-            "level": logging.DEBUG,
-            "formatter": "logformatter",
-            "filename": "app.log",
-        },
-        "tracehandler": {
-            "class": "logging.FileHandler",
-            "level": autologging.TRACE,
-            "formatter": "traceformatter",
-            "filename": "trace.log",
-        },
-    },
-    "loggers": {
-        "my_module.MyClass": {
-            "level": autologging.TRACE,
-            "handlers": ["tracehandler", "loghandler"],
-        },
-    },
-}
-
-
 if __name__ == "__main__":
     import pickle
 
     def main():
-        # logging.debug("-------->> RUNNING SYSTEM_DATASTORE() STANDALONE <<---------------")
+        # _log.debug("-------->> RUNNING SYSTEM_DATASTORE() STANDALONE <<---------------")
 
         dict_store = SystemDataStore()
 
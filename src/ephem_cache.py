@@ -0,0 +1,149 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# ephem_cache.py
+# This module keeps the ephem samples and orbit tracks of the bodies on disk between runs.
+# Each array is one .npy file under data/ephem_cache, named by a hash of everything it was
+# computed from: the body, the plane, the epoch window and spacing, and the cache version.
+# A matching file is memory-mapped rather than recomputed. Bumping EPHEM_CACHE_VERSION
+# invalidates every file written before, and stale files are removed by prune().
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+from sim_logging import get_logger
+
+EPHEM_CACHE_VERSION = 2
+EPHEM_CACHE_DIR     = Path(__file__).resolve().parent.parent / 'data' / 'ephem_cache'
+
+_log = get_logger(__name__)
+
+
+def cache_key(kind, name, plane, jd_start, jd_end, spacing, *extra):
+    """
+        Build the file name of a cached array from everything that determines its contents.
+
+    Parameters
+    ----------
+    kind        : str       what the array holds, e.g. 'ephem' or 'track'
+    name        : str       the body name
+    plane       : Planes    the reference plane
+    jd_start    : float     start of the epoch window as a TDB Julian date
+    jd_end      : float     end of the epoch window as a TDB Julian date
+    spacing     : float     spacing of the samples in days
+    extra       :           any further values the contents depend on
+
+    Returns
+    -------
+    str         : the key, which is also the file name without its suffix
+    """
+    plane = getattr(plane, 'name', plane)
+    parts = (EPHEM_CACHE_VERSION, kind, name, plane,
+             f'{jd_start:.9f}', f'{jd_end:.9f}', f'{spacing:.9f}') + tuple(map(str, extra))
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+    return f'v{EPHEM_CACHE_VERSION}_{name}_{kind}_{digest}'
+
+
+class EphemCache:
+    """
+        A directory of .npy arrays keyed by cache_key().
+        The cache never raises: a file that cannot be read counts as a miss, and a directory
+        that cannot be written disables the cache for the rest of the run.
+    """
+    def __init__(self, cache_dir=EPHEM_CACHE_DIR, enabled=True):
+        self._dir     = Path(cache_dir)
+        self._enabled = enabled
+        self._hits    = 0
+        self._misses  = 0
+
+    def _path(self, key):
+        return self._dir / (key + '.npy')
+
+    def load(self, key):
+        """
+            Map a cached array into memory.
+
+        Returns
+        -------
+        np.ndarray  : the read-only array, or None if the key is not cached
+        """
+        if not self._enabled:
+            return None
+
+        path = self._path(key)
+        if path.is_file():
+            try:
+                arr = np.load(path, mmap_mode='r')
+                self._hits += 1
+                return arr
+
+            except (OSError, ValueError) as err:
+                _log.warning('dropping unreadable cache file %s: %s', path.name, err)
+                path.unlink(missing_ok=True)
+
+        self._misses += 1
+
+        return None
+
+    def save(self, key, arr):
+        """ Write an array under a key, replacing the file in one step so readers never see part of it. """
+        if not self._enabled:
+            return
+
+        path = self._path(key)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                np.save(f, np.ascontiguousarray(arr, dtype=np.float64))
+            os.replace(tmp, path)
+
+        except OSError as err:
+            _log.warning('ephem cache disabled, cannot write to %s: %s', self._dir, err)
+            tmp.unlink(missing_ok=True)
+            self._enabled = False
+
+    def prune(self):
+        """ Remove the files written by other versions of the cache. """
+        if not self._dir.is_dir():
+            return
+
+        for path in self._dir.glob('*.npy'):
+            if not path.name.startswith(f'v{EPHEM_CACHE_VERSION}_'):
+                path.unlink(missing_ok=True)
+
+    def clear(self):
+        """ Remove every cached file. """
+        if self._dir.is_dir():
+            for path in self._dir.glob('*.npy'):
+                path.unlink(missing_ok=True)
+
+    '''===== PROPERTIES ==========================================================================================='''
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, new_enabled):
+        self._enabled = bool(new_enabled)
+
+    @property
+    def cache_dir(self):
+        return self._dir
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
@@ -0,0 +1,131 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# geometry_pool.py
+# This module shares the sphere meshes of the Planet visuals.
+# All the bodies are drawn from the same few tessellations, which differ between bodies only
+# by the radii along their three axes. The pool builds one unit sphere per (rows, cols, method,
+# offset) with its MeshData, edge list and vertex buffers, and every Planet of that tessellation
+# draws from them; the radii of each body are applied as a scale at the front of its transform.
+from vispy.geometry.meshdata import MeshData
+from vispy.gloo import VertexBuffer
+
+from datastore import sphere_mesh
+
+GEOMETRY_METHODS = {'oblate': (1, 1, 1), 'latitude': (1, 0, 0)}    # {method: edge_rgb of sphere_mesh}
+
+
+class SharedGeometry:
+    """
+        One unit sphere tessellation and the buffers its Planets share.
+    """
+    def __init__(self, rows, cols, method, offset=False):
+        if method not in GEOMETRY_METHODS:
+            raise ValueError(f'>>>ERROR: method must be one of {tuple(GEOMETRY_METHODS)}, not {method!r}')
+
+        self._key     = (rows, cols, method, bool(offset))
+        self._surface = sphere_mesh(rows, cols, radius=1.0, offset=offset,
+                                    edge_rgb=GEOMETRY_METHODS[method])
+        self._mesh_data = MeshData(vertices=self._surface['verts'],
+                                   faces=self._surface['faces'])
+        self._edges   = self._mesh_data.get_edges()
+        self._border_data = MeshData(vertices=self._surface['verts'],
+                                     faces=self._edges)
+        #   the vertices of MeshVisual are unindexed, one per face corner
+        self._surface_vbo = VertexBuffer(self._mesh_data.get_vertices(indexed='faces'))
+        self._border_vbo  = VertexBuffer(self._border_data.get_vertices(indexed='faces'))
+        self._users   = 0
+
+    def share(self, surface_visual, border_visual=None):
+        """
+            Point the MeshVisuals of a Planet at the shared vertex buffers.
+            MeshVisual still writes its vertices on its first draw, but into the shared buffer,
+            so the GPU holds one copy of each tessellation however many bodies use it.
+        """
+        surface_visual._vertices = self._surface_vbo
+        if border_visual is not None:
+            border_visual._vertices = self._border_vbo
+        self._users += 1
+
+    def release(self):
+        """ A Planet stopped drawing from this geometry, e.g. on a change of its level of detail. """
+        self._users = max(0, self._users - 1)
+
+    def delete(self):
+        self._surface_vbo.delete()
+        self._border_vbo.delete()
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def surface(self):
+        """ The dict of sphere_mesh() buffers of the unit sphere. """
+        return self._surface
+
+    @property
+    def mesh_data(self):
+        return self._mesh_data
+
+    @property
+    def border_data(self):
+        return self._border_data
+
+    @property
+    def users(self):
+        return self._users
+
+    @property
+    def nbytes(self):
+        return (sum(a.nbytes for a in self._surface.values()) + self._edges.nbytes +
+                self._surface_vbo.nbytes + self._border_vbo.nbytes)
+
+
+class GeometryPool:
+    """
+        The SharedGeometry of every tessellation in use, built on first request.
+    """
+    def __init__(self):
+        self._geometry = {}         # {(rows, cols, method, offset): SharedGeometry}
+
+    def get(self, rows, cols=None, method='oblate', offset=False):
+        """
+        Parameters
+        ----------
+        rows, cols  : int       the tessellation; cols defaults to 2 * rows
+        method      : str       one of GEOMETRY_METHODS
+        offset      : bool      rotate each ring by half a sector, see sphere_mesh
+
+        Returns
+        -------
+        SharedGeometry
+        """
+        if cols is None:
+            cols = rows * 2
+        key = (rows, cols, method, bool(offset))
+        if key not in self._geometry:
+            self._geometry[key] = SharedGeometry(rows, cols, method, offset)
+
+        return self._geometry[key]
+
+    def clear(self):
+        """ Delete the shared buffers; the visuals that use them must be gone first. """
+        for geo in self._geometry.values():
+            geo.delete()
+        self._geometry.clear()
+
+    @property
+    def nbytes(self):
+        return sum(geo.nbytes for geo in self._geometry.values())
+
+    def __len__(self):
+        return len(self._geometry)
+
+
+GEOMETRY_POOL = GeometryPool()      # the pool of the Planets created without one
@@ -0,0 +1,338 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# instanced_planets.py
+# This module draws the surfaces of all the planets with one instanced draw call for each level
+# of detail in use. Every planet is an instance of a shared unit-sphere mesh, scaled by its radii,
+# rotated and placed by per-instance attributes. The textures live in one atlas with a layer of
+# equal size per body, stacked vertically, and each instance carries the index of its layer; a
+# body whose texture has not arrived yet has layer -1 and is drawn in its flat body color.
+# Only the instances that survived culling are uploaded and drawn on each frame.
+import numpy as np
+from vispy import gloo
+from vispy.scene.visuals import create_visual_node
+from vispy.visuals import Visual
+
+from geometry_pool import GEOMETRY_POOL
+from mesh_lod import LOD_ROWS
+
+ATLAS_MAX_HEIGHT  = 8192    # rows of the atlas texture, within GL_MAX_TEXTURE_SIZE of common GPUs
+ATLAS_LAYER_WIDTH = 1024    # width of a layer when they all fit, halved until they do
+ATLAS_MIN_WIDTH   = 64
+INSTANCE_ATTRS    = (('i_pos', 3), ('i_scale', 3), ('i_rot_x', 3), ('i_rot_y', 3),
+                     ('i_rot_z', 3), ('i_layer', 1), ('i_color', 4))
+
+VERT_SHADER = """
+attribute vec3 a_position;
+attribute vec2 a_texcoord;
+attribute vec3 i_pos;
+attribute vec3 i_scale;
+attribute vec3 i_rot_x;
+attribute vec3 i_rot_y;
+attribute vec3 i_rot_z;
+attribute float i_layer;
+attribute vec4 i_color;
+
+varying vec2 v_texcoord;
+varying float v_layer;
+varying vec4 v_color;
+
+void main() {
+    vec3 local = a_position * i_scale;
+    vec3 world = i_pos + local.x * i_rot_x + local.y * i_rot_y + local.z * i_rot_z;
+    gl_Position = $transform(vec4(world, 1.0));
+    v_texcoord = a_texcoord;
+    v_layer = i_layer;
+    v_color = i_color;
+}
+"""
+
+FRAG_SHADER = """
+uniform sampler2D u_atlas;
+uniform float u_layers;
+uniform float u_texel;
+
+varying vec2 v_texcoord;
+varying float v_layer;
+varying vec4 v_color;
+
+void main() {
+    if (v_layer < -0.5) {
+        gl_FragColor = v_color;
+        return;
+    }
+    // keep half a texel inside the layer so the filtering does not bleed into its neighbours
+    float v = clamp(v_texcoord.y, u_texel, 1.0 - u_texel);
+    vec2 uv = vec2(v_texcoord.x, (floor(v_layer + 0.5) + v) / u_layers);
+    gl_FragColor = texture2D(u_atlas, uv) * vec4(1.0, 1.0, 1.0, v_color.a);
+}
+"""
+
+
+def rotate_rows(angles, axes):
+    """
+        The 3x3 rotations of vispy.util.transforms.rotate() for many angles at once,
+        in the row-vector convention of vispy (p_rotated = p @ R).
+
+    Parameters
+    ----------
+    angles      : np.ndarray(N,)        rotation angles in degrees
+    axes        : np.ndarray(N, 3)      rotation axes
+
+    Returns
+    -------
+    np.ndarray(N, 3, 3)
+    """
+    axes = axes / np.linalg.norm(axes, axis=1)[:, None]
+    x, y, z = axes[:, 0], axes[:, 1], axes[:, 2]
+    theta = np.radians(angles)
+    c, s = np.cos(theta), np.sin(theta)
+    cx, cy, cz = (1 - c) * x, (1 - c) * y, (1 - c) * z
+    rot = np.empty((len(angles), 3, 3), dtype=np.float64)
+    rot[:, 0] = np.stack([cx * x + c, cx * y + z * s, cx * z - y * s], axis=1)
+    rot[:, 1] = np.stack([cy * x - z * s, cy * y + c, cy * z + x * s], axis=1)
+    rot[:, 2] = np.stack([cz * x + y * s, cz * y - x * s, cz * z + c], axis=1)
+
+    return rot
+
+
+def body_rotations(rot_elem, axes):
+    """
+        The orientation of each body as a row-vector rotation, composed as the Planet transforms
+        do: by W about the z axis, then DEC about the y axis, then RA about the x axis.
+
+    Parameters
+    ----------
+    rot_elem    : np.ndarray(N, 3)      RA, DEC, W of each body in degrees
+    axes        : np.ndarray(N, 3, 3)   the x, y, z axes of each body
+
+    Returns
+    -------
+    np.ndarray(N, 3, 3)
+    """
+    rot = rotate_rows(rot_elem[:, 2], axes[:, 2])
+    rot = rot @ rotate_rows(rot_elem[:, 1], axes[:, 1])
+
+    return rot @ rotate_rows(rot_elem[:, 0], axes[:, 0])
+
+
+def _fit_layer(data, shape):
+    """ Resample an (H, W, 4) image to the layer shape by nearest neighbour, if it differs. """
+    if data.shape[:2] == shape:
+        return data
+    rows = (np.arange(shape[0]) * data.shape[0] // shape[0])
+    cols = (np.arange(shape[1]) * data.shape[1] // shape[1])
+
+    return np.asarray(data)[rows][:, cols]
+
+
+class InstancedPlanetsVisual(Visual):
+    """
+        The surfaces of N bodies drawn as instances of a chain of unit spheres, one instanced
+        draw call per level of detail in use (see mesh_lod).
+    """
+    def __init__(self, radii, colors, lod_rows=LOD_ROWS, geometry_pool=None, **kwargs):
+        """
+        Parameters
+        ----------
+        radii       : np.ndarray(N, 3)  the semi-axes (R, R, R_polar) of each body, see axis_radii
+        colors      : np.ndarray(N, 4)  the RGBA body color of each body, drawn until its texture is set
+        lod_rows    : tuple             the rows of the shared sphere of each level of detail
+        geometry_pool : GeometryPool    where the unit spheres are taken from, GEOMETRY_POOL if None
+        """
+        Visual.__init__(self, vcode=VERT_SHADER, fcode=FRAG_SHADER, **kwargs)
+        self.set_gl_state('translucent', depth_test=True, cull_face=False)
+        self._draw_mode = 'triangles'
+
+        if geometry_pool is None:
+            geometry_pool = GEOMETRY_POOL
+        self._levels = []
+        for rows in sorted(lod_rows):
+            sphere = geometry_pool.get(rows).surface
+            self._levels.append(dict(
+                index=gloo.IndexBuffer(sphere['faces']),
+                a_position=gloo.VertexBuffer(sphere['verts']),
+                a_texcoord=gloo.VertexBuffer(sphere['tcord']),
+                inst={key: gloo.VertexBuffer(np.zeros((1, dim), dtype=np.float32), divisor=1)
+                      for key, dim in INSTANCE_ATTRS},
+                shown=np.zeros((0,), dtype=np.intp),    # the bodies drawn at this level
+            ))
+
+        count = len(radii)
+        self._count  = count
+        self._scale  = np.asarray(radii, dtype=np.float32)
+        self._color  = np.asarray(colors, dtype=np.float32)
+        self._layer  = np.full((count,), -1.0, dtype=np.float32)
+        self._pos    = np.zeros((count, 3), dtype=np.float32)
+        self._rot    = np.tile(np.eye(3, dtype=np.float32), (count, 1, 1))
+        self._static_dirty = True       # scale, layer or color changed since the last upload
+
+        #   the layers of the atlas, halved in width until one per body fits
+        width = ATLAS_LAYER_WIDTH
+        while width > ATLAS_MIN_WIDTH and count * (width // 2) > ATLAS_MAX_HEIGHT:
+            width //= 2
+        self._layer_shape = (width // 2, width)
+        self._num_layers  = max(1, min(count, ATLAS_MAX_HEIGHT // self._layer_shape[0]))
+        self._atlas = gloo.Texture2D(shape=(self._num_layers * self._layer_shape[0], width, 4),
+                                     interpolation='linear',
+                                     wrapping='clamp_to_edge',
+                                     )
+        self.shared_program['u_atlas'] = self._atlas
+        self.shared_program['u_layers'] = float(self._num_layers)
+        self.shared_program['u_texel'] = 0.5 / self._layer_shape[0]
+        self._bind_level(self._levels[0])
+
+    def _bind_level(self, level):
+        """ Point the program at the mesh and instance buffers of a level. """
+        self.shared_program['a_position'] = level['a_position']
+        self.shared_program['a_texcoord'] = level['a_texcoord']
+        for key, buf in level['inst'].items():
+            self.shared_program[key] = buf
+
+    def set_texture(self, idx, data):
+        """
+            Copy a decoded texture into the atlas layer of body idx. Must run on the GUI thread.
+
+        Returns
+        -------
+        bool    : False if the atlas has no layer left for this body, which keeps its color
+        """
+        if idx >= self._num_layers:
+            return False
+
+        data = _fit_layer(data, self._layer_shape)
+        self._atlas.set_data(np.ascontiguousarray(data, dtype=np.uint8),
+                             offset=(idx * self._layer_shape[0], 0))
+        self._layer[idx] = idx
+        self._static_dirty = True
+        self.update()
+
+        return True
+
+    def set_colors(self, colors):
+        self._color[:] = colors
+        self._static_dirty = True
+
+    def set_radii(self, radii):
+        """ Replace the semi-axes (R, R, R_polar) of every body, see axis_radii. """
+        self._scale[:] = radii
+        self._static_dirty = True
+
+    def set_states(self, pos, rot, shown, lod=None):
+        """
+            Place and orient every body, and upload the instances of those shown to the level
+            of detail each is drawn at.
+
+        Parameters
+        ----------
+        pos         : np.ndarray(N, 3)      positions in scene coordinates
+        rot         : np.ndarray(N, 3, 3)   row-vector rotations, see body_rotations
+        shown       : np.ndarray(N,)        bool, the bodies to draw this frame
+        lod         : np.ndarray(N,)        the level of each body, an index into lod_rows;
+                                            all at the coarsest level if None
+        """
+        self._pos[:] = pos
+        self._rot[:] = rot
+        if lod is None:
+            lod = np.zeros((self._count,), dtype=np.intp)
+
+        for n, level in enumerate(self._levels):
+            idx = np.nonzero(shown & (lod == n))[0]
+            moved = not np.array_equal(idx, level['shown'])
+            level['shown'] = idx
+            if not len(idx):
+                continue
+
+            inst = level['inst']
+            inst['i_pos'].set_data(self._pos[idx])
+            for k, key in enumerate(('i_rot_x', 'i_rot_y', 'i_rot_z')):
+                inst[key].set_data(np.ascontiguousarray(self._rot[idx, k]))
+            if moved or self._static_dirty:
+                inst['i_scale'].set_data(self._scale[idx])
+                inst['i_layer'].set_data(self._layer[idx, None])
+                inst['i_color'].set_data(self._color[idx])
+        self._static_dirty = False
+        self.update()
+
+    def _prepare_transforms(self, view):
+        view.view_program.vert['transform'] = view.get_transform()
+
+    def _prepare_draw(self, view):
+        return any(len(level['shown']) for level in self._levels)
+
+    def draw(self):
+        """ As Visual.draw(), once for each level of detail that has bodies to draw. """
+        if not self.visible or self._prepare_draw(view=self) is False:
+            return
+
+        self._configure_gl_state()
+        for level in self._levels:
+            if len(level['shown']):
+                self._bind_level(level)
+                self._program.draw(self._vshare.draw_mode, level['index'])
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def num_layers(self):
+        return self._num_layers
+
+    @property
+    def layer_width(self):
+        return self._layer_shape[1]
+
+    @property
+    def draw_calls(self):
+        return sum(1 for level in self._levels if len(level['shown']))
+
+
+InstancedPlanets = create_visual_node(InstancedPlanetsVisual)
+
+
+class PlanetInstance:
+    """
+        Stands in for a Planet visual in StarSystemVisuals when the planets are instanced,
+        forwarding what is set on it to its instance of the shared renderer.
+    """
+    def __init__(self, renderer, idx, body_name, vizz_data):
+        self._renderer   = renderer
+        self._idx        = idx
+        self._body_name  = body_name
+        self._vizz_data  = vizz_data
+        self._tex_source = getattr(vizz_data['tex_data'], 'fname', None)
+        self.visible     = True
+
+    def set_texture(self, data, width=None):
+        self._renderer.set_texture(self._idx, data)
+
+    def update(self):
+        """ The renderer redraws all the instances at once. """
+        pass
+
+    def set_lod(self, rows):
+        """ The renderer takes the levels of all the instances in set_states. """
+        pass
+
+    @property
+    def body_name(self):
+        return self._body_name
+
+    @property
+    def texture_source(self):
+        return self._tex_source
+
+    @property
+    def texture_width(self):
+        """ Always None: an atlas layer has one fixed size, so there is no LOD to stream. """
+        return None
+
+    @property
+    def mark(self):
+        return self._vizz_data['body_mark']
@@ -0,0 +1,121 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# marker_manager.py
+# This module keeps the attributes of a vispy Markers visual between frames.
+# Each attribute is held as an array and marked dirty only when a new value differs from it.
+# A flush with nothing dirty does nothing. A flush where only positions and sizes changed
+# writes those two fields into the vertex data the visual already holds and re-uploads that
+# one buffer, skipping the color and symbol conversions of Markers.set_data(). Anything else,
+# such as a change of color, symbol or body count, goes through a full set_data().
+import numpy as np
+from vispy.color import ColorArray
+
+MARKER_ATTRS = ('pos', 'size', 'face_color', 'edge_color', 'symbol')
+FAST_ATTRS   = {'pos', 'size'}      # attributes that can be written into the vertex data directly
+
+
+class MarkerManager:
+    """
+        Holds the attributes of a Markers visual and sends it only what has changed.
+    """
+    def __init__(self, markers, **set_data_kw):
+        """
+        Parameters
+        ----------
+        markers     : Markers   the visual to manage
+        set_data_kw :           fixed arguments of every full Markers.set_data() call
+        """
+        self._markers = markers
+        self._fixed   = set_data_kw
+        self._attrs   = dict.fromkeys(MARKER_ATTRS)
+        self._dirty   = set()
+        self._full    = True            # the next flush must be a full set_data()
+        self._count   = 0
+
+    def _set(self, key, value, always=False):
+        old = self._attrs[key]
+        if always or old is None or np.shape(old) != np.shape(value) or not np.array_equal(old, value):
+            self._attrs[key] = value
+            self._dirty.add(key)
+
+    def set_pos(self, pos):
+        """ Positions (N, 3) change on almost every frame, so they are not compared. """
+        self._set('pos', np.asarray(pos, dtype=np.float32), always=True)
+
+    def set_size(self, size):
+        self._set('size', np.asarray(size, dtype=np.float32))
+
+    def set_face_color(self, rgba):
+        """ Face colors as an (N, 4) RGBA array. """
+        self._set('face_color', np.asarray(rgba, dtype=np.float32))
+
+    def set_edge_color(self, rgba):
+        """ A single RGBA edge color, or one per marker. """
+        self._set('edge_color', np.asarray(rgba, dtype=np.float32))
+
+    def set_symbol(self, symbols):
+        self._set('symbol', tuple(symbols))
+
+    def flush(self):
+        """
+            Send the dirty attributes to the Markers visual.
+
+        Returns
+        -------
+        str     : 'none', 'fast' or 'full', how much was sent
+        """
+        if not self._dirty:
+            return 'none'
+
+        count = len(self._attrs['pos'])
+        if not self._full and count == self._count and self._dirty <= FAST_ATTRS and self._write_fast():
+            self._dirty.clear()
+            return 'fast'
+
+        self._markers.set_data(pos=self._attrs['pos'],
+                               size=self._attrs['size'],
+                               face_color=ColorArray(self._attrs['face_color']),
+                               edge_color=ColorArray(self._attrs['edge_color']),
+                               symbol=list(self._attrs['symbol']),
+                               **self._fixed,
+                               )
+        self._count = count
+        self._full = False
+        self._dirty.clear()
+
+        return 'full'
+
+    def _write_fast(self):
+        """ Write the dirty positions and sizes into the vertex data of the visual. """
+        data = getattr(self._markers, '_data', None)
+        vbo = getattr(self._markers, '_vbo', None)
+        if data is None or vbo is None or len(data) != self._count:
+            return False
+
+        try:
+            if 'pos' in self._dirty:
+                data['a_position'] = self._attrs['pos']
+            if 'size' in self._dirty:
+                data['a_size'] = self._attrs['size']
+        except (ValueError, KeyError):          # a vispy without these fields
+            return False
+
+        vbo.set_data(data)
+        self._markers.update()
+
+        return True
+
+    def invalidate(self):
+        """ Make the next flush a full set_data(), e.g. after the visual was changed elsewhere. """
+        self._full = True
+        self._dirty.update(k for k, v in self._attrs.items() if v is not None)
+
+    @property
+    def markers(self):
+        return self._markers
@@ -0,0 +1,106 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# mesh_lod.py
+# This module picks the tessellation each planet is drawn with from its size on screen.
+# The levels are sphere meshes of increasing rows (and twice as many columns). The error of a
+# level is the largest gap between a facet and the true sphere, R * (1 - cos(pi / cols)), which
+# on screen is that fraction of the radius of the body in pixels. Each body gets the coarsest
+# level whose error stays below LOD_MAX_ERR_PIX. A body refines as soon as it needs to, but
+# coarsens only once a coarser level would meet a tighter error, LOD_HYSTERESIS times the
+# target, so a body hovering around a threshold does not flip between two levels every frame.
+import numpy as np
+
+LOD_ROWS        = (4, 8, 16, 32, 64, 128)   # rows of each level, coarse to fine
+LOD_DEF_ROWS    = 16        # the level used when the LOD is off or the sizes are not known yet
+LOD_MAX_ERR_PIX = 0.75      # the largest facet error allowed on screen (pixels)
+LOD_HYSTERESIS  = 0.5       # fraction of LOD_MAX_ERR_PIX a coarser level must meet to switch down
+
+
+def facet_error(rows):
+    """ The largest gap between the facets of a level and the unit sphere. """
+    return 1.0 - np.cos(np.pi / (2 * np.asarray(rows, dtype=np.float64)))
+
+
+class LodSelector:
+    """
+        Keeps the level of each body between frames and moves it with hysteresis.
+    """
+    def __init__(self, rows=LOD_ROWS, max_err=LOD_MAX_ERR_PIX, hysteresis=LOD_HYSTERESIS):
+        """
+        Parameters
+        ----------
+        rows        : tuple     the rows of the levels
+        max_err     : float     the largest facet error allowed on screen (pixels)
+        hysteresis  : float     in (0, 1], see the module notes
+        """
+        if not 0 < hysteresis <= 1:
+            raise ValueError(f'>>>ERROR: hysteresis must be in (0, 1], not {hysteresis}')
+
+        self._rows       = np.array(sorted(rows), dtype=np.intp)
+        self._error      = facet_error(self._rows)
+        self._max_err    = max_err
+        self._hysteresis = hysteresis
+        self._levels     = None
+
+    def target(self, pix_r, max_err=None):
+        """
+            The coarsest level that meets an error for each body, regardless of its current level.
+
+        Parameters
+        ----------
+        pix_r       : np.ndarray(N,)    the radius of each body on screen (pixels)
+        max_err     : float             the error to meet, max_err of the selector if None
+
+        Returns
+        -------
+        np.ndarray(N,) of int   : indices into rows, the finest level where none meets it
+        """
+        if max_err is None:
+            max_err = self._max_err
+        meets = np.asarray(pix_r, dtype=np.float64)[:, None] * self._error[None, :] <= max_err
+
+        return np.where(meets.any(axis=1), np.argmax(meets, axis=1), len(self._rows) - 1)
+
+    def select(self, pix_r):
+        """
+            Move the level of each body toward its target.
+
+        Parameters
+        ----------
+        pix_r       : np.ndarray(N,)    the radius of each body on screen (pixels)
+
+        Returns
+        -------
+        np.ndarray(N,) of int   : indices into rows
+        """
+        target = self.target(pix_r)
+        if self._levels is None or len(self._levels) != len(target):
+            self._levels = target
+            return self._levels
+
+        strict = self.target(pix_r, self._max_err * self._hysteresis)
+        self._levels = np.where(target > self._levels, target,
+                                np.where(strict < self._levels, strict, self._levels))
+
+        return self._levels
+
+    def default(self, count):
+        """ The level nearest LOD_DEF_ROWS for count bodies. """
+        return np.full((count,), np.argmin(np.abs(self._rows - LOD_DEF_ROWS)), dtype=np.intp)
+
+    def reset(self):
+        self._levels = None
+
+    @property
+    def rows(self):
+        return self._rows
+
+    @property
+    def levels(self):
+        return self._levels
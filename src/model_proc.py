@@ -16,29 +16,175 @@
 # This process will accept commands from the controller to update the state of the model.
 # This process will expose body states in a shared memory segment that can be accessed by the viewer class instance.
 
+import queue
+from collections import namedtuple
 from multiprocessing import Process
 
+from astropy.time import Time
+
+from performance_monitor import PERF_MONITOR
+from sim_clock import DEF_TICK_RATE, SimClock
+from sim_logging import get_logger, setup_logging
 from simsystem import SimSystem
 
+MODEL_OPS     = ('set_epoch',       # (epoch,)          Time or TDB Julian date
+                 'step',            # (dt, n)           n steps of dt seconds, each one published
+                 'set_warp',        # (warp,)           simulated seconds per wall second, signed
+                 'set_direction',   # (direction,)      +1 or -1
+                 'start',           # ()                run the clock
+                 'pause',           # ()                hold the epoch
+                 'add_body',        # (name,)
+                 'remove_body',     # (name,)
+                 'query_fields',    # (field_ids,)      returns SimSystem.get_agg_fields(field_ids),
+                                    # (field_ids, since) returns SimSystem.get_agg_deltas(field_ids, since)
+                 'perf_stats',      # ()                returns the span summaries of the model process,
+                                    #                   see PerformanceMonitor.stats()
+                 'shutdown',        # ()
+                 )
+
+_log = get_logger(__name__)
+
+#   sent over cmd_q; req_id is handed back in the response so replies can be matched
+ModelCommand  = namedtuple('ModelCommand', ['op', 'args', 'req_id'], defaults=[(), None])
+#   sent over rsp_q; result holds the value returned by the op, or the error message when not ok
+ModelResponse = namedtuple('ModelResponse', ['op', 'req_id', 'ok', 'result'])
+
 
 class ModelProcess(Process):
     """
+        Runs the SimSystem in its own process. Commands arrive over cmd_q as ModelCommand tuples
+        and each one is answered over rsp_q by a ModelResponse. The body states are published to
+        the shared memory StateRing, at the tick rate of its SimClock while the clock runs, and
+        whenever a command moves the epoch.
     """
-    def __init__(self, cmd_q, rsp_q,  # *args, **kwargs
-                 ):
+    def __init__(self, cmd_q, rsp_q, tick_rate=DEF_TICK_RATE, prop_mode='batch'):
         """
-            Bare bones initialization of a ModelProces instance
+            Bare bones initialization of a ModelProcess instance. The SimSystem itself is
+            created in run(), so that it and its shared memory belong to the model process.
+
+        Parameters
+        ----------
+        cmd_q       : Queue     commands to the model
+        rsp_q       : Queue     responses from the model
+        tick_rate   : float     the number of states published per second while running
+        prop_mode   : str       the SimSystem propagation mode, see SimObjectDict.prop_mode
         """
-        super().__init__(  # *args, **kwargs
-                         )
+        super().__init__()
+        if tick_rate <= 0:
+            raise ValueError(f'>>>ERROR: tick rate must be positive, not {tick_rate}.')
+
         self._command_q = cmd_q
         self._respond_q = rsp_q
-        self._system    = SimSystem()
+        self._tick_rate = tick_rate
+        self._prop_mode = prop_mode
+        self._system    = None
+        self._clock     = None
+        self._running   = False
 
     def run(self):
         """
-            Here will be the code to operate this model process
+            Build the model, report that it is ready, then service commands between ticks
+            until a shutdown command is received.
         """
-        print("Model Process generated...")
-        print("Here is the payload...")
+        setup_logging(fname='sns_model.log')        # a spawned process does not inherit the handlers
+        try:
+            self._system  = SimSystem(prop_mode=self._prop_mode)
+            self._clock   = SimClock(jd=self._system.epoch.tdb.jd, tick_rate=self._tick_rate)
+        except Exception as err:
+            _log.exception('the model failed to start')
+            self._respond_q.put(ModelResponse('ready', None, False, f'{type(err).__name__}: {err}'))
+            return
+
+        self._running = True
+        self._respond_q.put(ModelResponse('ready', None, True,
+                                          {'ring': self._system.state_ring.name,
+                                           'bodies': self._system.body_names,
+                                           'jd': self._clock.jd,
+                                           }))
+        try:
+            while self._running:
+                try:
+                    cmd = self._command_q.get(timeout=self._clock.wait_time())
+                    self._respond_q.put(self._dispatch(cmd))
+                except queue.Empty:
+                    pass
+
+                if self._clock.tick():
+                    self._publish()
+
+        finally:
+            self._system.close()
+
+    def _dispatch(self, cmd):
+        """ Carry out one command and build its response. """
+        op, args, req_id = cmd
+        try:
+            match op:
+                case 'set_epoch':
+                    epoch, = args
+                    self._clock.reset(epoch.tdb.jd if type(epoch) == Time else float(epoch))
+                    self._publish()
+                    result = self._clock.jd
+
+                case 'step':
+                    dt, n = args
+                    for _ in range(int(n)):
+                        self._clock.step(dt)
+                        self._publish()
+                    result = self._clock.jd
+
+                case 'set_warp':
+                    self._clock.warp = args[0]
+                    result = self._clock.rate
+
+                case 'set_direction':
+                    self._clock.direction = args[0]
+                    result = self._clock.rate
+
+                case 'start':
+                    self._clock.start()
+                    result = self._clock.jd
+
+                case 'pause':
+                    self._clock.pause()
+                    result = self._clock.jd
+
+                case 'add_body':
+                    self._system.add_body(args[0])
+                    self._publish()
+                    result = self._system.body_names
+
+                case 'remove_body':
+                    self._system.remove_body(args[0])
+                    self._publish()
+                    result = self._system.body_names
+
+                case 'query_fields':
+                    if len(args) > 1:
+                        result = self._system.get_agg_deltas(*args)
+                    else:
+                        result = self._system.get_agg_fields(args[0])
+
+                case 'perf_stats':
+                    result = PERF_MONITOR.stats()
+
+                case 'shutdown':
+                    self._running = False
+                    result = self._clock.jd
+
+                case _:
+                    raise ValueError(f'>>>ERROR: {op} is not a model command.')
+
+        except Exception as err:
+            #   any failure is reported to the viewer, and the model keeps servicing commands
+            _log.exception('model command %s failed', op)
+            return ModelResponse(op, req_id, False, f'{type(err).__name__}: {err}')
+
+        return ModelResponse(op, req_id, True, result)
 
+    def _publish(self):
+        """ Propagate the system to the clock epoch, which publishes the new states. """
+        if self._system.prop_mode == 'body':
+            self._system.update_state(self._clock.epoch)
+        else:
+            self._system.update_state(self._clock.jd)
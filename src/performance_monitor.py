@@ -0,0 +1,250 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# performance_monitor.py
+# This module times the stages of the model and render loops as named spans.
+# Each span keeps its last SPAN_CAPACITY durations in a ring buffer, so recording one is a
+# perf_counter() call and an array write, cheap enough to leave on all the time; the
+# percentiles are only computed when they are asked for. Every process keeps its own spans in
+# PERF_MONITOR: the model process times propagate, aggregate and shm_publish, and the viewer
+# times aggregate, transform_update, marker_upload and draw, plus its whole frame.
+# The model process reports its spans through the 'perf_stats' command (see model_proc).
+import csv
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from psygnal import Signal
+
+SPAN_NAMES     = ('propagate', 'aggregate', 'shm_publish', 'transform_update', 'marker_upload', 'draw')
+SPAN_CAPACITY  = 1024       # durations kept for each span
+REPORT_PERIOD  = 1.0        # seconds between performance_update signals
+FRAME_BUDGET   = 1 / 30     # a p95 frame time above this raises a warning (seconds)
+PERCENTILES    = (50, 95, 99)
+STAT_KEYS      = ('count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+
+
+class SpanStats:
+    """
+        The ring buffer of the durations of one span.
+    """
+    def __init__(self, capacity=SPAN_CAPACITY):
+        self._times = np.zeros((capacity,), dtype=np.float64)
+        self._next  = 0
+        self._count = 0             # durations recorded in all, including those overwritten
+
+    def add(self, seconds):
+        self._times[self._next] = seconds
+        self._next = (self._next + 1) % len(self._times)
+        self._count += 1
+
+    def samples(self):
+        """ The durations held, oldest first (seconds). """
+        if self._count < len(self._times):
+            return self._times[:self._count].copy()
+        return np.roll(self._times, -self._next)
+
+    def summary(self):
+        """
+        Returns
+        -------
+        dict    : the keys of STAT_KEYS; count is of all the durations recorded, the rest are
+                  over the durations held, in milliseconds
+        """
+        held = self.samples() * 1e3
+        if not len(held):
+            return dict.fromkeys(STAT_KEYS, 0.0) | {'count': 0}
+
+        p50, p95, p99 = np.percentile(held, PERCENTILES)
+        return dict(count=self._count,
+                    mean_ms=float(held.mean()),
+                    p50_ms=float(p50),
+                    p95_ms=float(p95),
+                    p99_ms=float(p99),
+                    max_ms=float(held.max()),
+                    )
+
+    def clear(self):
+        self._next = self._count = 0
+
+
+class _Span:
+    """ The context manager of a span; one per name, so a span must not be nested in itself. """
+    __slots__ = ('_monitor', '_name', '_t0')
+
+    def __init__(self, monitor, name):
+        self._monitor = monitor
+        self._name    = name
+        self._t0      = 0.0
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._monitor.record(self._name, time.perf_counter() - self._t0)
+        return False
+
+
+class PerformanceMonitor:
+    """
+        Named spans with ring-buffered percentiles, and the frame timing of the viewer.
+    """
+    performance_update = Signal(dict)   # emitted every REPORT_PERIOD from end_frame(), see report()
+    warning = Signal(str)
+
+    def __init__(self, capacity=SPAN_CAPACITY, report_period=REPORT_PERIOD, frame_budget=FRAME_BUDGET):
+        self._capacity      = capacity
+        self._report_period = report_period
+        self._frame_budget  = frame_budget
+        self._enabled       = True
+        self._spans         = {}        # {name: SpanStats}
+        self._ctx           = {}        # {name: _Span}
+        self._starts        = {}        # {name: perf_counter()} of the spans opened by start()
+        self._frames        = 0
+        self._objects       = 0
+        self._last_report   = time.perf_counter()
+
+    def span(self, name):
+        """
+            Time a block:   with PERF_MONITOR.span('propagate'): ...
+        """
+        ctx = self._ctx.get(name)
+        if ctx is None:
+            ctx = self._ctx[name] = _Span(self, name)
+        return ctx
+
+    def record(self, name, seconds):
+        """ Add one duration to a span, creating the span on its first use. """
+        if not self._enabled:
+            return
+        stats = self._spans.get(name)
+        if stats is None:
+            stats = self._spans[name] = SpanStats(self._capacity)
+        stats.add(seconds)
+
+    def start(self, name):
+        self._starts[name] = time.perf_counter()
+
+    def stop(self, name):
+        """ Close a span opened by start(); a stop without a start is ignored. """
+        t0 = self._starts.pop(name, None)
+        if t0 is not None:
+            self.record(name, time.perf_counter() - t0)
+
+    '''===== FRAMES ============================================================================================'''
+
+    def start_frame(self):
+        self.start('frame')
+
+    def end_frame(self, num_objects=0):
+        """ Close the frame, and report once REPORT_PERIOD has passed since the last report. """
+        self.stop('frame')
+        self._frames += 1
+        self._objects = num_objects
+        now = time.perf_counter()
+        if now - self._last_report >= self._report_period:
+            stats = self.report(now)
+            self.performance_update.emit(stats)
+            if stats['spans'].get('frame', {}).get('p95_ms', 0.0) > self._frame_budget * 1e3:
+                self.warning.emit(f"p95 frame time {stats['spans']['frame']['p95_ms']:.1f} ms "
+                                  f"is over the budget of {self._frame_budget * 1e3:.1f} ms")
+
+    def start_batch(self):
+        self.start('batch')
+
+    def end_batch(self):
+        self.stop('batch')
+
+    def start_draw(self):
+        self.start('draw')
+
+    def end_draw(self):
+        self.stop('draw')
+
+    def report(self, now=None):
+        """
+            The frame rate since the last report and the summary of every span.
+
+        Returns
+        -------
+        dict    : fps, objects, and spans: {name: summary, see SpanStats.summary}
+        """
+        if now is None:
+            now = time.perf_counter()
+        elapsed = now - self._last_report
+        fps = self._frames / elapsed if elapsed > 0 else 0.0
+        self._frames = 0
+        self._last_report = now
+
+        return dict(fps=fps, objects=self._objects, spans=self.stats())
+
+    '''===== QUERIES ==========================================================================================='''
+
+    def stats(self, name=None):
+        """
+        Returns
+        -------
+        dict    : the summary of one span, or {name: summary} of them all if name is None
+        """
+        if name is not None:
+            return self._spans[name].summary() if name in self._spans else SpanStats(1).summary()
+        return {n: s.summary() for n, s in self._spans.items()}
+
+    def samples(self, name):
+        """ The durations held for a span, oldest first (seconds). """
+        return self._spans[name].samples() if name in self._spans else np.zeros((0,))
+
+    def export_csv(self, fname, stats=None):
+        """ Write the summary of every span, or of the given stats, one span per row. """
+        if stats is None:
+            stats = self.stats()
+        with open(fname, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('span',) + STAT_KEYS)
+            for name, summary in stats.items():
+                writer.writerow((name,) + tuple(summary[k] for k in STAT_KEYS))
+
+    def export_json(self, fname, stats=None):
+        """ Write the summary of every span, or of the given stats, as {span: summary}. """
+        if stats is None:
+            stats = self.stats()
+        Path(fname).write_text(json.dumps(stats, indent=2))
+
+    def export(self, fname, stats=None):
+        """ export_csv() or export_json(), by the suffix of the file name. """
+        match Path(fname).suffix.lower():
+            case '.csv':
+                self.export_csv(fname, stats)
+            case '.json':
+                self.export_json(fname, stats)
+            case suffix:
+                raise ValueError(f'>>>ERROR: cannot export performance stats as {suffix!r}, use .csv or .json')
+
+    def clear(self):
+        for stats in self._spans.values():
+            stats.clear()
+        self._starts.clear()
+
+    '''===== PROPERTIES ========================================================================================'''
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, new_enabled):
+        self._enabled = bool(new_enabled)
+
+    @property
+    def span_names(self):
+        return tuple(self._spans.keys())
+
+
+PERF_MONITOR = PerformanceMonitor()     # the spans of this process
@@ -0,0 +1,39 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# performance_overlay.py
+# This module shows the reports of a PerformanceMonitor in a small label over the canvas:
+# the frame rate and the p50/p95/p99 of each span, in milliseconds.
+from PyQt5 import QtCore, QtWidgets
+
+
+class PerformanceOverlay(QtWidgets.QLabel):
+    """
+        A translucent label in the top left corner of a widget, usually the native canvas.
+    """
+    def __init__(self, parent=None):
+        super(PerformanceOverlay, self).__init__(parent)
+        self.setAttribute(QtCore.Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.setStyleSheet("QLabel { background-color: rgba(0, 0, 0, 140); color: #c0ffc0;"
+                           " font-family: monospace; font-size: 9pt; padding: 4px; }")
+        self.setText('-- fps')
+        self.adjustSize()
+        self.move(8, 8)
+
+    def update_metrics(self, stats):
+        """
+        Parameters
+        ----------
+        stats       : dict      a report of PerformanceMonitor, see PerformanceMonitor.report()
+        """
+        lines = [f"{stats['fps']:6.1f} fps   {stats['objects']} bodies",
+                 f"{'span':<17}{'p50':>7}{'p95':>7}{'p99':>7}"]
+        for name, summary in stats['spans'].items():
+            lines.append(f"{name:<17}{summary['p50_ms']:7.2f}{summary['p95_ms']:7.2f}{summary['p99_ms']:7.2f}")
+        self.setText('\n'.join(lines))
+        self.adjustSize()
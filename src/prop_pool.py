@@ -0,0 +1,236 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# prop_pool.py
+# This module defines a pool of worker processes that propagate the bodies of a SimObjectDict.
+# The bodies with orbits are split into one shard per worker. Each worker keeps the packed
+# initial states and rotation functions of its shard between steps, and writes its rows
+# straight into a state array in shared memory, so a step only sends an epoch to each worker.
+# Bodies that have to propagate themselves (the primary, ephem-only bodies) are stepped in the
+# calling process while the workers run.
+import os
+import queue
+import time
+from multiprocessing import Process, Queue
+from multiprocessing import shared_memory as shm
+
+import numpy as np
+
+from sim_body import rot_elements_at
+from sim_propagator import SEC_PER_DAY, kepler_uv, pack_key, pack_orbits
+
+DEF_POOL_WORKERS  = max(1, min(8, (os.cpu_count() or 2) - 1))
+DEF_POOL_CAPACITY = 256         # rows of the shared state array, doubled when it runs out
+POOL_TIMEOUT      = 30.0        # seconds for the workers to finish a command
+POOL_POLL_PERIOD  = 0.5         # seconds between checks that the workers are still alive
+
+
+def _pool_worker(shm_name, capacity, cmd_q, done_q, wid):
+    """
+        The loop run by each worker process.
+        Commands are ('load', shard), ('step', jd) and ('stop', None).
+    """
+    mem = shm.SharedMemory(name=shm_name)
+    states = np.ndarray((capacity, 3, 3), dtype=np.float64, buffer=mem.buf)
+    shard = None
+    try:
+        while True:
+            op, payload = cmd_q.get()
+            if op == 'stop':
+                break
+
+            try:
+                if op == 'load':
+                    shard = payload
+                elif op == 'step':
+                    jd = payload
+                    rows = shard['rows']
+                    r, v = kepler_uv(**shard['rv0'], dt=(jd - shard['jd0']) * SEC_PER_DAY)
+                    states[rows, 0] = r * shard['to_dist'][:, None]
+                    states[rows, 1] = v * shard['to_dist'][:, None]
+                    for row, rot_func, name in zip(rows, shard['rot_funcs'], shard['names']):
+                        states[row, 2] = rot_elements_at(rot_func, name, jd)
+
+                done_q.put((wid, op, None))
+
+            except Exception as err:
+                done_q.put((wid, op, f'{type(err).__name__}: {err}'))
+
+    finally:
+        del states
+        mem.close()
+
+
+class PropPool:
+    """
+        A set of persistent worker processes, each propagating a shard of the bodies
+        into a shared (capacity, 3, 3) state array.
+    """
+    def __init__(self, num_workers=DEF_POOL_WORKERS, capacity=DEF_POOL_CAPACITY):
+        """
+        Parameters
+        ----------
+        num_workers : int       the number of worker processes
+        capacity    : int       the initial number of rows of the shared state array
+        """
+        if num_workers < 1:
+            raise ValueError(f'>>>ERROR: a PropPool needs at least one worker, not {num_workers}.')
+
+        self._num_workers = num_workers
+        self._names       = ()
+        self._pack_key    = None
+        self._simbods     = ()
+        self._own_idx     = None
+        self._busy        = []      # workers that were given a non-empty shard
+        self._shm         = None
+        self._workers     = []
+        self._start(capacity)
+
+    def _start(self, capacity):
+        """ Create the shared state array and start the workers on it. """
+        self._capacity = capacity
+        self._shm      = shm.SharedMemory(create=True, size=capacity * 9 * 8)
+        self._states   = np.ndarray((capacity, 3, 3), dtype=np.float64, buffer=self._shm.buf)
+        self._done_q   = Queue()
+        self._cmd_qs   = [Queue() for _ in range(self._num_workers)]
+        self._workers  = [Process(target=_pool_worker,
+                                  args=(self._shm.name, capacity, cmd_q, self._done_q, wid),
+                                  daemon=True)
+                          for wid, cmd_q in enumerate(self._cmd_qs)]
+        [w.start() for w in self._workers]
+
+    def _wait(self, wids, op, timeout=POOL_TIMEOUT):
+        """
+            Wait for every worker in wids to report that it finished op. If a worker dies or
+            the workers do not finish in time, the pool is restarted with fresh workers, which
+            must be packed again, and RuntimeError is raised.
+        """
+        errors = []
+        pending = set(wids)
+        deadline = time.monotonic() + timeout
+        while pending:
+            try:
+                wid, done_op, err = self._done_q.get(timeout=POOL_POLL_PERIOD)
+            except queue.Empty:
+                dead = sorted(w for w in pending if not self._workers[w].is_alive())
+                if dead:
+                    self._restart()
+                    raise RuntimeError(f'>>>ERROR: pool workers {dead} died during {op}.')
+                if time.monotonic() >= deadline:
+                    self._restart()
+                    raise RuntimeError(f'>>>ERROR: pool workers {sorted(pending)} did not finish '
+                                       f'{op} in {timeout} seconds.')
+                continue
+
+            pending.discard(wid)
+            if err is not None:
+                errors.append(f'worker {wid} failed to {done_op}: {err}')
+
+        if errors:
+            raise RuntimeError('>>>ERROR: ' + '; '.join(errors))
+
+    def _restart(self):
+        """ Replace every worker, dropping the shards they held. """
+        self._stop()
+        self._start(self._capacity)
+        self._own_idx = None
+        self._busy = []
+
+    def pack(self, simbods):
+        """
+            Split the bodies into shards and load each worker with the states of its shard.
+
+        Parameters
+        ----------
+        simbods     : dict      SimBody objects keyed by name, in the order of the state rows
+        """
+        self._names    = tuple(simbods.keys())
+        self._pack_key = pack_key(simbods)
+        self._simbods  = tuple(simbods.values())
+        if len(self._simbods) > self._capacity:
+            self._stop()
+            self._start(max(len(self._simbods), 2 * self._capacity))
+
+        kep_idx, self._own_idx, rv0, jd0, to_dist = pack_orbits(self._simbods)
+        self._busy = []
+        for wid, part in enumerate(np.array_split(np.arange(len(kep_idx)), self._num_workers)):
+            if not len(part):
+                continue
+
+            rows = kep_idx[part]
+            shard = dict(rows=rows,
+                         rv0={k: val[part] for k, val in rv0.items()},
+                         jd0=jd0[part],
+                         to_dist=to_dist[part],
+                         rot_funcs=[self._simbods[row]._rot_func for row in rows],
+                         names=[self._names[row] for row in rows],
+                         )
+            self._cmd_qs[wid].put(('load', shard))
+            self._busy.append(wid)
+
+        self._wait(self._busy, 'load')
+
+    def is_packed(self, simbods):
+        return self._own_idx is not None and self._pack_key == pack_key(simbods)
+
+    def propagate(self, epoch):
+        """
+            Propagate every packed body to the given epoch.
+
+        Parameters
+        ----------
+        epoch       : Time or float     The epoch to which the states are to be set,
+                                        or its TDB Julian date
+
+        Returns
+        -------
+        np.ndarray(N, 3, 3)     : the state matrix of each body in packing order,
+                                  a view into the shared state array
+        """
+        jd = epoch.tdb.jd if hasattr(epoch, 'tdb') else float(epoch)
+        for wid in self._busy:
+            self._cmd_qs[wid].put(('step', jd))
+
+        #   the remaining bodies are stepped here while the workers run
+        for idx in self._own_idx:
+            sb = self._simbods[idx]
+            sb.update_state(epoch)
+            self._states[idx] = sb.state
+
+        self._wait(self._busy, 'step')
+
+        return self._states[:len(self._simbods)]
+
+    def _stop(self):
+        """ Stop the workers and release the shared state array. """
+        for cmd_q, w in zip(self._cmd_qs, self._workers):
+            if w.is_alive():
+                cmd_q.put(('stop', None))
+        for w in self._workers:
+            w.join(timeout=5.0)
+            if w.is_alive():
+                w.terminate()
+
+        self._workers = []
+        self._states = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def close(self):
+        self._stop()
+        self._own_idx = None
+
+    @property
+    def num_workers(self):
+        return self._num_workers
+
+    @property
+    def names(self):
+        return self._names
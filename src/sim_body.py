@@ -15,31 +15,46 @@
 #  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
 #
 #
-import logging
-
-logging.basicConfig(filename="c:\_Projects\sns_dev\logs\sns_simbod.log",
-                    level=logging.ERROR,
-                    format="%(funcName)s:\t\t%(levelname)s:%(asctime)s:\t%(message)s",
-                    )
-
+import psygnal
 from sim_object import *
 from vispy.color import Color
+from astropy.coordinates import CartesianDifferential, CartesianRepresentation
 from poliastro.bodies import Body
 from poliastro.twobody.orbit.scalar import Orbit
 from poliastro.ephem import Ephem
 from poliastro.frames import Planes
 from poliastro.util import time_range
 from poliastro.twobody.propagation import RecseriesPropagator
+from ephem_cache import EphemCache, cache_key
+from sim_ephem import CHEB_SEG_SAMPLES, ChebyshevEphem
+from sim_propagator import MU_UNIT, SEC_PER_DAY, kepler_uv
+from track_sampler import TRACK_MAX_POINTS, TRACK_MAX_TURN, sample_track
+from sim_logging import TRACE, get_logger, tracing
+
+_log = get_logger(__name__)
 
 MIN_FOV = 1 / 3600      # I think this would be arc-seconds
+J2000_JD = J2000_TDB.jd
 
 
 def toTD(epoch=None):
-    d = (epoch - J2000_TDB).jd
+    if type(epoch) == Time:
+        d = (epoch - J2000_TDB).jd
+    else:                               # a float64 TDB Julian date
+        d = epoch - J2000_JD
     T = d / 36525
     return dict(T=T, d=d)
 
 
+def rot_elements_at(rot_func, name, epoch):
+    """ Evaluate a rotation function from the datastore, see SimBody.rot_elements. """
+    #   Funky earth rotation function...
+    if name != "Earth":
+        return rot_func(**toTD(epoch))
+    else:
+        return rot_func(epoch)
+
+
 class SimBody(SimObject):
     """
         This subclass of SimObject will provide the specific attributes and
@@ -50,6 +65,9 @@ class SimBody(SimObject):
         and the angular displacement over time. SimObjects effectively have a
         predetermined state over time and move strictly under gravitational forces.
     """
+    field_changed = psygnal.Signal(str, tuple)     # (body name, field_ids) of values that have changed
+    ephem_cache   = EphemCache()                    # ephem samples and tracks kept between runs
+
     def __init__(self, body_data=None, vizz_data=None):
         super(SimBody, self).__init__()
         self._body_data     = body_data
@@ -59,35 +77,38 @@ class SimBody(SimObject):
         self._rot_func      = self._body_data['rot_func']
         self._o_period      = self._body_data['o_period']
         self._is_primary    = False
-
-        self.set_dimensions()
-        self.set_ephem(epoch=self._epoch)
-        self.set_orbit(ephem=self._ephem)
         self._rad_set    = [MIN_SIZE, ] * 3
         self._plane      = Planes.EARTH_ECLIPTIC
-        self._body       = None
         self._rank       = False
         self._RESAMPLE   = False
         self._parent     = None
         self._sim_parent = None
-        self._rot_func   = None
         self._type       = None
         self._ephem      = None
+        self._cheb       = None     # ChebyshevEphem fitted over the ephem window
         self._orbit      = None
         self._trajectory = None
         self._field_dict = None
         self._periods    = 365
         self._o_period   = 1.0 * u.year
         self._spacing    = self._o_period.to(u.d) / self._periods       # approx 1 day
-        self._end_epoch  = self._epoch + self._periods * self._spacing
+        self._end_epoch  = self._epoch
         self._axes       = np.identity(4, dtype=np.float64)
         # for some reason this slowed things down a lot
         self.x_ax        = self._axes[0:3, 0]
         self.y_ax        = self._axes[0:3, 1]
         self.z_ax        = self._axes[0:3, 2]
         self._prop       = RecseriesPropagator(self._body, self._spacing)
-        pass
-        self._field_dict = None
+        self._raw_rv0    = None     # packed state for the unit-free path
+        self._raw_jd0    = None
+        self._to_dist    = None
+        self._pack_gen   = 0        # bumped whenever the state packed by pack_orbits() changes
+        self._elem_orbit = None     # the Orbit of the current state when _orbit was not advanced
+
+        #   the attributes above must exist before the ephem and orbit are computed
+        self.set_dimensions()
+        self.set_ephem(epoch=self._epoch)
+        self.set_orbit(ephem=self._ephem)
         SimBody.system[self._name] = self
         self.created.emit(self.name)
 
@@ -99,7 +120,21 @@ class SimBody(SimObject):
     #   If the dist unit changes, must refactor attribute values
     def dist_unit(self, new_du):
         if type(new_du) == u.Unit:
+            to_new = (1 * self._dist_unit).to_value(new_du)
             self._dist_unit = new_du
+            self._pack_gen += 1
+            #   what was fitted or sampled in the old unit is rescaled, the raw path repacks
+            self._raw_rv0 = None
+            if self._cheb is not None:
+                self._cheb = self._cheb.scaled(to_new)
+            if self._trajectory is not None:
+                self._trajectory = self._trajectory * to_new
+            if self._state.shape == (3, 3):                 # r and v, the rotation is unitless
+                self._state[:2] *= to_new
+                if self._registry is not None:
+                    self._registry.invalidate_pos()
+            self.set_dimensions()
+            self.field_changed.emit(self._name, ('radius', 'track_data', 'pos'))
 
     @property
     def parent(self):
@@ -118,8 +153,7 @@ class SimBody(SimObject):
 
     @property
     def track(self):
-        if self._trajectory:
-            return self._trajectory.xyz.transpose().value
+        return self._trajectory
 
     @property
     def plane(self):
@@ -128,6 +162,7 @@ class SimBody(SimObject):
     @plane.setter
     def plane(self, new_plane=None):
         self._plane = new_plane
+        self.field_changed.emit(self._name, ('track_data',))
 
     @property
     def spacing(self):
@@ -143,8 +178,22 @@ class SimBody(SimObject):
 
     @property
     def epoch(self):
+        if self._epoch is None:                     # last set through the unit-free path
+            self._epoch = Time(self._jd, format='jd', scale='tdb')
         return self._epoch
 
+    @property
+    def jd(self):
+        """ The epoch of the body as a float64 TDB Julian date. """
+        if self._jd is None:
+            self._jd = self._epoch.tdb.jd
+        return self._jd
+
+    def set_jd(self, jd):
+        """ Set the epoch to a TDB Julian date. The Time is only built when epoch is read. """
+        self._jd = float(jd)
+        self._epoch = None
+
     @epoch.setter
     def epoch(self, new_epoch=None):
         if new_epoch is None:
@@ -170,6 +219,7 @@ class SimBody(SimObject):
     def epoch(self, e=None):
         if type(e) == Time:
             self._epoch = e
+            self._jd = None
 
     @property
     def elem_coe(self):
@@ -191,6 +241,11 @@ class SimBody(SimObject):
     def orbit(self):
         return self._orbit
 
+    @property
+    def pack_gen(self):
+        """ Changes whenever the orbit or dist_unit do, so a packed copy of the state is stale. """
+        return self._pack_gen
+
     def set_dimensions(self, **kwargs):
         if (self._name == 'Sun' or self._type == 'star' or
                 (self._body.R_mean.value == 0 and self._body.R_polar.value == 0)):
@@ -204,11 +259,22 @@ class SimBody(SimObject):
 
         self._rad_set = [R, Rm, Rp]
         self._body_data.update({'rad_set': self._rad_set})
-        logging.info("RADIUS SET: %s", self._rad_set)
+        self.field_changed.emit(self._name, ('radius',))
+        _log.debug("RADIUS SET: %s", self._rad_set)
 
     def set_ephem(self, epoch=None, t_range=None):
+        """
+            Compute the ephem over a window of epochs and fit the Chebyshev table
+            that the state updates evaluate in place of the ephem itself.
+
+        Parameters
+        ----------
+        epoch           :   Time            Start of the window, defaults to the body epoch
+        t_range         :   Time            The epochs of the ephem, defaults to _periods
+                                            samples at _spacing from epoch
+        """
         if epoch is None:
-            epoch = self._epoch
+            epoch = self.epoch
         if t_range is None:                                         # sets t_range from epoch to epoch + orbital period
             t_range = time_range(epoch,
                                  periods=self._periods,
@@ -216,22 +282,84 @@ class SimBody(SimObject):
                                  format='jd',
                                  scale='tdb',
                                  )
-            self._end_epoch += self._periods * self._spacing
-
-        if self._orbit is None:                                     # first time through
-            self._ephem = Ephem.from_body(self._body,
-                                          epochs=t_range,
-                                          attractor=self.body.parent,
-                                          plane=self._plane,
-                                          )
-        elif self._orbit != 0:                                      # this body has a parent
-            self._ephem = Ephem.from_orbit(orbit=self._orbit,
-                                           epochs=t_range,
-                                           plane=self._plane,
-                                           )
 
-        logging.info("EPHEM for %s: %s", self.name, str(self._ephem))
-        print(f'EPHEM for {self.name:^9}: {self._ephem}')
+        self._end_epoch = t_range[-1]
+        self._ephem = self._cached_ephem(t_range)
+
+        self._cheb = ChebyshevEphem.from_source(self._ephem_source,
+                                                t_range[0].tdb.jd,
+                                                t_range[-1].tdb.jd,
+                                                CHEB_SEG_SAMPLES * self._spacing.to_value(u.d),
+                                                )
+
+        _log.debug("EPHEM for %s: %s", self.name, self._ephem)
+
+    def _cached_ephem(self, t_range):
+        """
+            The ephem over t_range, rebuilt from the ephem cache when it holds the samples
+            and computed (then cached) otherwise.
+        """
+        if type(self._orbit) != Orbit:                              # first time through, or the primary
+            source = ('body', getattr(self.body.parent, 'name', None))
+        else:                                                       # this body has a parent
+            source = ('orbit', f'{self._orbit.epoch.tdb.jd:.9f}')
+        key = cache_key('ephem', self._name, self._plane,
+                        t_range[0].tdb.jd, t_range[-1].tdb.jd, self._spacing.to_value(u.d),
+                        len(t_range), *source)
+
+        samples = SimBody.ephem_cache.load(key)
+        if samples is not None and samples.shape == (len(t_range), 6):
+            coords = CartesianRepresentation(samples[:, :3].T * u.km,
+                                             xyz_axis=0,
+                                             differentials=CartesianDifferential(samples[:, 3:].T * (u.km / u.s),
+                                                                                 xyz_axis=0),
+                                             )
+            return Ephem(coords, t_range, self._plane)
+
+        if source[0] == 'body':
+            ephem = Ephem.from_body(self._body,
+                                    epochs=t_range,
+                                    attractor=self.body.parent,
+                                    plane=self._plane,
+                                    )
+        else:
+            ephem = Ephem.from_orbit(orbit=self._orbit,
+                                     epochs=t_range,
+                                     plane=self._plane,
+                                     )
+
+        r, v = ephem.rv()
+        SimBody.ephem_cache.save(key, np.hstack((r.to_value(u.km), v.to_value(u.km / u.s))))
+
+        return ephem
+
+    def _ephem_source(self, jd):
+        """ Sample the ephem at an array of TDB Julian dates, as plain dist_unit arrays.
+        """
+        r, v = self._ephem.rv(Time(jd, format='jd', scale='tdb'))
+        return (np.reshape(r.to_value(self._dist_unit), (-1, 3)),
+                np.reshape(v.to_value(self._dist_unit / u.s), (-1, 3)))
+
+    def ephem_rv(self, jd):
+        """
+            Evaluate the ephem state from the Chebyshev table, refitting it over a
+            new window first whenever the epoch has left the current one.
+
+        Parameters
+        ----------
+        jd              :   float           TDB Julian date
+
+        Returns
+        -------
+        r, v            :   np.ndarray(3,)  position and velocity in dist_unit and dist_unit/s
+        """
+        if not self._cheb.covers(jd):
+            start = jd
+            if jd < self._cheb.jd_start:        # running backwards, so end the new window at jd
+                start -= (self._periods - 1) * self._spacing.to_value(u.d)
+            self.set_ephem(Time(start, format='jd', scale='tdb'))
+
+        return self._cheb.rv(jd)
 
     def set_orbit(self, ephem=None):
         if ephem is None:
@@ -240,27 +368,31 @@ class SimBody(SimObject):
         if self.body.parent is not None:
             self._orbit = Orbit.from_ephem(self.body.parent,
                                            ephem,
-                                           self._epoch,
+                                           self.epoch,
                                            self._prop,
                                            )
+            self._raw_rv0 = None
+            self._elem_orbit = None
+            self._pack_gen += 1
             # print(self._orbit)
-            logging.info(">>> COMPUTING ORBIT: %s",
-                         str(self._orbit))
+            _log.debug(">>> COMPUTING ORBIT: %s", self._orbit)
             if (self._trajectory is None) or (self._RESAMPLE is True):
-                self._trajectory = self._orbit.sample(720)
+                self._trajectory = self._sample_track()
                 self._RESAMPLE = False
+                self.field_changed.emit(self._name, ('track_data',))
 
         elif self._body.parent is None:
             self._orbit = 0
-            logging.info(">>> NO PARENT BODY, Orbit set to: %s",
-                         str(self._orbit))
+            _log.debug(">>> NO PARENT BODY, Orbit set to: %s", self._orbit)
 
     def update_state(self, epoch=None):
         """
 
         Parameters
         ----------
-        epoch           :   Time            The epoch to which the state is to be set
+        epoch           :   Time or float   The epoch to which the state is to be set.
+                                            A float is taken as a TDB Julian date and
+                                            selects the unit-free path (see _update_raw)
 
         Returns
         -------
@@ -268,40 +400,112 @@ class SimBody(SimObject):
         """
         new_state = None
         if epoch:
-            if type(epoch) == Time:
-                self._epoch = epoch
+            if type(epoch) != Time:
+                self._update_raw(float(epoch))
+                return
+
+            self._epoch = epoch
+            self._jd = None
 
             if type(self._orbit) == Orbit:
                 new_orbit = self._orbit.propagate(self._epoch)
-
-                #   Funky earth rotation function...
-                if self._name != "Earth":
-                    rot_vec = self._rot_func(**toTD(self._epoch))
-                else:
-                    rot_vec = self._rot_func(self._epoch)
-
                 new_state = np.array([new_orbit.r.to(self._dist_unit).value,
                                       new_orbit.v.to(self._dist_unit / u.s).value,
-                                      rot_vec,
+                                      self.rot_elements(self._epoch),
                                       ])
                 self._orbit = new_orbit
             else:
-                new_state = np.array([self._ephem.rv(self._epoch)[0].to(self._dist_unit).value,
-                                      self._ephem.rv(self._epoch)[1].to(self._dist_unit / u.s).value,
-                                      self._rot_func(**toTD(self._epoch)),
+                r, v = self.ephem_rv(self.jd)
+                new_state = np.array([r,
+                                      v,
+                                      self.rot_elements(self._epoch),
                                       ])
 
         # self.update_pos(self._state.[0])
-        logging.info("Outputting state for\nBODY:%s\nEPOCH:%s\n||POS||:%s\n||VEL||:%s\nROT:%s\n",
+        if tracing(_log):
+            _log.log(TRACE, "Outputting state for\nBODY:%s\nEPOCH:%s\n||POS||:%s\n||VEL||:%s\nROT:%s\n",
                      self,
                      self._epoch,
                      np.linalg.norm(new_state[0]),
                      np.linalg.norm(new_state[1]),
                      new_state[2],
                      )
-        self._state = new_state
+        if self._row is None:
+            self._state = new_state
+        else:
+            self._state[:] = new_state              # keep the view into the registry row
+            self._registry.invalidate_pos()
         # return self._state
 
+    def _pack_raw(self):
+        """ Pack the current Orbit into a plain float64 state for the unit-free path.
+        """
+        self._raw_rv0 = dict(r0=self._orbit.r.to_value(u.km),
+                             v0=self._orbit.v.to_value(u.km / u.s),
+                             mu=self._orbit.attractor.k.to_value(MU_UNIT),
+                             )
+        self._raw_jd0 = self._orbit.epoch.tdb.jd
+        self._to_dist = (1 * u.km).to_value(self._dist_unit)
+
+    def _sample_track(self):
+        """ Sample the orbit track in dist_unit, with the points placed where the track bends,
+            or read it from the ephem cache if this orbit was sampled before.
+        """
+        jd = self._orbit.epoch.tdb.jd
+        key = cache_key('track', self._name, self._plane, jd, jd, self._spacing.to_value(u.d),
+                        self._orbit.attractor.name, TRACK_MAX_TURN, TRACK_MAX_POINTS)
+        track = SimBody.ephem_cache.load(key)
+        if track is None:
+            track = sample_track(self._orbit.r.to_value(u.km),
+                                 self._orbit.v.to_value(u.km / u.s),
+                                 self._orbit.attractor.k.to_value(MU_UNIT),
+                                 )
+            SimBody.ephem_cache.save(key, track)
+
+        return track * (1 * u.km).to_value(self._dist_unit)
+
+    def _update_raw(self, jd):
+        """
+            The unit-free propagation path. The epoch is kept as a float64 TDB Julian date
+            and the state as plain dist_unit and dist_unit/s values, so no astropy Quantity
+            or Time is built per tick; these are only made when the epoch, r, v or pos
+            properties are read. The Orbit object itself is not advanced on this path.
+
+        Parameters
+        ----------
+        jd              :   float           TDB Julian date to which the state is to be set
+        """
+        self.set_jd(jd)
+        if self._state.shape != (3, 3):
+            self._state = np.zeros((3, 3), dtype=np.float64)
+
+        if type(self._orbit) == Orbit:
+            if self._raw_rv0 is None:
+                self._pack_raw()
+            r, v = kepler_uv(**self._raw_rv0, dt=(jd - self._raw_jd0) * SEC_PER_DAY)
+            self._state[0] = r[0] * self._to_dist
+            self._state[1] = v[0] * self._to_dist
+        else:
+            self._state[0], self._state[1] = self.ephem_rv(jd)
+
+        self._state[2] = self.rot_elements(jd)
+        if self._registry is not None:
+            self._registry.invalidate_pos()
+
+    def rot_elements(self, epoch):
+        """
+            Evaluate the rotational elements (RA, DEC, W) of the body.
+
+        Parameters
+        ----------
+        epoch           :   Time or float   The epoch, or its TDB Julian date
+
+        Returns
+        -------
+        tuple           :   (RA, DEC, W) in degrees
+        """
+        return rot_elements_at(self._rot_func, self._name, epoch)
+
     # def set_parent(self, sb=None):
     #     if type(sb) == Body:
     #         self._sim_parent = sb
@@ -344,7 +548,7 @@ class SimBody(SimObject):
             if self._sim_parent:
                 return self.sys_primary(self._sim_parent)
             else:
-                print("Error: SimSystem parentage not set...")
+                _log.error('the SimSystem parentage of %s is not set', self._name)
         else:
             return self
 
@@ -381,6 +585,9 @@ class SimBody(SimObject):
 
     @property                   # this returns the position of a body plus the position of the primary
     def pos2primary(self):
+        if self._registry is not None:              # composed once per update for the whole system
+            return self._registry.pos[self._row] * self._dist_unit
+
         _pos = self._state[0] * self._dist_unit
         if self._sim_parent is None:
             return np.zeros((3,), dtype=np.float64) * self._dist_unit
@@ -396,12 +603,30 @@ class SimBody(SimObject):
             res.append(a)
         return res
 
+    def _current_orbit(self):
+        """
+            The Orbit at the epoch of the body. Only the 'body' propagation mode advances the
+            Orbit itself; after the other modes it is rebuilt from the propagated state, once
+            per epoch, so the orbital elements follow the state in every mode.
+        """
+        if type(self._orbit) != Orbit or abs(self._orbit.epoch.tdb.jd - self.jd) < 1e-9:
+            return self._orbit
+
+        if self._elem_orbit is None or abs(self._elem_orbit.epoch.tdb.jd - self.jd) >= 1e-9:
+            self._elem_orbit = Orbit.from_vectors(self._orbit.attractor,
+                                                  self._state[0] * self._dist_unit,
+                                                  self._state[1] * self._dist_unit / u.s,
+                                                  epoch=self.epoch,
+                                                  plane=self._orbit.plane,
+                                                  )
+        return self._elem_orbit
+
     @property
     def elem_coe(self):
         if self._is_primary:
             res = np.zeros((6,), dtype=np.float64)
         else:
-            res = list(self._orbit.classical())
+            res = list(self._current_orbit().classical())
 
         return res
 
@@ -410,13 +635,13 @@ class SimBody(SimObject):
         if self._rank == 0:
             res = np.zeros((3, 3), dtype=np.float64)
         else:
-            res = list(self._orbit.pqw())
+            res = list(self._current_orbit().pqw())
 
         return res
 
     @property
     def elem_rv(self):
-        res = list(self._orbit.rv())
+        res = list(self._current_orbit().rv())
 
         return res
 
@@ -428,14 +653,29 @@ class SimBody(SimObject):
     def body_alpha(self):
         return self._vizz_data['body_alpha']
 
+    @body_alpha.setter
+    def body_alpha(self, new_alpha):
+        self._vizz_data['body_alpha'] = new_alpha
+        self.field_changed.emit(self._name, ('body_alpha', 'body_color'))
+
     @property
     def track_alpha(self):
         return self._vizz_data['track_alpha']
 
+    @track_alpha.setter
+    def track_alpha(self, new_alpha):
+        self._vizz_data['track_alpha'] = new_alpha
+        self.field_changed.emit(self._name, ('track_alpha',))
+
     @property
     def body_mark(self):
         return self._vizz_data['body_mark']
 
+    @body_mark.setter
+    def body_mark(self, new_mark):
+        self._vizz_data['body_mark'] = new_mark
+        self.field_changed.emit(self._name, ('body_mark',))
+
     @property
     def body_color(self):
         res = Color(self._vizz_data['body_color'])
@@ -443,6 +683,11 @@ class SimBody(SimObject):
 
         return res
 
+    @body_color.setter
+    def body_color(self, new_color):
+        self._vizz_data['body_color'] = new_color
+        self.field_changed.emit(self._name, ('body_color',))
+
     @property
     def track_color(self):
         res = Color(self._vizz_data['body_color'])
@@ -8,8 +8,6 @@
 #
 #  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import logging
-
 import psygnal
 from PyQt5.QtCore import pyqtSignal
 from vispy import app, scene
@@ -18,11 +16,6 @@ from vispy.scene.cameras import BaseCamera
 
 from sim_camset import CameraSet
 
-logging.basicConfig(filename="logs/mainsimwin.log",
-                    level=logging.ERROR,
-                    format="%(funcName)s:\t\t%(levelname)s:%(asctime)s:\t%(message)s",
-                    )
-
 
 class CanvasWrapper:
     """     This class simply encapsulates the simulation, which resides within
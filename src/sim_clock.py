@@ -0,0 +1,158 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# sim_clock.py
+# This module defines the clock that drives the simulation epoch in the model process.
+# The epoch, warp factor and direction are plain float64 values, and the clock advances
+# against the monotonic wall clock at a fixed tick rate, so no widget or Time object is
+# involved in stepping the model. The viewer only samples the epoch for display.
+import time
+
+from astropy.time import Time
+from poliastro.constants import J2000_TDB
+
+from sim_propagator import SEC_PER_DAY
+
+DEF_TICK_RATE = 60.0        # model ticks per second of wall time
+
+
+class SimClock:
+    """
+        The simulation clock. The epoch is a TDB Julian date, the warp is the number of
+        simulated seconds per second of wall time, and the direction is +1 or -1.
+    """
+    def __init__(self, jd=J2000_TDB.jd, warp=1.0, direction=1, tick_rate=DEF_TICK_RATE):
+        """
+        Parameters
+        ----------
+        jd          : float     the starting epoch as a TDB Julian date
+        warp        : float     simulated seconds per wall second
+        direction   : int       +1 to run forward, -1 to run backward
+        tick_rate   : float     the number of ticks per second of wall time
+        """
+        if tick_rate <= 0:
+            raise ValueError(f'>>>ERROR: tick rate must be positive, not {tick_rate}.')
+
+        self._jd        = float(jd)
+        self._warp      = 0.0
+        self._direction = 1
+        self._period    = 1.0 / tick_rate
+        self._running   = False
+        self._last_t    = time.perf_counter()
+        self._next_t    = self._last_t + self._period
+        self.warp       = warp
+        self.direction  = direction
+
+    def start(self):
+        """ Run the clock from now on. """
+        if not self._running:
+            self._last_t = time.perf_counter()
+            self._next_t = self._last_t + self._period
+            self._running = True
+
+    def pause(self):
+        """ Hold the epoch where it is. """
+        self._running = False
+
+    def reverse(self):
+        """ Swap the direction in which the epoch runs. """
+        self._direction = -self._direction
+
+    def reset(self, jd):
+        """ Move the epoch to a TDB Julian date, leaving the warp, direction and run state alone. """
+        self._jd = float(jd)
+
+    def step(self, dt):
+        """ Move the epoch by dt simulated seconds, regardless of the warp and direction. """
+        self._jd += dt / SEC_PER_DAY
+
+        return self._jd
+
+    def wait_time(self, now=None):
+        """ The wall seconds left until the next tick is due. """
+        if now is None:
+            now = time.perf_counter()
+
+        return max(0.0, self._next_t - now)
+
+    def tick(self, now=None):
+        """
+            Advance the epoch by the wall time elapsed since the last tick, scaled by the warp.
+            Nothing happens before the next tick is due, and ticks that were missed are skipped
+            rather than run late.
+
+        Parameters
+        ----------
+        now         : float     the wall time from time.perf_counter(), taken here if not given
+
+        Returns
+        -------
+        bool        : True if the epoch moved
+        """
+        if now is None:
+            now = time.perf_counter()
+
+        if now < self._next_t:
+            return False
+
+        moved = self._running and self._warp != 0.0
+        if moved:
+            self._jd += self._direction * self._warp * (now - self._last_t) / SEC_PER_DAY
+
+        self._last_t = now
+        self._next_t += self._period
+        if self._next_t <= now:                     # late: drop the missed ticks, no catch-up
+            self._next_t = now + self._period
+
+        return moved
+
+    '''===== PROPERTIES ==========================================================================================='''
+
+    @property
+    def jd(self):
+        return self._jd
+
+    @property
+    def epoch(self):
+        """ The epoch as a Time, built on request. """
+        return Time(self._jd, format='jd', scale='tdb')
+
+    @property
+    def warp(self):
+        return self._warp
+
+    @warp.setter
+    def warp(self, new_warp):
+        """ A signed warp also sets the direction, zero leaves it as it is. """
+        new_warp = float(new_warp)
+        if new_warp:
+            self._direction = 1 if new_warp > 0 else -1
+        self._warp = abs(new_warp)
+
+    @property
+    def direction(self):
+        return self._direction
+
+    @direction.setter
+    def direction(self, new_dir):
+        if new_dir not in (1, -1):
+            raise ValueError(f'>>>ERROR: direction must be 1 or -1, not {new_dir}.')
+        self._direction = int(new_dir)
+
+    @property
+    def rate(self):
+        """ The signed number of simulated seconds per wall second. """
+        return self._direction * self._warp
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def tick_rate(self):
+        return 1.0 / self._period
@@ -2,16 +2,10 @@
 """
     This module contains classes to allow using Qt to control Vispy
 """
-import logging.config
-import astropy.units as u
 from PyQt5 import QtWidgets
 from PyQt5.QtCore import pyqtSignal, pyqtSlot
 from gui_tiled import Ui_SNS_DataPanels
-from datastore import log_config
 from datastore import DEF_EPOCH0 as DEF_EPOCH
-from astropy.time import Time, TimeDelta
-
-logging.config.dictConfig(log_config)
 
 DEFAULT_DT = 0.05
 
@@ -33,7 +27,6 @@ class Controls(QtWidgets.QWidget):
         self._active_cam = 'def_cam'
         self.timer_widgets = self._widget_groups['time_']
         self.timer_paused = True
-        self._last_elapsed = 0
 
     def with_prefix(self, prefix):
         return [widget for name, widget in self.ui.__dict__.items()
@@ -85,14 +78,16 @@ class Controls(QtWidgets.QWidget):
         self.ui.time_warp.setText(str(self.ui.time_slider.value()))
         self.ui.time_sys_epoch.setText(str(self.ui.time_ref_epoch.text()))
 
-    @pyqtSlot()
-    def tw_elapsed_updated(self):
-        new_elapsed = float(self.ui.time_elapsed.text())
-        dt = TimeDelta(new_elapsed - self._last_elapsed)
-        self._last_elapsed = new_elapsed
-        new_sys_epoch = (Time(float(self.ui.time_sys_epoch.text()), format='jd') +
-                         float(self.ui.time_warp.text()) * dt.to(u.s))
-        self.ui.time_sys_epoch.setText(f'{new_sys_epoch.value:.4f}')
+    def show_epoch(self, jd, ref_jd):
+        """ Display an epoch sampled from the model clock. The widgets' signals are blocked
+            so that showing the epoch does not feed back into the model; the caller refreshes
+            the panels for the new epoch itself (see MainQtWindow.update_elapsed).
+        """
+        for widget, text in ((self.ui.time_sys_epoch, f'{jd:.4f}'),
+                             (self.ui.time_elapsed, f'{jd - ref_jd:.4f}')):
+            widget.blockSignals(True)
+            widget.setText(text)
+            widget.blockSignals(False)
 
     def tw_exp_updated(self, new_wexp):
         new_max = pow(10, new_wexp)
@@ -0,0 +1,134 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# sim_ephem.py
+# This module provides a piecewise Chebyshev approximation of an ephemeris.
+# The window covered by an ephemeris is split into equal segments, and a Chebyshev series is
+# fitted to the position and velocity over each segment. Evaluating the state at any epoch
+# inside the window is then a segment lookup plus a short Clenshaw recurrence.
+import numpy as np
+
+CHEB_DEGREE      = 12       # degree of the series fitted over each segment
+CHEB_SEG_SAMPLES = 8        # ephemeris spacings spanned by one segment
+
+
+def _clenshaw(x, coeffs):
+    """
+        Evaluate Chebyshev series at points inside their segments.
+
+    Parameters
+    ----------
+    x       : np.ndarray(M,)            points, each scaled to [-1, 1] within its segment
+    coeffs  : np.ndarray(M, deg+1, 3)   the series coefficients of each point's segment
+
+    Returns
+    -------
+    np.ndarray(M, 3)    : the value of each series
+    """
+    x2 = 2.0 * x[:, None]
+    b1 = np.zeros(coeffs[:, 0].shape, dtype=np.float64)
+    b2 = np.zeros_like(b1)
+    for j in range(coeffs.shape[1] - 1, 0, -1):
+        b1, b2 = x2 * b1 - b2 + coeffs[:, j], b1
+
+    return 0.5 * x2 * b1 - b2 + coeffs[:, 0]
+
+
+class ChebyshevEphem:
+    """
+        A piecewise Chebyshev fit of position and velocity over a window of epochs.
+        Epochs are float64 TDB Julian dates and states are plain arrays in whatever
+        units the source provided.
+    """
+    def __init__(self, jd_start, seg_len, coeffs_r, coeffs_v):
+        self._jd_start = jd_start
+        self._seg_len  = seg_len
+        self._coeffs_r = coeffs_r
+        self._coeffs_v = coeffs_v
+        self._num_segs = coeffs_r.shape[0]
+        self._jd_end   = jd_start + self._num_segs * seg_len
+
+    @classmethod
+    def from_source(cls, source, jd_start, jd_end, seg_len, degree=CHEB_DEGREE):
+        """
+            Fit the series by sampling a source at the Chebyshev nodes of every segment.
+
+        Parameters
+        ----------
+        source      : callable      maps an array of TDB Julian dates to (r, v) arrays of shape (M, 3)
+        jd_start    : float         start of the window
+        jd_end      : float         end of the window
+        seg_len     : float         nominal length of a segment in days; it is shortened
+                                    so that a whole number of segments fills the window
+        degree      : int           degree of the series fitted over each segment
+
+        Returns
+        -------
+        ChebyshevEphem
+        """
+        num_segs = max(1, int(np.ceil((jd_end - jd_start) / seg_len)))
+        seg_len  = (jd_end - jd_start) / num_segs
+        n        = degree + 1
+        theta    = np.pi * (np.arange(n) + 0.5) / n
+        nodes    = np.cos(theta)
+        starts   = jd_start + seg_len * np.arange(num_segs)
+        epochs   = starts[:, None] + (nodes[None, :] + 1.0) * (seg_len / 2)
+
+        r, v = source(epochs.ravel())
+        r = np.reshape(r, (num_segs, n, 3))
+        v = np.reshape(v, (num_segs, n, 3))
+
+        #   discrete Chebyshev transform over the nodes of each segment
+        t_mat    = np.cos(np.outer(np.arange(n), theta)) * (2.0 / n)
+        t_mat[0] *= 0.5
+        coeffs_r = np.einsum('mj,kjc->kmc', t_mat, r)
+        coeffs_v = np.einsum('mj,kjc->kmc', t_mat, v)
+
+        return cls(jd_start, seg_len, coeffs_r, coeffs_v)
+
+    def scaled(self, factor):
+        """ The same fit with its states multiplied by factor, e.g. to change their unit.
+            The fit is linear in the samples, so this is exact.
+        """
+        return ChebyshevEphem(self._jd_start, self._seg_len,
+                              self._coeffs_r * factor, self._coeffs_v * factor)
+
+    def covers(self, jd):
+        return self._jd_start <= jd <= self._jd_end
+
+    def rv(self, jd):
+        """
+            Evaluate position and velocity at one or more epochs inside the window.
+
+        Parameters
+        ----------
+        jd          : float or np.ndarray(M,)   TDB Julian date(s)
+
+        Returns
+        -------
+        r, v        : np.ndarray(3,) or np.ndarray(M, 3)
+        """
+        scalar = np.ndim(jd) == 0
+        jd     = np.atleast_1d(np.asarray(jd, dtype=np.float64))
+        offset = (jd - self._jd_start) / self._seg_len
+        seg    = np.clip(np.floor(offset).astype(np.intp), 0, self._num_segs - 1)
+        x      = 2.0 * (offset - seg) - 1.0
+        r      = _clenshaw(x, self._coeffs_r[seg])
+        v      = _clenshaw(x, self._coeffs_v[seg])
+        if scalar:
+            return r[0], v[0]
+
+        return r, v
+
+    @property
+    def jd_start(self):
+        return self._jd_start
+
+    @property
+    def jd_end(self):
+        return self._jd_end
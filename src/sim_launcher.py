@@ -15,10 +15,9 @@ from multiprocessing import Queue  # Queues needed for IPC
 from controller import SimController  # simulation master controller
 from datastore import *  # default system data
 
-command_q, response_q = Queue, Queue
+command_q, response_q = Queue(), Queue()
 datastore = SystemDataStore()
 
 cntrl = SimController(command_q, response_q)
 model = cntrl.generate_model(sim_data=datastore)
-model.run()
 viewr = cntrl.initialize_viewer()
@@ -0,0 +1,104 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# sim_logging.py
+# This module holds the diagnostics of the simulator: one 'sns' logger tree, with a logger per
+# module from get_logger(), and a TRACE level below DEBUG for what is logged on every tick or frame.
+# Importing a module configures nothing; each process calls setup_logging() once from its
+# entry point, with the level taken from the SNS_LOG_LEVEL environment variable by default.
+# The loggers check their level before formatting, and any argument that is costly to compute
+# is wrapped in lazy(), so it is only evaluated when a record is actually written. The hottest
+# paths also test tracing() first, which then costs them a single cached level check.
+import logging
+import os
+from pathlib import Path
+
+LOG_ROOT      = 'sns'
+LOG_DIR       = Path(__file__).resolve().parent.parent / 'logs'
+LOG_FORMAT    = "%(asctime)s:%(process)s:%(levelname)s:%(name)s:%(funcName)s:\t%(message)s"
+TRACE         = 5           # below logging.DEBUG, for the per-tick and per-frame records
+DEF_LOG_LEVEL = 'WARNING'
+
+logging.addLevelName(TRACE, 'TRACE')
+logging.getLogger(LOG_ROOT).addHandler(logging.NullHandler())   # silent until setup_logging()
+
+
+def get_logger(name):
+    """ The logger of a module, under the 'sns' tree, e.g. get_logger(__name__). """
+    return logging.getLogger(f'{LOG_ROOT}.{name.rsplit(".", 1)[-1]}')
+
+
+def setup_logging(level=None, fname='sns.log', console=False):
+    """
+        Send the records of the 'sns' tree to a file in LOG_DIR. Calling it again replaces the
+        handlers set by the previous call.
+
+    Parameters
+    ----------
+    level       : int or str    the level to log at; SNS_LOG_LEVEL, or DEF_LOG_LEVEL, if None
+    fname       : str           the file name in LOG_DIR
+    console     : bool          also write the records to stderr
+
+    Returns
+    -------
+    logging.Logger  : the root of the 'sns' tree
+    """
+    if level is None:
+        level = os.environ.get('SNS_LOG_LEVEL', DEF_LOG_LEVEL)
+    name = level
+    if isinstance(level, str):
+        level = TRACE if level.upper() == 'TRACE' else logging.getLevelName(level.upper())
+    if not isinstance(level, int):
+        raise ValueError(f'>>>ERROR: {name!r} is not a logging level.')
+
+    root = logging.getLogger(LOG_ROOT)
+    for handler in [h for h in root.handlers if not isinstance(h, logging.NullHandler)]:
+        root.removeHandler(handler)
+        handler.close()
+
+    handlers = []
+    try:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        handlers.append(logging.FileHandler(LOG_DIR / fname))
+    except OSError as err:
+        print(f'WARNING: logging to stderr, cannot write to {LOG_DIR}: {err}')
+        console = True
+    if console:
+        handlers.append(logging.StreamHandler())
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(level)
+    root.propagate = False
+
+    return root
+
+
+def tracing(logger):
+    """ Whether TRACE records of a logger are written; the guard of the hottest paths. """
+    return logger.isEnabledFor(TRACE)
+
+
+class lazy:
+    """
+        An argument of a log record computed only when the record is formatted:
+            log.debug("||POS||: %s", lazy(np.linalg.norm, pos))
+        Plain objects need no wrapping, %s formats them only when the record is written.
+    """
+    __slots__ = ('_fn', '_args')
+
+    def __init__(self, fn, *args):
+        self._fn   = fn
+        self._args = args
+
+    def __str__(self):
+        return str(self._fn(*self._args))
+
+    __repr__ = __str__
@@ -10,14 +10,8 @@
 #  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
 #
 #
-import logging
-
-logging.basicConfig(filename="../logs/sns_simobj.log",
-                    level=logging.ERROR,
-                    format="%(funcName)s:\t\t%(levelname)s:%(asctime)s:\t%(message)s",
-                    )
-
 import numpy as np
+import psygnal
 from poliastro.constants import J2000_TDB
 from astropy import units as u
 from astropy.time import Time
@@ -42,7 +36,7 @@ class SimObject(ABC):
     epoch0 = J2000_TDB.jd
     system = {}
     base_dist_unit = u.km
-    # created = pyqtSignal(str)
+    created = psygnal.Signal(str)
     _fields = ('attr',
                'pos',
                'rot',
@@ -56,7 +50,10 @@ class SimObject(ABC):
         self._epoch      = Time(SimObject.epoch0,
                                 format='jd',
                                 scale='tdb')
+        self._jd         = SimObject.epoch0
         self._state      = np.zeros((3,), dtype=VEC_TYPE)
+        self._row        = None         # row in a BodyRegistry, whose state row _state then views
+        self._registry   = None
 
     @property
     def name(self):
@@ -0,0 +1,299 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# sim_propagator.py
+# This module propagates the orbital states of many SimBody objects at once.
+# The initial state vectors of every body are packed into contiguous arrays so that Kepler's
+# problem can be solved for all of them, and for any number of timesteps, in a single
+# vectorized pass of the universal-variable solver kepler_uv().
+#
+# TOLERANCE:    The batch states agree with the per-body poliastro path (Orbit.propagate)
+#               to within a relative position/velocity error of BATCH_RTOL. Both paths are
+#               pure two-body Keplerian motion, so the only difference is solver round-off.
+# SOLVER:       Newton's method on the universal anomaly, kept inside a bracket of the root and
+#               replaced by bisection wherever a step would leave it, so highly eccentric orbits
+#               converge too; a row that has not converged after UV_MAXITER raises ValueError.
+import numpy as np
+from astropy import units as u
+
+BATCH_RTOL     = 1e-08         # documented agreement with the per-body path
+UV_TOL         = 1e-13         # relative convergence of the universal anomaly
+UV_MAXITER     = 100         # enough for pure bisection to reach UV_TOL over a whole period
+UV_PSI_EPS     = 1e-06         # |psi| below which the Stumpff series are used
+UV_ALPHA_EPS   = 1e-09         # |alpha * r0| below which an orbit is treated as parabolic
+SEC_PER_DAY    = 86400.0
+MU_UNIT        = u.km ** 3 / u.s ** 2
+
+
+def stumpff(psi):
+    """
+        Evaluate the Stumpff functions c2 and c3 for arrays of psi = alpha * chi^2, using
+        their series near zero where the closed forms lose precision.
+
+    Returns
+    -------
+    c2, c3  : np.ndarray
+    """
+    c2 = np.empty_like(psi)
+    c3 = np.empty_like(psi)
+    ell = psi > UV_PSI_EPS
+    hyp = psi < -UV_PSI_EPS
+    par = ~(ell | hyp)
+
+    sq = np.sqrt(psi[ell])
+    c2[ell] = (1.0 - np.cos(sq)) / psi[ell]
+    c3[ell] = (sq - np.sin(sq)) / (sq * psi[ell])
+    sq = np.sqrt(-psi[hyp])
+    c2[hyp] = (1.0 - np.cosh(sq)) / psi[hyp]
+    c3[hyp] = (np.sinh(sq) - sq) / (-sq * psi[hyp])
+    p = psi[par]
+    c2[par] = 0.5 - p / 24.0 + p * p / 720.0
+    c3[par] = 1.0 / 6.0 - p / 120.0 + p * p / 5040.0
+
+    return c2, c3
+
+
+def kepler_uv(r0, v0, mu, dt, tol=UV_TOL, maxiter=UV_MAXITER):
+    """
+        Propagate two-body states by times of flight with the universal-variable formulation,
+        which holds for elliptic, parabolic and hyperbolic orbits alike.
+
+    Parameters
+    ----------
+    r0      : np.ndarray(N, 3)          initial positions relative to the attractor (km)
+    v0      : np.ndarray(N, 3)          initial velocities relative to the attractor (km/s)
+    mu      : float or np.ndarray(N,)   gravitational parameter of each attractor (km^3/s^2)
+    dt      : np.ndarray(N,) or (N, T)  seconds of flight, one per body or T per body
+
+    Returns
+    -------
+    r, v    : np.ndarray(N, 3) or (N, T, 3)     positions (km) and velocities (km/s)
+    """
+    r0 = np.atleast_2d(np.asarray(r0, dtype=np.float64))
+    v0 = np.atleast_2d(np.asarray(v0, dtype=np.float64))
+    dt = np.asarray(dt, dtype=np.float64)
+    count = r0.shape[0]
+    mu = np.broadcast_to(np.asarray(mu, dtype=np.float64), (count,))
+    out_shape = dt.shape
+    if dt.ndim < 2:
+        dt = np.broadcast_to(dt, (count,))[:, None]
+    steps = dt.shape[1]
+
+    #   flatten bodies x timesteps into one set of rows
+    r0 = np.repeat(r0, steps, axis=0)
+    v0 = np.repeat(v0, steps, axis=0)
+    mu = np.repeat(mu, steps)
+    dt = dt.ravel().copy()
+
+    r0m   = np.linalg.norm(r0, axis=1)
+    rdv   = np.einsum('ij,ij->i', r0, v0)
+    sq_mu = np.sqrt(mu)
+    alpha = 2.0 / r0m - np.einsum('ij,ij->i', v0, v0) / mu     # 1 / semi-major axis
+
+    #   whole revolutions of closed orbits are dropped, leaving 0 <= dt < period,
+    #   over which chi runs from 0 to 2 pi / sqrt(alpha)
+    ell = alpha * r0m > UV_ALPHA_EPS
+    period = 2.0 * np.pi / np.sqrt(mu[ell] * alpha[ell] ** 3)
+    dt[ell] = np.mod(dt[ell], period)
+    lo = np.zeros_like(dt)
+    hi = np.zeros_like(dt)
+    hi[ell] = 2.0 * np.pi / np.sqrt(alpha[ell])
+
+    #   initial guesses, after Vallado (Algorithm 8)
+    chi = sq_mu * dt / r0m
+    chi[ell] = sq_mu[ell] * dt[ell] * alpha[ell]
+    hyp = alpha * r0m < -UV_ALPHA_EPS
+    if np.any(hyp):
+        a = 1.0 / alpha[hyp]
+        sgn = np.sign(dt[hyp])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            arg = (-2.0 * mu[hyp] * alpha[hyp] * dt[hyp] /
+                   (rdv[hyp] + sgn * np.sqrt(-mu[hyp] * a) * (1.0 - r0m[hyp] * alpha[hyp])))
+        ok = arg > 0
+        chi[hyp] = np.where(ok, sgn * np.sqrt(-a) * np.log(np.where(ok, arg, 1.0)), chi[hyp])
+
+    def time_error(x, rows=slice(None)):
+        """ sqrt(mu) * (t(x) - dt) and its derivative r(x) for the given rows; t(x) increases with x. """
+        psi = x * x * alpha[rows]
+        c2, c3 = stumpff(psi)
+        rdv_mu = rdv[rows] / sq_mu[rows]
+        with np.errstate(over='ignore', invalid='ignore'):
+            err = (x ** 3 * c3 + rdv_mu * x * x * c2 + r0m[rows] * x * (1.0 - psi * c3) -
+                   sq_mu[rows] * dt[rows])
+            r = x * x * c2 + rdv_mu * x * (1.0 - psi * c3) + r0m[rows] * (1.0 - psi * c2)
+        #   t(x) overflows only far from the root, on the side of the sign of x
+        return np.where(np.isfinite(err), err, np.sign(x)), r
+
+    #   open orbits have no period to bound chi, so their bracket is doubled until it holds the root
+    opn = np.flatnonzero(~ell)
+    if len(opn):
+        sgn = np.where(dt[opn] < 0, -1.0, 1.0)
+        bound = sgn * np.maximum(np.abs(chi[opn]), 1.0)
+        for _ in range(UV_MAXITER):
+            short = sgn * time_error(bound, opn)[0] < 0
+            if not np.any(short):
+                break
+            bound[short] *= 2.0
+        lo[opn] = np.where(sgn < 0, bound, 0.0)
+        hi[opn] = np.where(sgn < 0, 0.0, bound)
+    chi = np.clip(chi, lo, hi)
+
+    #   Newton iterations on the universal anomaly, kept inside the bracket of the root:
+    #   a step that leaves it is replaced by bisection, so every row converges
+    done = np.zeros(dt.shape, dtype=bool)
+    for _ in range(maxiter):
+        err, r = time_error(chi)
+        lo = np.where(err < 0, chi, lo)
+        hi = np.where(err > 0, chi, hi)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            new_chi = chi - err / r
+        bisect = ~((new_chi > lo) & (new_chi < hi)) & (err != 0)
+        new_chi[err == 0] = chi[err == 0]
+        new_chi[bisect] = 0.5 * (lo[bisect] + hi[bisect])
+        scale = tol * np.maximum(1.0, np.abs(new_chi))
+        done = (np.abs(new_chi - chi) <= scale) | (hi - lo <= scale) | (err == 0)
+        chi = new_chi
+        if np.all(done):
+            break
+    else:
+        raise ValueError(f'>>>ERROR: kepler_uv did not converge for {np.count_nonzero(~done)} '
+                         f'of {len(done)} states after {maxiter} iterations')
+
+    psi = chi * chi * alpha
+    c2, c3 = stumpff(psi)
+    r_m = (chi * chi * c2 + rdv / sq_mu * chi * (1.0 - psi * c3) + r0m * (1.0 - psi * c2))
+    f    = 1.0 - chi * chi / r0m * c2
+    g    = dt - chi ** 3 / sq_mu * c3
+    fdot = sq_mu / (r_m * r0m) * chi * (psi * c3 - 1.0)
+    gdot = 1.0 - chi * chi / r_m * c2
+
+    r = f[:, None] * r0 + g[:, None] * v0
+    v = fdot[:, None] * r0 + gdot[:, None] * v0
+    if len(out_shape) < 2:
+        return r.reshape(count, 3), v.reshape(count, 3)
+
+    return r.reshape(count, steps, 3), v.reshape(count, steps, 3)
+
+
+def pack_orbits(simbods):
+    """
+        Sort SimBody objects into those with an Orbit, whose initial states are packed for
+        kepler_uv(), and the rest, which have to propagate themselves.
+
+    Parameters
+    ----------
+    simbods     : sequence of SimBody
+
+    Returns
+    -------
+    kep_idx     : np.ndarray    the indices of the bodies with packed states
+    own_idx     : np.ndarray    the indices of the other bodies
+    rv0         : dict or None  arrays r0 (km), v0 (km/s) and mu (km^3/s^2) of the kep_idx bodies
+    jd0         : np.ndarray    the TDB Julian date of each packed state
+    to_dist     : np.ndarray    the factor from km to the dist_unit of each body
+    """
+    from poliastro.twobody.orbit.scalar import Orbit
+
+    kep_idx, own_idx = [], []
+    r0, v0, mu, jd0, to_dist = [], [], [], [], []
+    for idx, sb in enumerate(simbods):
+        orbit = sb.orbit
+        if type(orbit) == Orbit:
+            kep_idx.append(idx)
+            r0.append(orbit.r.to_value(u.km))
+            v0.append(orbit.v.to_value(u.km / u.s))
+            mu.append(orbit.attractor.k.to_value(MU_UNIT))
+            jd0.append(orbit.epoch.tdb.jd)
+            to_dist.append((1 * u.km).to_value(sb.dist_unit))
+        else:
+            own_idx.append(idx)
+
+    rv0 = dict(r0=np.array(r0), v0=np.array(v0), mu=np.array(mu)) if kep_idx else None
+
+    return (np.array(kep_idx, dtype=np.intp), np.array(own_idx, dtype=np.intp), rv0,
+            np.array(jd0, dtype=np.float64), np.array(to_dist, dtype=np.float64))
+
+
+def pack_key(simbods):
+    """ The names and pack generations of a dict of SimBody objects, equal as long as
+        the states packed by pack_orbits() are still current.
+    """
+    return tuple((name, sb.pack_gen) for name, sb in simbods.items())
+
+
+class BatchPropagator:
+    """
+        Holds the orbital elements of a set of SimBody objects in contiguous arrays and
+        writes their propagated states into a single (N, 3, 3) state array.
+        Bodies that have no Orbit (the system primary, ephem-only bodies) keep using
+        their own SimBody.update_state() path.
+    """
+    def __init__(self):
+        self._names     = ()
+        self._pack_key  = None
+        self._simbods   = ()
+        self._kep_idx   = None      # rows that are propagated analytically
+        self._own_idx   = None      # rows that are propagated by the SimBody itself
+        self._rv0       = None
+        self._jd0       = None
+        self._to_dist   = None      # km -> SimBody dist_unit
+        self._states    = None
+
+    def pack(self, simbods):
+        """
+            Collect the current orbital state of each SimBody into the element arrays.
+
+        Parameters
+        ----------
+        simbods     : dict      SimBody objects keyed by name, in the order of the state rows
+        """
+        self._names    = tuple(simbods.keys())
+        self._pack_key = pack_key(simbods)
+        self._simbods  = tuple(simbods.values())
+        self._states   = np.zeros((len(self._simbods), 3, 3), dtype=np.float64)
+        (self._kep_idx, self._own_idx, self._rv0,
+         self._jd0, self._to_dist) = pack_orbits(self._simbods)
+
+    def is_packed(self, simbods):
+        return self._states is not None and self._pack_key == pack_key(simbods)
+
+    def propagate(self, epoch):
+        """
+            Propagate every packed body to the given epoch.
+
+        Parameters
+        ----------
+        epoch       : Time or float     The epoch to which the states are to be set,
+                                        or its TDB Julian date
+
+        Returns
+        -------
+        np.ndarray(N, 3, 3)     : the state matrix of each body, in packing order
+        """
+        jd = epoch.tdb.jd if hasattr(epoch, 'tdb') else float(epoch)
+        if self._rv0 is not None:
+            r, v = kepler_uv(**self._rv0, dt=(jd - self._jd0) * SEC_PER_DAY)
+            self._states[self._kep_idx, 0] = r * self._to_dist[:, None]
+            self._states[self._kep_idx, 1] = v * self._to_dist[:, None]
+            for idx in self._kep_idx:
+                self._states[idx, 2] = self._simbods[idx].rot_elements(jd)
+
+        for idx in self._own_idx:
+            sb = self._simbods[idx]
+            sb.update_state(epoch)
+            self._states[idx] = sb.state
+
+        return self._states
+
+    @property
+    def states(self):
+        return self._states
+
+    @property
+    def names(self):
+        return self._names
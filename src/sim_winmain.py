@@ -9,7 +9,8 @@
 #  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import cProfile
-import logging.config
+import queue
+import time
 from multiprocessing import Queue
 
 import psygnal
@@ -18,16 +19,21 @@ from PyQt5 import QtCore, QtWidgets
 from PyQt5.QtCore import pyqtSignal, pyqtSlot, QCoreApplication
 from vispy.app import use_app
 
+from controller import SimController
 from datastore import *
 from sim_canvas import CanvasWrapper
 from sim_controls import Controls
-from simsystem import SimSystem
+from sim_logging import get_logger, setup_logging
 from system_visual import StarSystemVisuals
 
-logging.config.dictConfig(log_config)
 QT_NATIVE = False
 STOP_IT = True
 DO_PROFILE = False
+MODEL_START_TIMEOUT = 120.0     # seconds for the model process to build the system and report ready
+MODEL_REPLY_TIMEOUT = 10.0      # seconds to wait for the reply to a blocking query
+MODEL_POLL_PERIOD   = 0.25      # seconds between checks that the model process is still alive
+
+_log = get_logger(__name__)
 
 
 class MainQtWindow(QtWidgets.QMainWindow):
@@ -86,20 +92,31 @@ class MainQtWindow(QtWidgets.QMainWindow):
         self.comm_q = Queue()
         self.stat_q = Queue()
         self.rpy_delta = np.zeros((3, 1), dtype=np.float64)
-
-        #       TODO: Here the model process will be spawned:
-        self.model = SimSystem(in_q=self.comm_q, out_q=self.stat_q, use_multi=True)
+        self._ref_jd = DEF_EPOCH0.tdb.jd
+        self._shown_jd = None
+
+        #   the model runs in its own process, stepped by its own clock, and publishes
+        #   its states to the StateRing. This window only samples them for display, and asks
+        #   the model for everything else with query_fields commands.
+        self.controller = SimController(self.comm_q, self.stat_q)
+        self.controller.generate_model()
+        self._req_id      = 0
+        self._on_reply    = {}      # {req_id: callback taking the ModelResponse}
+        self._agg_deltas  = {}      # deltas received since the last frame, {field_id: {name: value}}
+        self._agg_pending = False   # whether a query for the deltas is on its way
+        self._elems_pending = False
+        self._panel_elems = {}      # the last orbital elements received, {field_id: {name: value}}
+        self._wait_for_model()
 
         #       TODO:   Encapsulate the vizz_fields2agg inside StartSystemVisuals class
         self._vizz_fields2agg = ('pos', 'radius', 'body_alpha', 'track_alpha', 'body_mark',
                                  'body_color', 'track_data', 'tex_data', 'is_primary',
                                  'axes', 'rot', 'parent_name'
                                  )
+        self._panel_fields = ('elem_coe_', 'elem_pqw_')
         self.visuals = StarSystemVisuals(self.body_names)
-        self.visuals.generate_visuals(self.canvas.view,
-                                      self.model.get_agg_fields(self._vizz_fields2agg))
-        print(f"{self.model.get_agg_fields(self._vizz_fields2agg)}")
-        print(f"{self._}")
+        self._agg_version, agg_data = self._query('query_fields', self._vizz_fields2agg, -1)
+        self.visuals.generate_visuals(self.canvas.view, agg_data)
 
         self.cameras = self.canvas.cam_set
         self.controls = Controls()
@@ -111,7 +128,7 @@ class MainQtWindow(QtWidgets.QMainWindow):
                                         self.visuals.vizz_bounds, )
         # set the initial camera position in the ecliptic looking towards the primary
         self.cameras.curr_cam.set_state(DEF_CAM_STATE)
-        self.curr_simbod = self.model['Earth']
+        self._curr_name = 'Earth'
         self.reset_rotation()
         self._connect_slots()
         # noinspection PyUnresolvedReferences
@@ -121,6 +138,93 @@ class MainQtWindow(QtWidgets.QMainWindow):
 
         return None
 
+    def _next_reply(self, timeout):
+        """ The next response from the model, waiting at most timeout seconds for it while
+            making sure the model process is still alive.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.stat_q.get(timeout=max(0.0, min(MODEL_POLL_PERIOD, deadline - time.monotonic())))
+            except queue.Empty:
+                if not self.controller.model_alive:
+                    raise RuntimeError('>>>ERROR: the model process has stopped.')
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f'>>>ERROR: no reply from the model process in {timeout} seconds.')
+
+    def _wait_for_model(self):
+        """ Block until the model process reports that its StateRing is ready. """
+        rsp = self._next_reply(MODEL_START_TIMEOUT)
+        if rsp.op != 'ready' or not rsp.ok:
+            raise RuntimeError(f'>>>ERROR: the model process failed to start: {rsp.result}')
+
+        _log.info("Model process ready, publishing %i bodies...", len(rsp.result['bodies']))
+
+    def _request(self, op, *args, on_reply=None):
+        """ Send a command to the model; on_reply is called with its ModelResponse when it arrives. """
+        self._req_id += 1
+        if on_reply is not None:
+            self._on_reply[self._req_id] = on_reply
+        self.controller.send_command(op, *args, req_id=self._req_id)
+
+        return self._req_id
+
+    def _query(self, op, *args, timeout=MODEL_REPLY_TIMEOUT):
+        """ Send a command to the model and block until its reply; other replies are handled meanwhile. """
+        req_id = self._request(op, *args)
+        while True:
+            rsp = self._next_reply(timeout)
+            if rsp.req_id != req_id:
+                self._handle_response(rsp)
+            elif not rsp.ok:
+                raise RuntimeError(f'>>>ERROR: model command {op} failed: {rsp.result}')
+            else:
+                return rsp.result
+
+    def _handle_response(self, rsp):
+        if not rsp.ok:
+            _log.warning('model command %s failed: %s', rsp.op, rsp.result)
+        on_reply = self._on_reply.pop(rsp.req_id, None)
+        if on_reply is not None:
+            on_reply(rsp)
+
+    def _drain_responses(self):
+        """ Collect the replies from the model, reporting any command that failed. """
+        while True:
+            try:
+                self._handle_response(self.stat_q.get_nowait())
+            except queue.Empty:
+                break
+
+        if not self.controller.model_alive and self.timer.isActive():
+            _log.error('the model process has stopped, the display is frozen')
+            self.timer.stop()
+
+    def _on_agg_deltas(self, rsp):
+        self._agg_pending = False
+        if rsp.ok:
+            self._agg_version, deltas = rsp.result
+            for f_id, values in deltas.items():
+                self._agg_deltas.setdefault(f_id, {}).update(values)
+
+    def _on_elements(self, rsp):
+        self._elems_pending = False
+        if rsp.ok:
+            self._panel_elems = rsp.result
+            self.refresh_panel('elem_coe_')
+            self.refresh_panel('elem_pqw_')
+
+    def _body_radius(self, name):
+        """ The equatorial radius of a body in the distance unit of the model. """
+        return self.visuals.agg_cache['radius'][name][0].value
+
+    def _is_primary(self, name):
+        return self.visuals.agg_cache['is_primary'][name]
+
+    def closeEvent(self, event):
+        self.controller.shutdown_model()
+        super(MainQtWindow, self).closeEvent(event)
+
     def _setup_layout(self):
         # TODO:     Learn more about the QSplitter object
         main_layout = QtWidgets.QHBoxLayout()
@@ -153,30 +257,39 @@ class MainQtWindow(QtWidgets.QMainWindow):
         #   Handling epoch timer widget signals
         self.ui.time_wexp.valueChanged.connect(self.controls.tw_exp_updated)
         self.ui.time_slider.valueChanged.connect(self.controls.tw_slider_updated)
-        self.ui.time_elapsed.textChanged.connect(self.controls.tw_elapsed_updated)
-        self.ui.time_sys_epoch.textChanged.connect(self.update_model_epoch)
+        self.ui.time_warp.textChanged.connect(self.update_model_warp)
+        self.ui.time_sys_epoch.editingFinished.connect(self.update_model_epoch)
         self.ui.time_sys_epoch.textChanged.connect(self.updatePanels)
-        self.model.has_updated.connect(self.refresh_canvas)
 
+        #   the timer only samples the model for display, it does not step the model
         self.timer.setInterval(self.interval)
         self.timer.timeout.connect(self.update_elapsed)
+        self.timer.start()
 
         # Handling buttons in epoch timer
         self.ui.btn_play_pause.pressed.connect(self.toggle_play_pause)
         self.ui.btn_real_twarp.pressed.connect(self.controls.toggle_twarp2norm)
         self.ui.btn_reverse.pressed.connect(self.controls.toggle_twarp_sign)
         self.ui.btn_stop_reset.pressed.connect(self.controls.reset_epoch_timer)
+        self.ui.btn_stop_reset.pressed.connect(self.reset_model_epoch)
         self.ui.btn_stop_reset.pressed.connect(self.try_breakpoint)
         self.ui.btn_set_rot.pressed.connect(self.reset_rotation)
+        self.update_model_warp(self.ui.time_warp.text())
         self.blockSignals(False)
-        print("Signals / Slots Connected...")
+        _log.debug('signals and slots connected')
 
     def reset_rotation(self):
         # find current RPY, store it, then subtract it from what would otherwise be there
         self.updatePanels('')
 
     def update_elapsed(self):
-        self.ui.time_elapsed.setText(f'{(float(self.ui.time_elapsed.text()) + self.interval / 86400):.4f}')
+        self._drain_responses()
+        self.refresh_canvas()
+        jd = self.visuals.state_jd
+        if jd != self._shown_jd:
+            self._shown_jd = jd
+            self.controls.show_epoch(jd, self._ref_jd)
+            self.updatePanels('')           # show_epoch blocks the textChanged that did this
 
     def try_breakpoint(self):
         pass
@@ -185,18 +298,18 @@ class MainQtWindow(QtWidgets.QMainWindow):
         if self.ui.cam2selected.isChecked():
             self.cameras.set_curr2key('tt_cam')
             self.setActiveCam('tt_cam')
-            print(f'CAM_STATE: {self.cameras.curr_cam.get_state()}')
+            _log.debug('CAM_STATE: %s', self.cameras.curr_cam.get_state())
             self.cameras.curr_cam.set_state({'center':
-                                             self.curr_simbod.pos.value,
+                                             self.visuals.body_pos(self._curr_name),
                                              # 'distance':
-                                             #     self.curr_simbod.radius[0].to(self.model.dist_unit).value * 2,
+                                             #     self._body_radius(self._curr_name) * 2,
                                              })
         else:
             self.cameras.set_curr2key('fly_cam')
-            print(f'CAM_STATE: {self.cameras.curr_cam.get_state()}')
+            _log.debug('CAM_STATE: %s', self.cameras.curr_cam.get_state())
             self.setActiveCam('fly_cam')
-            self.cameras.curr_cam.set_state({'center': (self.curr_simbod.pos.value +
-                                                        self.curr_simbod.radius[0].to(self.model.dist_unit).value * 2
+            self.cameras.curr_cam.set_state({'center': (self.visuals.body_pos(self._curr_name) +
+                                                        self._body_radius(self._curr_name) * 2
                                                         ),
                                              })
 
@@ -220,15 +333,15 @@ class MainQtWindow(QtWidgets.QMainWindow):
 
     @pyqtSlot(str)
     def setActiveBody(self, new_body_name):
-        if new_body_name in self.model.body_names:
+        if new_body_name in self.visuals.agg_cache['parent_name']:
             self.controls.set_active_body(new_body_name)
-            self.curr_simbod = self.model[new_body_name]
+            self._curr_name = new_body_name
             if self.ui.cam2selected.isChecked():
                 if self.ui.camBox.currentText() == "tt_cam":
                     self.cameras.curr_cam.set_state({'center':
-                                                         self.curr_simbod.pos,
+                                                         self.visuals.body_pos(self._curr_name),
                                                      'distance':
-                                                         self.curr_simbod.radius[0].to(self.model.dist_unit).value * 2
+                                                         self._body_radius(self._curr_name) * 2
                                                      })
 
         self.refresh_panel('attr_')
@@ -236,9 +349,11 @@ class MainQtWindow(QtWidgets.QMainWindow):
 
     @pyqtSlot(str)
     def updatePanels(self, new_bod_idx):
-        self.refresh_panel('elem_coe_')
+        #   the elements are computed by the model, their panels are refreshed when they arrive
+        if not self._elems_pending:
+            self._elems_pending = True
+            self._request('query_fields', self._panel_fields, on_reply=self._on_elements)
         self.refresh_panel('elem_rv_')
-        self.refresh_panel('elem_pqw_')
         self.refresh_panel('cam_')
 
     @pyqtSlot(str)
@@ -253,32 +368,49 @@ class MainQtWindow(QtWidgets.QMainWindow):
     def refresh_canvas(self):
         if self.ui.cam2selected.isChecked():
             self.cameras.curr_cam.set_state({'center':
-                                                 self.curr_simbod.pos.to(self.model.dist_unit).value,
+                                                 self.visuals.body_pos(self._curr_name),
                                              # 'distance':
-                                             #     self.curr_simbod.radius[0].to(self.model.dist_unit).value * 2
+                                             #     self._body_radius(self._curr_name) * 2
                                              })
 
-        self.visuals.update_vizz(self.model.get_agg_fields(self._vizz_fields2agg))
+        #   the deltas asked for on one frame are drawn on a later one, the GUI never waits for them
+        agg_deltas, self._agg_deltas = self._agg_deltas, {}
+        if not self._agg_pending:
+            self._agg_pending = True
+            self._request('query_fields', self._vizz_fields2agg, self._agg_version,
+                          on_reply=self._on_agg_deltas)
+        self.visuals.update_vizz(agg_deltas)
         self.canvas.update_canvas()
         # self.updatePanels('')
 
     @pyqtSlot()
     def update_model_epoch(self):
-        self.model.epoch = Time(self.ui.time_sys_epoch.text(), format='jd')
-        if not self.model.USE_AUTO_UPDATE_STATE:
-            self.model.update_state(self.model.epoch)
+        try:
+            self.controller.send_command('set_epoch', float(self.ui.time_sys_epoch.text()))
+        except ValueError:
+            _log.warning('%s is not a Julian date', self.ui.time_sys_epoch.text())
+
+    @pyqtSlot(str)
+    def update_model_warp(self, new_warp):
+        try:
+            self.controller.send_command('set_warp', float(new_warp))
+        except ValueError:
+            pass
+
+    @pyqtSlot()
+    def reset_model_epoch(self):
+        self.controller.send_command('pause')
+        self.controller.send_command('set_epoch', self._ref_jd)
+        self.timer_paused = True
 
     @pyqtSlot()
     def toggle_play_pause(self):
         if self.timer_paused:
-            self.ui.time_warp.setText(f'{self.tw_hold}')
+            self.controller.send_command('start')
             self.timer_paused = False
-            self.timer.start()
-            # self.ui.time_elapsed.setText(f'{(float(self.ui.time_elapsed.text()) + DEFAULT_DT):.4f}')
         else:
-            self.tw_hold = float(self.ui.time_warp.text())
+            self.controller.send_command('pause')
             self.timer_paused = True
-            self.timer.stop()
 
     @pyqtSlot(str)
     def refresh_panel(self, panel_key):
@@ -295,43 +427,48 @@ class MainQtWindow(QtWidgets.QMainWindow):
         widg_grp = self.controls.widget_group(panel_key)
         # show_it(widg_grp)
         curr_cam_id = self.ui.camBox.currentText()
+        name = self._curr_name
         if self.ui.cam2selected.isChecked():
-            self.cameras.curr_cam.set_state({'center': tuple(self.curr_simbod.pos.value)})
+            self.cameras.curr_cam.set_state({'center': tuple(self.visuals.body_pos(name))})
 
         match panel_key:
 
             case 'elem_coe_':
                 # print("COE!!")
-                if self.curr_simbod.is_primary:
+                elem_coe = self._panel_elems.get('elem_coe_', {}).get(name)
+                if self._is_primary(name) or elem_coe is None:
                     [w.setText("") for w in widg_grp]
+                else:
                     for i, w in enumerate(widg_grp):
                         # print(f'widget #{i}: {w.objectName()} -> {data_set[i]}')
-                        w.setText(str(self.model[self.curr_simbod.name].elem_coe[i].round(4)))
+                        w.setText(str(elem_coe[i].round(4)))
 
             case 'elem_rv_':
                 # print("RV!!")
-                if self.curr_simbod.is_primary:
+                if self._is_primary(name):
                     [w.setText("") for w in widg_grp]
 
                 else:
-                    self.ui.elem_rv_0.setText(to_vector_str(self.curr_simbod.r.value))
-                    self.ui.elem_rv_1.setText(to_vector_str(self.curr_simbod.v.value))
-                    self.ui.elem_rv_3.setText(to_vector_str(self.curr_simbod.rot,
+                    state = self.visuals.body_state(name)      # from the last frame the model published
+                    self.ui.elem_rv_0.setText(to_vector_str(state[0]))
+                    self.ui.elem_rv_1.setText(to_vector_str(state[1]))
+                    self.ui.elem_rv_3.setText(to_vector_str(state[2],
                                                             ('RA: ', '\nDEC:', '\nW:  '))
                                               )
 
             case 'elem_pqw_':
                 # print("PQW!!")
-                if self.curr_simbod.is_primary:
+                elem_pqw = self._panel_elems.get('elem_pqw_', {}).get(name)
+                if self._is_primary(name) or elem_pqw is None:
                     [w.setText("") for w in widg_grp]
                 else:
                     for i, w in enumerate(widg_grp):
                         # print(f'widget #{i}: {w.objectName()} -> {data_set[i]}')
-                        w.setText(str(to_vector_str(self.model[self.curr_simbod.name].elem_pqw[i])))
+                        w.setText(str(to_vector_str(elem_pqw[i])))
 
             case 'attr_':
                 # print("ATTR!!")
-                data_set = self.curr_simbod.body
+                data_set = self.datastore.body_data[name]['body_obj']
                 # print(f'{data_set}')
                 # print(f'panel_key: {panel_key}, widg_grp: {len(widg_grp)}, data_set: {len(data_set)}')
                 for i, data in enumerate(data_set):
@@ -387,6 +524,7 @@ class MainQtWindow(QtWidgets.QMainWindow):
 
 
 def main():
+    setup_logging(fname='sns_viewer.log')
     if QT_NATIVE:
         app = QCoreApplication(sys.argv)
         app.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling)
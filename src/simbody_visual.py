@@ -7,12 +7,6 @@
 # x
 from typing import Dict, Tuple
 
-import logging
-logging.basicConfig(filename="logs/simbod_viz.log",
-                    level=logging.ERROR,
-                    format="%(funcName)s:\t\t%(levelname)s:%(asctime)s:\t%(message)s",
-                    )
-
 import numpy as np
 from astropy import units as u
 from OpenGL.GL.EXT import polygon_offset
@@ -24,7 +18,11 @@ from vispy.visuals.mesh import MeshVisual
 from vispy.visuals.filters.mesh import TextureFilter
 from vispy.scene.visuals import create_visual_node
 from vispy.geometry.meshdata import MeshData
-from datastore import DEF_TEX_FNAME, _latitude, _oblate_sphere, get_texture_data
+from datastore import DEF_TEX_FNAME, TextureHandle, axis_radii, resolve_texture
+from geometry_pool import GEOMETRY_POOL
+from sim_logging import get_logger
+
+_log = get_logger(__name__)
 
 
 class PlanetVisual(CompoundVisual):
@@ -41,10 +39,11 @@ class PlanetVisual(CompoundVisual):
     rows : int
         Number of rows that make up the sphere mesh
         (for method='latitude').
+    offset : bool
+        Rotate each ring of the mesh by half a sector from the one above it.
     method : str
-        Method for generating sphere. Accepts 'latitude' for
-        latitude-longitude, 'ico' for icosahedron, and 'cube'
-        for cube based tessellation.
+        Method for generating sphere, one of GEOMETRY_METHODS: 'oblate'
+        or 'latitude', which differ in the color of their edge buffer.
     vertex_colors : ndarray
         Same as for `MeshVisual` class.
         See `create_sphere` for vertex ordering.
@@ -58,6 +57,12 @@ class PlanetVisual(CompoundVisual):
         sphere edges are drawn.
     shading : str | None
         Shading to use.
+    defer_texture : bool
+        If True, the sphere is drawn in its body color until set_texture() is called.
+    geometry_pool : GeometryPool
+        Where the unit sphere of this tessellation is shared from, GEOMETRY_POOL if None.
+        The sphere is scaled to the body by the radii property, which the owner of the
+        transform applies as a scale ahead of the rotation and translation.
     """
 
     def __init__(self, body_name=None, # sim_body=None,
@@ -65,8 +70,13 @@ class PlanetVisual(CompoundVisual):
                  vertex_colors=None, face_colors=None,
                  color=Color((1, 1, 1, 1)), edge_color=Color((0, 0, 1, 0.2)),
                  shading=None, texture=None, method='oblate',
-                 vizz_data=None, body_radset=None, valid_names=None, **kwargs):
+                 vizz_data=None, body_radset=None, valid_names=None, defer_texture=False,
+                 geometry_pool=None, **kwargs):
 
+        self._body_name = body_name
+        self._tex_filter = None
+        self._tex_width = None
+        self._tex_color = color
         self._radius = np.zeros((3,), dtype=np.float64)
         self._pos = np.zeros((3,), dtype=np.float64)
         # self._sb_ref = sim_body
@@ -85,45 +95,44 @@ class PlanetVisual(CompoundVisual):
 
         else:           # no SimBody provided
             self._radius = [1.0, 1.0, 1.0] * u.km  # default to 1.0
-            self._texture_data = get_texture_data(DEF_TEX_FNAME)
+            self._texture_data = TextureHandle(DEF_TEX_FNAME)
 
         self._texture = None
 
         if cols is None:        # auto set cols to 2 * rows
             cols = rows * 2
 
-        if method == 'latitude':
-            radius = self._radius
-            self._mesh_data = _latitude(rows, cols,
-                                        self._radius, offset)
-            # print("Using 'latitude' method...")
-        elif method == 'oblate':
-            radius = self._radius
-            self._surface_data = _oblate_sphere(rows, cols,
-                                                self._radius, offset)
-            self._mesh_data = MeshData(vertices=self._surface_data['verts'],
-                                       faces=self._surface_data['faces'])
-            self._surface_data['edges'] = self._mesh_data.get_edges()
-
-        self._mesh = MeshVisual(vertices=self._mesh_data.get_vertices(),
-                                faces=self._mesh_data.get_faces(),
+        if geometry_pool is None:
+            geometry_pool = GEOMETRY_POOL
+        self._geometry_pool = geometry_pool
+        self._geometry = geometry_pool.get(rows, cols, method, offset)
+        self._surface_data = self._geometry.surface
+        self._mesh_data = self._geometry.mesh_data
+
+        self._mesh = MeshVisual(meshdata=self._mesh_data,
                                 vertex_colors=vertex_colors,
                                 face_colors=face_colors,
                                 color=color,
                                 shading=shading)
 
         if edge_color:
-            self._border = MeshVisual(vertices=self._mesh_data.get_vertices(),
-                                      faces=self._mesh_data.get_edges(),
+            self._border = MeshVisual(meshdata=self._geometry.border_data,
                                       color=edge_color, mode='lines')
+            self._geometry.share(self._mesh, self._border)
         else:
-            self._border = MeshVisual()
+            self._border = None
+            self._geometry.share(self._mesh)
         self._mesh.set_gl_state(polygon_offset_fill=True,
                                 polygon_offset=(1, 1),
                                 depth_test=True,
                                 )
-        super(PlanetVisual, self).__init__([v for v in [self._mesh, self._border]])
-        self.texture = self._texture_data
+        super(PlanetVisual, self).__init__([v for v in [self._mesh, self._border] if v is not None])
+        if defer_texture and body_name:
+            _placeholder = Color(self._base_color)
+            _placeholder.alpha = self._body_alpha
+            self._mesh.color = _placeholder
+        else:
+            self.texture = self._texture_data
 
     @property
     def mesh(self):
@@ -182,11 +191,63 @@ class PlanetVisual(CompoundVisual):
         #                           interpolation='linear',
         #                           wrapping='clamp_to_edge')
         # self._texture.set_data(data=self._texture_data)
-        _filter = TextureFilter(new_data,
-                                self._surface_data['tcord'],
-                                enabled=True,
-                                )
-        self._mesh.attach(_filter)
+        self.set_texture(resolve_texture(new_data))
+
+    def set_texture(self, data, width=None):
+        """ Put a decoded texture on the sphere, replacing the placeholder color or the
+            texture it had. This uploads to the GPU, so it must be called from the GUI thread.
+        """
+        if self._tex_filter is None:
+            self._tex_filter = TextureFilter(data,
+                                             self._surface_data['tcord'],
+                                             enabled=True,
+                                             )
+            self._mesh.attach(self._tex_filter)
+            self._mesh.color = self._tex_color
+        else:
+            self._tex_filter.texture = data
+        self._tex_width = width
+
+    def set_lod(self, rows):
+        """ Draw the sphere from the shared tessellation with this many rows, see mesh_lod. """
+        if rows == self._geometry.key[0]:
+            return
+
+        self._geometry.release()
+        self._geometry = self._geometry_pool.get(rows, None, *self._geometry.key[2:])
+        self._surface_data = self._geometry.surface
+        self._mesh_data = self._geometry.mesh_data
+        self._geometry.share(self._mesh, self._border)
+        self._mesh.set_data(meshdata=self._mesh_data)
+        if self._border is not None:
+            self._border.set_data(meshdata=self._geometry.border_data)
+        if self._tex_filter is not None:
+            self._tex_filter.texcoords = self._surface_data['tcord']
+
+    @property
+    def lod_rows(self):
+        return self._geometry.key[0]
+
+    @property
+    def body_name(self):
+        return self._body_name
+
+    @property
+    def radii(self):
+        """ The semi-axes (R, R, R_polar) of the body, which scale the shared unit sphere. """
+        return axis_radii(self._radius)
+
+    @property
+    def texture_source(self):
+        """ The file the texture is decoded from, or None. """
+        if isinstance(self._texture_data, TextureHandle):
+            return self._texture_data.fname
+        return None
+
+    @property
+    def texture_width(self):
+        """ The width of the texture last set, None until one is, or if it was set at full size. """
+        return self._tex_width
 
     @property
     def mark(self):
@@ -237,14 +298,15 @@ if __name__ == "__main__":
 
         def on_timer(event=None):
             bod.transform.reset()
+            bod.transform.scale(bod.radii)
             bod.transform.rotate(bod_timer.elapsed * 2 * np.pi * rps, (0, 0, 1))
             bod.transform.rotate(23.5 * np.pi / 360, (1, 0, 0))
             # bod.transform.scale((1200, 1200, 1200))
             # bod.transform = bod_trx
-            logging.debug("transform = %s", bod.transform)
-            logging.debug("ZOOM FACTOR: %s", view.camera.zoom_factor)
-            logging.debug("SCALE FACTOR: %s", view.camera.scale_factor)
-            logging.debug("CENTER: %s", view.camera.center)
+            _log.debug("transform = %s", bod.transform)
+            _log.debug("ZOOM FACTOR: %s", view.camera.zoom_factor)
+            _log.debug("SCALE FACTOR: %s", view.camera.scale_factor)
+            _log.debug("CENTER: %s", view.camera.center)
 
         bod_timer = Timer(interval='auto',
                           connect=on_timer,
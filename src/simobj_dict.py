@@ -22,9 +22,19 @@ from astropy.coordinates import solar_system_ephemeris
 from astropy.time import Time
 from psygnal import Signal
 
+from body_registry import BodyRegistry
 from datastore import SystemDataStore
 from sim_body import SimBody
 from sim_object import SimObject
+from performance_monitor import PERF_MONITOR
+from prop_pool import DEF_POOL_WORKERS, PropPool
+from sim_propagator import BatchPropagator
+
+#   'body'  : each SimBody propagates itself through poliastro
+#   'raw'   : each SimBody propagates itself on plain float64 values (see SimBody._update_raw)
+#   'batch' : all orbits are propagated together in one vectorized pass (see sim_propagator.py)
+#   'pool'  : the orbits are sharded across persistent worker processes (see prop_pool.py)
+PROP_MODES = ('body', 'raw', 'batch', 'pool')
 
 
 # TODO:: Trim this clas down so that it is merely a general collection of SimBody objects.
@@ -37,18 +47,19 @@ class SimObjectDict(dict):
     has_updated = Signal()
 
     def __init__(self, epoch=None, data=None, ref_data=None,
-                 body_names=None, use_multi=False, auto_up=False):
+                 body_names=None, use_multi=False, auto_up=False, prop_mode='body',
+                 pool_workers=DEF_POOL_WORKERS):
         """ TODO:   Refactor this such that the entire datastore doesn't get generated here,
                     but instead can be optionally done using a class method.
                     The normal procedure should be to load the object individually.
         """
         super().__init__()
         solar_system_ephemeris.set("jpl")
+        self._registry = BodyRegistry()
+        self.data = {}
         if data:
-            self.data = {name: self._validate_sim_obj(simbody)
-                         for name, simbody in data.items()}
-        else:
-            self.data = {}
+            for name, simbody in data.items():
+                self[name] = simbody
 
         if ref_data:
             if isinstance(ref_data, SystemDataStore):
@@ -94,9 +105,19 @@ class SimObjectDict(dict):
         self._USE_LOCAL_TIMER = False
         self._USE_MULTIPROC = False
         self.executor = ThreadPoolExecutor(max_workers=6)
+        if prop_mode not in PROP_MODES:
+            raise ValueError(f'>>>ERROR: {prop_mode} is not a valid propagation mode.')
+
+        self._prop_mode = prop_mode
+        self._batch = BatchPropagator()
+        self._pool_workers = pool_workers
+        self._pool = None           # started on the first update in 'pool' mode
 
     def __setitem__(self, name, sim_obj):
+        if name in self.data:
+            self._registry.remove(name)
         self.data[name] = self._validate_sim_obj(sim_obj)
+        self._registry.add(sim_obj)
 
     def __getitem__(self, name):
         return self.data[name]
@@ -111,23 +132,55 @@ class SimObjectDict(dict):
 
 
     def update_state(self, epoch):
-        self._base_t = self._t1
-        _tx = time.perf_counter()
+        with PERF_MONITOR.span('propagate'):
+            self._propagate(epoch)
 
-        if self._USE_MULTIPROC:
-            futures = (self.executor.submit(sb.get_upstate, epoch=epoch)
+        self._base_t = self._t1
+        self._t1 = time.perf_counter()
+        self.has_updated.emit(self._t1 - self._base_t)
+
+    def _propagate(self, epoch):
+        if self._prop_mode == 'batch':
+            self._update_packed(self._batch, epoch)
+        elif self._prop_mode == 'pool':
+            if self._pool is None:
+                self._pool = PropPool(num_workers=self._pool_workers)
+            self._update_packed(self._pool, epoch)
+        elif self._prop_mode == 'raw':
+            jd = epoch.tdb.jd if type(epoch) == Time else epoch
+            [sb.update_state(jd)
+             for sb in self.data.values()]
+        elif self._USE_MULTIPROC:
+            futures = (self.executor.submit(sb.update_state, epoch=epoch)
                        for sb in self.data.values())
             for future in futures:
                 future.result()
         else:
-            [sb.get_upstate(epoch)
+            [sb.update_state(epoch)
              for sb in self.data.values()]
 
-        self._t1 = time.perf_counter()
-        update_time = self._t1 - self._base_t
-        print(f'\n\t\t> Frame Rate: {1 / update_time:.4f} FPS (1/{update_time:.4f})\n'
-              f'  Model updated in {self._t1 - _tx:.4f} seconds...')
-        self.has_updated.emit(update_time)
+    def _update_packed(self, propagator, epoch):
+        """ Propagate all bodies through a BatchPropagator or a PropPool. The bodies are
+            (re)packed whenever the set of bodies, or the orbit or dist_unit of one of them,
+            has changed since the last pass (see SimBody.pack_gen), and the states are copied
+            into the registry in one assignment.
+        """
+        if not propagator.is_packed(self.data):
+            propagator.pack(self.data)
+
+        self._registry.state[:] = propagator.propagate(epoch)
+        self._registry.invalidate_pos()
+        for sb in self.data.values():
+            if type(epoch) == Time:
+                sb.epoch = epoch
+            else:                                   # a TDB Julian date, see SimBody._update_raw
+                sb.set_jd(epoch)
+
+    def close(self):
+        """ Stop the propagation workers, if any were started. """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
 
     def set_parentage(self):
         self._sys_primary = None
@@ -137,8 +190,27 @@ class SimObjectDict(dict):
             else:
                 self._sys_primary = sb
 
+        self._registry.set_parents({name: sb.body.parent.name if sb.body.parent else None
+                                    for name, sb in self.data.items()})
+
     '''===== PROPERTIES ==========================================================================================='''
 
+    @property
+    def prop_mode(self):
+        return self._prop_mode
+
+    @prop_mode.setter
+    def prop_mode(self, new_mode):
+        if new_mode not in PROP_MODES:
+            raise ValueError(f'>>>ERROR: {new_mode} is not a valid propagation mode.')
+
+        if new_mode != self._prop_mode:
+            self._batch = BatchPropagator()     # force a repack from the current orbits
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+            self._prop_mode = new_mode
+
     @property
     def num_bodies(self):
         return len(self.data.keys())
@@ -153,11 +225,11 @@ class SimObjectDict(dict):
 
     @property
     def radius(self):
-        return [sb.rad_set for sb in self.data.values()]
+        return self._registry.radius
 
     @property
     def rad(self):
-        return [sb.rad_set[0] for sb in self.data.values()]
+        return self._registry.radius[:, 0]
 
     @property
     def parent(self):
@@ -169,19 +241,25 @@ class SimObjectDict(dict):
 
     @property
     def pos(self):
-        return [sb.pos for sb in self.data.values()]
+        """ The (N, 3) positions of the bodies relative to the primary, in dist_unit. """
+        return self._registry.pos
 
     @property
     def vel(self):
-        return [sb.vel for sb in self.data.values()]
+        return self._registry.state[:, 1]
 
     @property
     def rot(self):
-        return [sb.rot for sb in self.data.values()]
+        return self._registry.state[:, 2]
 
     @property
     def state(self):
-        return np.array([sb.state_matrix for sb in self.data.values()])
+        """ The (N, 3, 3) states of the bodies in dict order, a view into the registry. """
+        return self._registry.state
+
+    @property
+    def registry(self):
+        return self._registry
 
     @property
     def track_data(self):
@@ -14,17 +14,21 @@
 #
 #
 # simsystem.py
-import logging
 import time
-from multiprocessing import shared_memory as shm
 
+import numpy as np
 import psygnal
+from astropy import units as u
 from astropy.time import Time, TimeDeltaSec
 
 # from sim_object import SimObject
 from sim_body import SimBody
 # from sim_ship import SimShip
+from performance_monitor import PERF_MONITOR
 from simobj_dict import SimObjectDict
+from sim_logging import get_logger
+from sim_propagator import BATCH_RTOL, SEC_PER_DAY, kepler_uv, pack_orbits
+from state_buffer import DEF_CAPACITY, StateRing
 
 # from simbod_dict import SimBodyDict
 # from simshp_dict import SimShipDict
@@ -32,10 +36,11 @@ from simobj_dict import SimObjectDict
 # from poliastro.bodies import Body
 # from PyQt5.QtCore import QObject
 
-logging.basicConfig(filename="../logs/sns_sysmod.log",
-                    level=logging.ERROR,
-                    format="%(funcName)s:\t\t%(levelname)s:%(asctime)s:\t%(message)s",
-                    )
+#   fields that follow the propagated states and are aggregated again after every update,
+#   every other field is cached until a SimBody reports that it has changed
+TICK_FIELDS = ('pos', 'rot', 'axes', 'elem_coe_', 'elem_pqw_', 'elem_rv_')
+
+_log = get_logger(__name__)
 
 
 class SimSystem(SimObjectDict):
@@ -44,65 +49,83 @@ class SimSystem(SimObjectDict):
     initialized = psygnal.Signal(list)
     panel_data = psygnal.Signal(list, list)
 
-    def __init__(self, buff0=None, buff1=None, *args, **kwargs):
+    def __init__(self, state_ring=None, publish=True, *args, **kwargs):
         """
-            Initialize the star system model. Two Queues are passed to provide
-            communication with the main process along with two shared memory buffers.
+            Initialize the star system model. The states of the bodies are published
+            every update into a StateRing segment of shared memory for the viewer.
 
         Parameters
         ----------
-        buff0, buff1    : Two shared memory buffers of the same correct size
-
+        state_ring      : StateRing, optional; a ring created by the caller to publish into,
+                          otherwise one is created under STATE_SHM_NAME
+        publish         : bool, False for a copy of the system that does not publish its states,
+                          such as the one the GUI keeps for its panels
+        prop_mode       : 'body', 'raw', 'batch' or 'pool', passed by keyword to select how the states
+                          are propagated (see SimObjectDict.prop_mode)
         """
+        self._state_ring = None
         self._t0 = self._base_t = time.perf_counter()
         super(SimSystem, self).__init__([], *args, **kwargs)
         self._t1 = time.perf_counter()
         self._t0 = self._t1
-        print(f'SimSystem declaration took {(self._t1 - self._base_t) * 1e-06:.4f} seconds...')
+        _log.info('SimSystem declaration took %.4f seconds', self._t1 - self._base_t)
         # TODO :: Instead of using the following tuple, simply collect the essential fields,
         #         then collect one or more of the orbital elements type. 'rad0' is static.
         self._model_fields2agg = ('rad0', 'pos', 'rot', 'radius',
                                   'elem_coe_', 'elem_pqw_', 'elem_rv',
                                   'is_primary',
                                   )
+        self._tick          = 0         # number of state updates so far
+        self._field_cache   = {}        # {field_id: {body name: value}}
+        self._field_vers    = {}        # {field_id: {body name: version when the value was aggregated}}
+        self._field_ticks   = {}        # {field_id: tick when a TICK_FIELDS field was aggregated}
+        self._field_dirty   = set()     # {(field_id, body name)} invalidated since aggregated
+        self._field_version = 0
+        self._reset_version = 0         # version when the set of bodies last changed
 
         # TODO :: move the remainder of this method into its own method to be called once the
         #         bodies to be included the system have been selected.
 
-        #   this method loads up all the default planets with no argument
+        #   drop the cached ephems of earlier cache versions, then load up all the default planets
+        SimBody.ephem_cache.prune()
         self.load_from_names()
-        #   run an initial cycle of the states to make sure something is there
-        self.update_state(self.epoch)
 
-        #   determine the bytes needed to hold one body state
-        self._state_size = self.data['Earth'].state.nbytes
+        #   create the shared memory ring unless a usable one is provided
+        if state_ring is not None:
+            if not isinstance(state_ring, StateRing):
+                raise TypeError(f"ERROR. Type {type(state_ring)} is not StateRing !!!")
 
-        #   create two areas of shared memory unless proper buffers are provided
-        if buff0 and buff1:
-            if isinstance(buff0, shm.SharedMemory) and isinstance(buff1, shm.SharedMemory):
-                if (buff0.size != self.num_bodies * self._state_size) or (buff0.size != self.num_bodies * self._state_size):
-                    print(f"WARNING: one or more buffers are not the correct size !!! Setting defaults...")
-                    buff0, buff1 = self._get_shm_buffs()
+            if state_ring.capacity < self.num_bodies:
+                _log.warning('the StateRing holds %d bodies, fewer than %d, using a new one',
+                             state_ring.capacity, self.num_bodies)
+                state_ring = None
 
-            else:
-                buff0, buff1 = self._get_shm_buffs()
-                raise Exception(f"ERROR. Type {type(buff0)} or {type(buff1)} is not shm.SharedMemory !!!\n",
-                                f"Setting defaults...")
+        if state_ring is None and publish:
+            state_ring = StateRing(create=True,
+                                   capacity=max(DEF_CAPACITY, self.num_bodies))
 
-        else:
-            print(f"WARNING: No memory buffer provided !!!\n>>>>>>>> I suppose we must generate one...")
-            buff0, buff1 = self._get_shm_buffs()
+        self._state_ring = state_ring if publish else None
 
-        self._membuffs = [buff0, buff1]
-        self._curr_buff = 0
-        self._state_buffers = None
+        #   run an initial cycle of the states to make sure something is there
+        self.update_state(self.epoch)
+        self._HAS_INIT = True
 
-    # def __del__(self):
-    #     """ Make sure the SharedMemory gets deallocated
-    #     """
-    #
-        # [buff.close() for buff in self._membuffs]
-        # [buff.unlink() for buff in self._membuffs]
+    def update_state(self, epoch):
+        """ Propagate every body to the epoch, then publish the new states to the StateRing.
+        """
+        super(SimSystem, self).update_state(epoch)
+        self._tick += 1
+        if self._state_ring is not None:
+            with PERF_MONITOR.span('shm_publish'):
+                self._state_ring.publish(self.state, epoch.tdb.jd if type(epoch) == Time else epoch)
+
+    def close(self):
+        """ Release the shared memory ring and stop any propagation workers.
+        """
+        super(SimSystem, self).close()
+        if self._state_ring is not None:
+            self._state_ring.close()
+            self._state_ring = None
 
     def load_from_names(self, names=None):
         """ Load the bodies into the system from a list of names.
@@ -119,70 +142,207 @@ class SimSystem(SimObjectDict):
             self.add_body(name)
 
         self._num_bodies = len(self.data)
-        self._state_size = self.data['Earth'].state.nbytes
+        self._state_size = next(iter(self.data.values())).state.nbytes
 
         self.initialized.emit([self.num_bodies, self._state_size])
 
-        # TODO: move this function up into SimSystem class
-        """
-            This method creates one or more SimBody objects based upon the provided list of names.
-            CONSIDER: Should this be a class method that returns a SimSystem() when given names?
+    def add_body(self, name):
+        """ Create a SimBody from the reference data and add it to the system.
+            Its parent, if it has one, must already be in the system.
 
         Parameters
         ----------
-        _body_names :
+        name    : str       The name of a body in the reference data
 
         Returns
         -------
-        nothing     : Leaves the model usable with SimBody objects loaded
+        SimBody : the new body
         """
-        if _body_names is None:
-            self._current_body_names = self._valid_body_names
-        else:
-            self._current_body_names = (n for n in _body_names
-                                        if n in self._valid_body_names)
-
-        # populate the list with SimBody objects
-        self.data.clear()
-        [self.data.update({body_name: SimBody(body_data=self.ref_data.body_data[body_name],
-                                              vizz_data=self.ref_data.vizz_data()[body_name])})
-         for body_name in self._current_body_names]
+        if name not in self._valid_body_names:
+            raise ValueError(f'>>>ERROR: {name} is not a valid body name.')
+
+        if name in self.data:
+            _log.warning('%s is already in the system', name)
+            return self.data[name]
 
+        parent = self.ref_data.body_data[name]['body_obj'].parent
+        if parent is not None and parent.name not in self.data:
+            raise ValueError(f'>>>ERROR: the parent of {name}, {parent.name}, is not in the system.')
+
+        self[name] = SimBody(body_data=self.ref_data.body_data[name],
+                             vizz_data=self.ref_data.vizz_data(name=name))
+        self.data[name].field_changed.connect(self._on_field_changed)
         self._body_count = len(self.data)
-        # self._sys_primary = [sb for sb in self.data.values() if sb.body.parent is None][0]
+        self._reset_fields()
         self.set_parentage()
+        if self._HAS_INIT:
+            self.data[name].update_state(self._sys_epoch)
         self._IS_POPULATED = True
 
-        self.update_state(epoch=self._sys_epoch)
-        self._HAS_INIT = True
-        # self.set_field_dict()
+        return self.data[name]
 
+    def remove_body(self, name):
+        """ Remove a body from the system. A body that is the parent of another
+            body in the system cannot be removed.
 
-    def _get_shm_buffs(self):
-        """ Create two shared memory buffers according to the number of bodies present and
-            the size of state information for each body.
+        Parameters
+        ----------
+        name    : str       The name of a body in the system
+        """
+        if name not in self.data:
+            raise ValueError(f'>>>ERROR: {name} is not in the system.')
+
+        children = [sb.name for sb in self.data.values()
+                    if sb.body.parent and sb.body.parent.name == name]
+        if children:
+            raise ValueError(f'>>>ERROR: {name} is the parent of {children}.')
+
+        self.data[name].field_changed.disconnect(self._on_field_changed)
+        self._registry.remove(name)
+        del self.data[name]
+        SimBody.system.pop(name, None)
+        self._body_count = len(self.data)
+        self._reset_fields()
+        self.set_parentage()
+
+    def check_batch_states(self, epoch=None):
+        """ Propagate the orbits of the system to an epoch through both the batch solver and
+            poliastro, and compare the resulting states. Both are computed on copies of the
+            initial states, so the bodies and the registry are left as they were. Bodies
+            without an Orbit take the same ephem path either way and are not compared.
 
-            ReturnsS bo, b1 are two equally sized shared memory buffers,
-            explicitly destroyed in __del__
+        Parameters
+        ----------
+        epoch       : Time      The epoch to compare at, defaults to the system epoch
+
+        Returns
+        -------
+        (float, float, bool)    : the largest relative position error, the largest relative
+                                  velocity error, and whether both are within BATCH_RTOL
         """
-        b0 = shm.SharedMemory(create=True,
-                              name="state_buff0",
-                              size=self.num_bodies * self._state_size)
-        b1 = shm.SharedMemory(create=True,
-                              name="state_buff1",
-                              size=self.num_bodies * self._state_size)
-        return b0, b1
+        if epoch is None:
+            epoch = self._sys_epoch
+        if type(epoch) != Time:
+            epoch = Time(epoch, format='jd', scale='tdb')
+
+        simbods = tuple(self.data.values())
+        kep_idx, _, rv0, jd0, _ = pack_orbits(simbods)
+        if rv0 is None:
+            return 0.0, 0.0, True
+
+        b_states = kepler_uv(**rv0, dt=(epoch.tdb.jd - jd0) * SEC_PER_DAY)
+        p_orbits = [simbods[idx].orbit.propagate(epoch) for idx in kep_idx]
+        p_states = (np.array([o.r.to_value(u.km) for o in p_orbits]),
+                    np.array([o.v.to_value(u.km / u.s) for o in p_orbits]))
+
+        errs = []
+        for b_vec, p_vec in zip(b_states, p_states):
+            ref = np.maximum(np.linalg.norm(p_vec, axis=1), 1e-300)
+            errs.append(float(np.max(np.linalg.norm(b_vec - p_vec, axis=1) / ref)))
+
+        return errs[0], errs[1], max(errs) <= BATCH_RTOL
 
     def get_agg_fields(self, field_ids):
-        # res = {'primary_name': self.system_primary.name}
-        res = {}
+        """ Aggregate fields over every body, served from the field cache.
+
+        Parameters
+        ----------
+        field_ids   : iterable of str   The fields to aggregate, see get_sbod_field
+
+        Returns
+        -------
+        dict        : {field_id: {body name: value}}
+        """
+        with PERF_MONITOR.span('aggregate'):
+            self._refresh_fields(field_ids)
+
+            return {f_id: dict(self._field_cache[f_id]) for f_id in field_ids}
+
+    def get_agg_deltas(self, field_ids, since=-1):
+        """ Aggregate only the field values that have changed since a given version.
+            If the set of bodies has changed since then, every value is included.
+
+        Parameters
+        ----------
+        field_ids   : iterable of str   The fields to aggregate, see get_sbod_field
+        since       : int               The version returned by the caller's previous call
+
+        Returns
+        -------
+        (int, dict) : the current version, and {field_id: {body name: value}} holding only the
+                      changed values; fields without changes are left out
+        """
+        with PERF_MONITOR.span('aggregate'):
+            self._refresh_fields(field_ids)
+            if since < self._reset_version:
+                since = -1
+
+            res = {}
+            for f_id in field_ids:
+                vers = self._field_vers[f_id]
+                changed = {n: v for n, v in self._field_cache[f_id].items() if vers[n] > since}
+                if changed:
+                    res[f_id] = changed
+
+        return self._field_version, res
+
+    def invalidate_fields(self, field_ids=None, names=None):
+        """ Mark cached field values to be aggregated again on the next request.
+
+        Parameters
+        ----------
+        field_ids   : iterable of str   The fields to invalidate, defaults to every cached field
+        names       : iterable of str   The bodies to invalidate, defaults to every body
+        """
+        if field_ids is None:
+            field_ids = tuple(self._field_cache.keys())
+        if names is None:
+            names = tuple(self.data.keys())
+
         for f_id in field_ids:
-            agg = {}
-            [agg.update({sb.name: self.get_sbod_field(sb, f_id)})
-             for sb in self.data.values()]
-            res.update({f_id: agg})
+            if f_id in TICK_FIELDS:
+                self._field_ticks.pop(f_id, None)
+            else:
+                self._field_dirty.update((f_id, n) for n in names)
 
-        return res
+    def _on_field_changed(self, name, field_ids):
+        if 'radius' in field_ids and name in self._registry:
+            self._registry.set_radius(self.data[name])
+        self.invalidate_fields(field_ids, (name,))
+
+    def _refresh_fields(self, field_ids):
+        """ Aggregate again only the cached values that are missing or stale. """
+        version = self._field_version + 1
+        changed = False
+        for f_id in field_ids:
+            cache = self._field_cache.setdefault(f_id, {})
+            vers = self._field_vers.setdefault(f_id, {})
+            if f_id in TICK_FIELDS:
+                if self._field_ticks.get(f_id) == self._tick:
+                    continue
+                names = tuple(self.data.keys())
+                self._field_ticks[f_id] = self._tick
+            else:
+                names = [n for n in self.data.keys()
+                         if n not in cache or (f_id, n) in self._field_dirty]
+
+            for n in names:
+                cache[n] = self.get_sbod_field(self.data[n], f_id)
+                vers[n] = version
+                self._field_dirty.discard((f_id, n))
+                changed = True
+
+        if changed:
+            self._field_version = version
+
+    def _reset_fields(self):
+        """ Drop the field cache after the set of bodies has changed. """
+        self._field_cache.clear()
+        self._field_vers.clear()
+        self._field_ticks.clear()
+        self._field_dirty.clear()
+        self._field_version += 1
+        self._reset_version = self._field_version
 
     def get_sbod_field(self, _simbod, field_id):
         """
@@ -277,6 +437,10 @@ class SimSystem(SimObjectDict):
     def dist_unit(self):
         return self._dist_unit
 
+    @property
+    def state_ring(self):
+        return self._state_ring
+
     @property
     def positions(self):
         """
@@ -284,8 +448,7 @@ class SimSystem(SimObjectDict):
         -------
         dict    :   a dictionary of the positions of the bodies in the system keyed by name.
         """
-        return dict.fromkeys(list(self.data.keys()),
-                             [sb.pos for sb in self.data.values()])
+        return dict(zip(self.data.keys(), self._registry.pos))
 
     @property
     def radii(self):
@@ -344,12 +507,14 @@ if __name__ == "__main__":
     def main():
         ref_time = time.perf_counter()
 
-        model = SimSystem({})
-        model.load_from_names()
+        model = SimSystem(publish=False)         # loads the default bodies
         init_time = time.perf_counter()
 
-        model.update_state(model.epoch)
-        done_time = time.perf_counter()
+        try:
+            model.update_state(model.epoch)
+            done_time = time.perf_counter()
+        finally:
+            model.close()
 
         # print(f"Setup time: {((init_time - ref_time) / 1e+09):0.4f} seconds")
         # print(f'Update time: {((done_time - init_time) / 1e+09):0.4f} seconds')
@@ -0,0 +1,198 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# state_buffer.py
+# This module defines the shared memory segment through which the model publishes body states.
+#
+# LAYOUT:   (all words are 8 bytes, so every field is naturally aligned)
+#   header      : [active slot, body capacity, slot count]                         int64 x 3
+#   slot heads  : [sequence number, epoch (TDB Julian date), body count] per slot   8 bytes x 3 x slots
+#   slot frames : one (capacity, 3, 3) float64 state frame for each slot
+#
+# The writer fills the slot after the active one, marking its sequence number odd while writing
+# its epoch, body count and states, and giving it the next even (ring-wide unique) value when
+# done, then stores the new active index with a single aligned 8-byte write. Everything a reader
+# needs about a frame sits in its slot, under its sequence number. Readers never block the writer:
+# snapshot() copies the active frame and checks afterwards that its sequence number has not
+# moved, retrying a bounded number of times; latest() takes a zero-copy view instead, which the
+# reader must check with is_current() after its last read of it.
+from multiprocessing import shared_memory as shm
+
+import numpy as np
+
+STATE_SHM_NAME  = "sns_state_ring"
+DEF_NUM_SLOTS   = 3
+DEF_CAPACITY    = 64
+READ_RETRIES    = 100       # attempts of a reader to catch a frame that is not being overwritten
+_HDR_WORDS      = 3
+_ACTIVE, _CAPACITY, _SLOTS = range(_HDR_WORDS)
+
+
+def ring_size(capacity, num_slots=DEF_NUM_SLOTS):
+    """ The number of bytes needed by a ring of the given capacity. """
+    return 8 * (_HDR_WORDS + 3 * num_slots + num_slots * capacity * 9)
+
+
+class StateRing:
+    """
+        An N-slot ring of (N, 3, 3) float64 state frames in shared memory, published by the
+        model and mapped by the viewer.
+    """
+    def __init__(self, name=STATE_SHM_NAME, create=False,
+                 capacity=DEF_CAPACITY, num_slots=DEF_NUM_SLOTS):
+        """
+        Parameters
+        ----------
+        name        : str       name of the shared memory segment
+        create      : bool      True in the model process, False to attach to an existing ring
+        capacity    : int       maximum number of bodies (ignored when attaching)
+        num_slots   : int       number of frames in the ring (ignored when attaching)
+        """
+        if create:
+            self._shm = shm.SharedMemory(create=True, name=name,
+                                         size=ring_size(capacity, num_slots))
+        else:
+            self._shm = shm.SharedMemory(create=False, name=name)
+
+        self._owner  = create
+        self._header = np.ndarray((_HDR_WORDS,), dtype=np.int64, buffer=self._shm.buf)
+        if create:
+            self._header[:] = (0, capacity, num_slots)
+
+        capacity  = int(self._header[_CAPACITY])
+        num_slots = int(self._header[_SLOTS])
+        offset    = 8 * _HDR_WORDS
+        self._seqs = np.ndarray((num_slots,), dtype=np.int64,
+                                buffer=self._shm.buf, offset=offset)
+        self._jds  = np.ndarray((num_slots,), dtype=np.float64,
+                                buffer=self._shm.buf, offset=offset + 8 * num_slots)
+        self._counts = np.ndarray((num_slots,), dtype=np.int64,
+                                  buffer=self._shm.buf, offset=offset + 16 * num_slots)
+        self._frames = np.ndarray((num_slots, capacity, 3, 3), dtype=np.float64,
+                                  buffer=self._shm.buf, offset=offset + 24 * num_slots)
+        if create:
+            self._seqs[:] = 0
+            self._jds[:] = 0.0
+            self._counts[:] = 0
+
+    def publish(self, states, jd):
+        """
+            Write a full state frame into the next slot and make it the active one.
+
+        Parameters
+        ----------
+        states      : np.ndarray(N, 3, 3)   the state matrix of every body, N <= capacity
+        jd          : float                 the epoch of the states as a TDB Julian date
+
+        Returns
+        -------
+        int         : the sequence number of the published frame
+        """
+        count = len(states)
+        if count > self.capacity:
+            raise ValueError(f'>>>ERROR: {count} states exceed the ring capacity of {self.capacity}.')
+
+        slot = (int(self._header[_ACTIVE]) + 1) % len(self._seqs)
+        seq = int(self._seqs.max()) + 2             # sequence numbers are unique across slots
+        self._seqs[slot] = seq - 1                  # odd: slot is being written
+        self._frames[slot, :count] = states
+        self._jds[slot] = jd
+        self._counts[slot] = count
+        self._seqs[slot] = seq                      # even: slot is complete
+        self._header[_ACTIVE] = slot
+
+        return seq
+
+    def _active(self):
+        """ The slot, sequence number, epoch and body count of the active frame, read consistently,
+            or None if the writer kept overwriting it for READ_RETRIES attempts.
+        """
+        for _ in range(READ_RETRIES):
+            slot = int(self._header[_ACTIVE])
+            seq = int(self._seqs[slot])
+            if seq % 2:
+                continue
+            jd, count = float(self._jds[slot]), int(self._counts[slot])
+            if int(self._seqs[slot]) == seq:
+                return slot, seq, jd, count
+
+        return None
+
+    def latest(self):
+        """
+            Take a zero-copy view of the most recently published frame.
+
+        Returns
+        -------
+        (int, float, np.ndarray(N, 3, 3))   : the sequence number, epoch and states of the frame.
+                                              The view stays valid while is_current(seq) is True,
+                                              which the reader must check after its last read.
+        None                                : if no consistent frame could be caught
+        """
+        active = self._active()
+        if active is None:
+            return None
+
+        slot, seq, jd, count = active
+        return seq, jd, self._frames[slot, :count]
+
+    def snapshot(self, out=None):
+        """
+            Copy the most recently published frame, retrying if it was overwritten during the copy.
+
+        Parameters
+        ----------
+        out         : np.ndarray(capacity, 3, 3), optional; the buffer to copy into
+
+        Returns
+        -------
+        (int, float, np.ndarray(N, 3, 3))   : the sequence number, epoch and a copy of the states,
+                                              a view of the first N rows of out if it is given
+        None                                : if no consistent frame could be caught
+        """
+        if out is None:
+            out = np.empty(self._frames.shape[1:], dtype=np.float64)
+
+        for _ in range(READ_RETRIES):
+            active = self._active()
+            if active is None:
+                return None
+            slot, seq, jd, count = active
+            out[:count] = self._frames[slot, :count]
+            if int(self._seqs[slot]) == seq:
+                return seq, jd, out[:count]
+
+        return None
+
+    def is_current(self, seq):
+        """ True while the frame published with this sequence number has not been overwritten. """
+        return seq in self._seqs
+
+    def close(self):
+        """ Release the mapping, and the segment itself if this instance created it. """
+        self._header = self._seqs = self._jds = self._counts = self._frames = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def capacity(self):
+        return int(self._header[_CAPACITY])
+
+    @property
+    def num_bodies(self):
+        """ The body count of the active frame. """
+        return int(self._counts[int(self._header[_ACTIVE])])
+
+    @property
+    def seq(self):
+        return int(self._seqs[int(self._header[_ACTIVE])])
@@ -8,10 +8,8 @@
 #
 #  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import logging
 import math
 import time
-from multiprocessing import shared_memory as shm
 
 import astropy.units as u
 import numpy as np
@@ -19,12 +17,21 @@ import vispy.visuals.transforms as trx
 from vispy.color import *
 from vispy.scene.visuals import (Markers, Polygon, XYZAxis)
 
-from datastore import vec_type
-from performance_monitor import PerformanceMonitor
+from datastore import axis_radii, vec_type
+from geometry_pool import GeometryPool
+from instanced_planets import InstancedPlanets, PlanetInstance, body_rotations
+from marker_manager import MarkerManager
+from mesh_lod import LOD_DEF_ROWS, LodSelector
+from performance_monitor import PERF_MONITOR
 from performance_overlay import PerformanceOverlay
 from sim_body import MIN_FOV, SimBody
+from sim_logging import TRACE, get_logger
 from sim_skymap import SkyMap
 from simbody_visual import Planet
+from body_registry import compose_positions, depth_levels
+from state_buffer import StateRing
+from texture_loader import DEF_TEX_WIDTH, TextureLoader
+from view_culling import frustum_mask, occlusion_mask, project_spheres, scene_matrix
 
 # these quantities can be served from DATASTORE class
 MIN_SYMB_SIZE = 5
@@ -35,6 +42,8 @@ ST = trx.STTransform
 MT = trx.MatrixTransform
 SUN_COLOR = Color(tuple(np.array([253, 184, 19]) / 256))
 
+_log = get_logger(__name__)
+
 DEF_MARKS_INIT = dict(scaling=False,
                       alpha=1,
                       antialias=1,
@@ -94,7 +103,8 @@ class StarSystemVisuals:
         self._bods_pos     = []
         self._scene        = None
         self._skymap       = None
-        self._planets      = {}      # a dict of Planet visuals
+        self._planets      = {}      # a dict of Planet visuals, or of PlanetInstance when instanced
+        self._inst_planets = None    # the InstancedPlanets visual drawing every surface, if instanced
         self._tracks       = {}      # a dict of Polygon visuals
         self._symbols      = []
         self._symbol_sizes = []
@@ -113,7 +123,7 @@ class StarSystemVisuals:
         self._curr_t       = None
         
         # Performance optimizations
-        self._use_instancing = True  # Enable GPU instancing for similar objects
+        self._use_instancing = True  # draw all the planet surfaces in one instanced draw call
         self._batch_size = 1000  # Batch size for updating visual data
         self._frustum_culling = True  # Enable view frustum culling
         self._lod_enabled = True  # Enable level of detail
@@ -138,7 +148,11 @@ class StarSystemVisuals:
             'geometry_pool_size': 256,      # Size of geometry pool in MB
         }
         
-        # LOD distance thresholds (in km)
+        # the level of detail of the planet meshes, from their size on screen
+        self._lod = LodSelector()
+        self._lod_levels = None
+
+        # texture LOD distance thresholds (in km)
         self._lod_thresholds = {
             'ultra': 1e5,    # Full detail
             'high': 1e6,     # High detail
@@ -148,15 +162,16 @@ class StarSystemVisuals:
         }
         
         # Resource pools
+        self._tex_loader = TextureLoader()  # decodes textures off the GUI thread
         self._texture_pool = {}  # Cached textures
-        self._geometry_pool = {} # Cached geometries
+        self._geometry_pool = GeometryPool()  # unit sphere meshes shared by the planets
         self._shader_cache = {}  # Cached shaders
         
         # Initialize resource manager
         self._init_resource_manager()
         
-        # Initialize performance monitoring
-        self._perf_monitor = PerformanceMonitor()
+        # Initialize performance monitoring, sharing the spans of this process (see performance_monitor)
+        self._perf_monitor = PERF_MONITOR
         self._perf_overlay = None  # Will be initialized when view is set
         
         # Connect performance signals
@@ -167,8 +182,23 @@ class StarSystemVisuals:
             self._body_names = [n for n in body_names]
         self._body_count   = len(self._body_names)
         self._bods_pos     = None
-        self._buff1 = None
-        self._buff0 = None
+        self._state_ring   = None       # StateRing published by the model
+        self._state_seq    = None       # sequence number of the last frame drawn
+        self._state_rows   = None       # state row of each visual's body, -1 once it left the model
+        self._present      = None       # whether each visual's body is still in the model
+        self._rows_stale   = False      # whether the set of bodies of the model has changed
+        self._frame        = None       # the copy of the last frame read from the StateRing
+        self._parent_rows  = None       # state row of each body's parent, -1 for the primary
+        self._levels       = None       # state rows grouped by depth below the primary
+        self._abs_pos      = None       # position of each state row relative to the primary
+        self._state_jd     = None       # epoch of the last frame read, as a TDB Julian date
+        self._radsets      = None       # (N, 3) semi-axes (R, R, R_polar) of each visual's body in dist_unit
+        self._radii        = None       # bounding radius of each visual's body in dist_unit
+        self._in_view      = None       # whether each visual's body survived culling this frame
+        self._cam_dist     = None       # distance of each visual's body from the camera center
+        self._mark_data    = None       # apparent sizes and marker sizes, see get_mark_data
+        self._marker_mgr   = None       # sends the markers only the attributes that changed
+        self._colors_stale = True       # whether body_color or body_alpha changed since last drawn
         self._new_states = None
 
     '''--------------------------- END StarSystemVisuals.__init__() -----------------------------------------'''
@@ -197,24 +227,24 @@ class StarSystemVisuals:
         self._frame_viz.transform = MT()
         self._frame_viz.transform.scale((1e+09, 1e+09, 1e+09))
 
-        self._buff0 = shm.SharedMemory(create=False,
-                                       name="state_buff0")
-        self._buff1 = shm.SharedMemory(create=False,
-                                       name="state_buff1")
-
-        self._bods_pos = np.ndarray((11, 3, 3), dtype=vec_type)
-        self._bods_pos = np.array(self._buff0.buf)
-        print(f"[:, :,] => {self._bods_pos.shape}")
-        # check = [self._bods_pos[n, 1] for n in range(0, self._body_count - 1)]
-        # print(f"[:, :,] => {check.shape}")
-        # self._bods_pos = list(self._agg_cache['pos'].values())
-
+        self._state_ring = StateRing(create=False)
+        self._frame = np.zeros((self._state_ring.capacity, 3, 3), dtype=np.float64)
+        model_names = list(self._agg_cache['parent_name'].keys())
+        self._body_names = [n for n in self._body_names if n in model_names]
+        self._body_count = len(self._body_names)
+        self._map_state_rows()
+        self._read_states()
+
+        self._use_instancing &= self._optimization_settings['geometry_instancing']
+        if self._use_instancing:
+            self._generate_instanced_viz()
         for name in self._body_names:
             self._generate_planet_viz(body_name=name)
-            print(f'Planet Visual for {name} created...')
+            _log.debug('Planet Visual for %s created...', name)
             if name != self._agg_cache['is_primary']:
                 self._generate_trajct_viz(body_name=name)
-                print(f'Trajectory Visual for {name} created...')
+                _log.debug('Trajectory Visual for %s created...', name)
+        self._geometry_memory_used = self._geometry_pool.nbytes
 
         self._generate_marker_viz()
         self._subvizz = dict(sk_map=self._skymap,
@@ -222,44 +252,117 @@ class StarSystemVisuals:
                              p_mrks=self._plnt_markers,
                              # c_mrks=self._cntr_markers,
                              tracks=self._tracks,
-                             surfcs=self._planets,
+                             surfcs={} if self._use_instancing else self._planets,
                              )
+        if self._use_instancing:
+            self._subvizz.update(i_plnt=self._inst_planets)
         self._upload2view()
         
-        # Initialize performance overlay
-        if not self._perf_overlay and hasattr(view, 'native'):
-            self._perf_overlay = PerformanceOverlay(view.native)
-            self._perf_overlay.show()
-        
-        # Start frame timing
-        self._perf_monitor.start_frame()
-        
-        # Generate visuals
-        # super().generate_visuals(view, agg_data)
-        
-        # End frame and update stats
-        self._perf_monitor.end_frame(len(self._planets))
-        
+        # Initialize performance overlay, and time the drawing of the canvas around its own draw handler
+        canvas = getattr(view, 'canvas', None)
+        if canvas is not None:
+            if not self._perf_overlay and hasattr(canvas, 'native'):
+                self._perf_overlay = PerformanceOverlay(canvas.native)
+                self._perf_overlay.show()
+            canvas.events.draw.connect(self._start_draw, position='first')
+            canvas.events.draw.connect(self._end_draw, position='last')
+
         self._curr_t = time.perf_counter()
-        print(f'Visuals generated in {(self._curr_t - self._last_t):.4f} seconds...')
+        _log.info('Visuals generated in %.4f seconds...', self._curr_t - self._last_t)
+
+    def _map_state_rows(self):
+        """ The StateRing rows follow the order of the bodies in the model, which is the key
+            order of every aggregated field. Map each visual to its row and to its parent's row.
+            The visuals of bodies that have left the model keep their place, with no row.
+        """
+        model_names = list(self._agg_cache['parent_name'].keys())
+        self._state_rows = np.array([model_names.index(n) if n in model_names else -1
+                                     for n in self._body_names], dtype=np.intp)
+        self._present = self._state_rows >= 0
+        self._parent_rows = np.array([model_names.index(p) if p in model_names else -1
+                                      for p in self._agg_cache['parent_name'].values()],
+                                     dtype=np.intp)
+        self._levels = depth_levels(self._parent_rows)
+        self._abs_pos = np.zeros((len(model_names), 3), dtype=np.float64)
+
+    def _read_states(self):
+        """ Copy the latest frame of the StateRing and compose the position of every body
+            relative to the system primary from the parent-relative states. The copy keeps the
+            whole frame consistent while the model publishes the next ones. The last frame read
+            is kept when no consistent frame can be caught, or when the set of bodies has changed
+            and the aggregated fields of the new set have not arrived yet.
+
+        Returns
+        -------
+        bool    : True if the frame is newer than the last one read
+        """
+        frame = self._state_ring.snapshot(out=self._frame)
+        if frame is None:
+            return False
+
+        seq, jd, states = frame
+        if self._rows_stale or len(states) != len(self._parent_rows):
+            if len(self._agg_cache['parent_name']) != len(states):
+                return False
+            self._map_state_rows()
+            self._rows_stale = False
+
+        is_new = seq != self._state_seq
+        self._state_seq = seq
+        self._state_jd = jd
+        self._new_states = states
+        pos = compose_positions(states[:, 0], self._parent_rows, self._levels, out=self._abs_pos)
+        self._abs_pos = pos
+        self._bods_pos = np.where(self._present[:, None], pos[self._state_rows], 0.0)
+
+        return is_new
+
+    def _generate_instanced_viz(self):
+        """ Generate the InstancedPlanets visual that draws the surfaces of all the SimBodys
+        """
+        self._update_radii()
+        self._inst_planets = InstancedPlanets(radii=self._radsets,
+                                              colors=self._face_colors(),
+                                              lod_rows=self._lod.rows,
+                                              geometry_pool=self._geometry_pool,
+                                              parent=self._scene,
+                                              )
 
     def _generate_planet_viz(self, body_name):
-        """ Generate Planet visual object for each SimBody
+        """ Generate Planet visual object for each SimBody, or its instance of the
+            InstancedPlanets visual when instancing
         """
         viz_dat = {}
         [viz_dat.update({k: v[body_name]}) for k, v in self._agg_cache.items()]     # if list(v.keys())[0] == body_name]
+        if self._use_instancing:
+            plnt = PlanetInstance(renderer=self._inst_planets,
+                                  idx=self._body_names.index(body_name),
+                                  body_name=body_name,
+                                  vizz_data=viz_dat,
+                                  )
+            self._planets.update({body_name: plnt})
+            if plnt.texture_source is not None:
+                self._tex_loader.request(body_name, plnt.texture_source,
+                                         min(DEF_TEX_WIDTH, self._inst_planets.layer_width))
+            return
+
         plnt = Planet(body_name=body_name,
-                      rows=18,
+                      rows=LOD_DEF_ROWS,
                       color=Color((1, 1, 1, self._agg_cache['body_alpha'][body_name])),
                       edge_color=Color((0, 0, 0, 0)),  # sb.base_color,
                       parent=self._scene,
                       visible=True,
                       method='oblate',
                       vizz_data=viz_dat,
-                      body_radset=self._agg_cache['radius'][body_name]
+                      body_radset=self._agg_cache['radius'][body_name],
+                      defer_texture=True,
+                      geometry_pool=self._geometry_pool,
                       )
         plnt.transform = trx.MatrixTransform()  # np.eye(4, 4, dtype=np.float64)
+        plnt.transform.scale(plnt.radii)
         self._planets.update({body_name: plnt})
+        if plnt.texture_source is not None:
+            self._tex_loader.request(body_name, plnt.texture_source, DEF_TEX_WIDTH)
 
     def _generate_trajct_viz(self, body_name):
         """ Generate Polygon visual object for each SimBody orbit
@@ -278,6 +381,9 @@ class StarSystemVisuals:
         # put init of markers into a method
         self._symbols = [pl.mark for pl in self._planets.values()]
         self._plnt_markers = Markers(parent=self._scene, **DEF_MARKS_INIT)  # a single instance of Markers
+        self._marker_mgr = MarkerManager(self._plnt_markers)
+        self._marker_mgr.set_edge_color(Color([1, 0, 0, _pm_e_alpha]).rgba)
+        self._marker_mgr.set_symbol(self._symbols)
         # self._cntr_markers = Markers(parent=self._scene,
         #                              symbol=['+' for _ in range(self._body_count)],
         #                              size=[(MIN_SYMB_SIZE - 2) for _ in range(self._body_count)],
@@ -288,7 +394,7 @@ class StarSystemVisuals:
     def _upload2view(self):
         for k, v in self._subvizz.items():
             if "_" in k:
-                print(k)
+                _log.debug('adding %s to the view', k)
                 self._scene.parent.add(v)
             else:
                 [self._scene.parent.add(t) for t in v.values()]
@@ -306,24 +412,19 @@ class StarSystemVisuals:
 
     def _cleanup_resources(self):
         """Clean up GPU resources"""
+        self._tex_loader.close()
         for tex in self._texture_pool.values():
             if hasattr(tex, 'delete'):
                 tex.delete()
-        for geo in self._geometry_pool.values():
-            if hasattr(geo, 'delete'):
-                geo.delete()
         self._texture_pool.clear()
         self._geometry_pool.clear()
 
-    def _manage_lod(self, visual, distance):
-        """Manage level of detail based on distance"""
-        if not self._optimization_settings['mesh_lod']:
-            return 'ultra'
-            
-        for level, threshold in self._lod_thresholds.items():
-            if distance < threshold:
-                return level
-        return 'minimal'
+    def _manage_lod(self):
+        """ Pick the mesh level of detail of every body from its radius on screen, see mesh_lod. """
+        if self._optimization_settings['mesh_lod']:
+            self._lod_levels = self._lod.select(self._mark_data['pix_diam'] / 2)
+        else:
+            self._lod_levels = self._lod.default(self._body_count)
 
     def _stream_texture(self, visual, distance):
         """Stream appropriate texture based on distance"""
@@ -344,41 +445,30 @@ class StarSystemVisuals:
             target_size = 256
             
         # Check if we need to change texture
-        current_size = getattr(visual.texture, 'size', (0, 0))[0]
-        if current_size != target_size:
+        if visual.texture_width is not None and visual.texture_width != target_size:
             self._load_optimized_texture(visual, target_size)
 
     def _load_optimized_texture(self, visual, target_size):
-        """Load and optimize texture for the given size"""
-        if not hasattr(visual, 'texture_source'):
+        """ Set the texture of a visual at the given width straight from its memory-mapped
+            mip level, or ask the texture loader to build the level; it is then set by
+            _upload_textures.
+        """
+        if visual.texture_source is None:
             return
-            
-        # Check texture pool
-        cache_key = f"{visual.texture_source}_{target_size}"
-        if cache_key in self._texture_pool:
-            visual.texture = self._texture_pool[cache_key]
+
+        level = self._tex_loader.mips.mapped(visual.texture_source, target_size)
+        if level is not None:
+            visual.set_texture(level, target_size)
             return
-            
-        # Load and resize texture
-        try:
-            from PIL import Image
-            img = Image.open(visual.texture_source)
-            img = img.resize((target_size, target_size), Image.Resampling.LANCZOS)
-            
-            # Convert to optimal format and create texture
-            img = img.convert('RGBA')
-            new_texture = visual.texture.__class__(data=img)
-            
-            # Update pool if within size limit
-            texture_size = target_size * target_size * 4  # RGBA
-            if self._texture_memory_used + texture_size <= self._optimization_settings['texture_pool_size'] * 1024 * 1024:
-                self._texture_pool[cache_key] = new_texture
-                self._texture_memory_used += texture_size
-            
-            visual.texture = new_texture
-            
-        except Exception as e:
-            logging.error(f"Texture optimization failed: {e}")
+
+        self._tex_loader.request(visual.body_name, visual.texture_source, target_size)
+
+    def _upload_textures(self):
+        """ Set the textures the loader has finished on their visuals, a few per frame. """
+        for name, width, data in self._tex_loader.poll():
+            visual = self._planets.get(name)
+            if visual is not None:
+                visual.set_texture(data, width)
 
     def _update_visual_batches(self, start_idx=0, batch_size=None):
         """Update visuals in batches with advanced optimizations"""
@@ -386,63 +476,56 @@ class StarSystemVisuals:
             batch_size = self._batch_size
             
         end_idx = min(start_idx + batch_size, len(self._planets))
-        
-        # Group similar objects for instancing
-        instance_groups = {}
-        
-        for planet in list(self._planets.values())[start_idx:end_idx]:
-            if not hasattr(planet, 'transform'):
-                continue
-                
-            # Get position and check visibility
-            pos = planet.transform.map([0, 0, 0])
-            distance = np.linalg.norm(pos)
-            
-            # Apply draw distance culling
-            if distance > self._optimization_settings['max_draw_distance']:
-                continue
-            
-            # Apply occlusion culling
-            if self._optimization_settings['occlusion_culling'] and not self._is_visible(planet):
+
+        for n in range(start_idx, end_idx):
+            planet = self._planets[self._body_names[n]]
+
+            # culled bodies get no texture or geometry updates (see _cull_bodies)
+            if not self._in_view[n]:
                 continue
+
+            distance = self._cam_dist[n]
             
             # Apply LOD
-            lod_level = self._manage_lod(planet, distance)
-            
+            planet.set_lod(self._lod.rows[self._lod_levels[n]])
+
             # Stream appropriate texture
             self._stream_texture(planet, distance)
-            
-            # Group for instancing if possible
-            if self._optimization_settings['geometry_instancing']:
-                instance_key = (planet.__class__, getattr(planet, 'geometry_key', None))
-                if instance_key[1] is not None:
-                    instance_groups.setdefault(instance_key, []).append(planet)
-                    continue
-            
+
             # Update individual visual
             planet.update()
-        
-        # Update instanced groups
-        for group in instance_groups.values():
-            if len(group) > 1:
-                self._update_instanced_group(group)
-
-    def _update_instanced_group(self, group):
-        """Update a group of similar objects using instancing"""
-        if not group:
-            return
-            
-        # Collect transforms
-        transforms = [obj.transform.matrix for obj in group]
-        
-        # Update first object with instancing
-        primary = group[0]
-        if hasattr(primary, 'update_instanced'):
-            primary.update_instanced(transforms)
-        else:
-            # Fallback to individual updates if instancing not supported
-            for obj in group:
-                obj.update()
+
+    def _update_radii(self):
+        """ Convert the radius set of each visual's body to its semi-axes in dist_unit. """
+        self._radsets = np.array([axis_radii(self._agg_cache['radius'][name].to_value(self.dist_unit))
+                                  for name in self._body_names], dtype=np.float64)
+        self._radii = self._radsets.max(axis=1)
+
+    def _cull_bodies(self):
+        """
+            Decide which bodies are drawn this frame, in one vectorized pass over their bounding
+            spheres: a body is culled if it is small enough to be drawn as a marker (see
+            get_mark_data), beyond the draw distance, outside the view, or hidden behind a larger
+            nearer body. The planet of a culled body is hidden, and skips its transform and
+            texture updates.
+        """
+        if self._radii is None:
+            self._update_radii()
+
+        self._cam_dist = np.linalg.norm(self._bods_pos - np.asarray(self._curr_camera.center), axis=1)
+        in_view = self._present & (self._cam_dist <= self._optimization_settings['max_draw_distance'])
+        if self._mark_data is not None:
+            in_view &= self._mark_data['visible']
+        matrix = scene_matrix(self._scene.transform) if self._frustum_culling else None
+        if matrix is not None:
+            pix, pix_r, depth = project_spheres(self._bods_pos, self._radii, matrix)
+            in_view &= frustum_mask(pix, pix_r, depth, self._radii, self._view.size)
+            if self._optimization_settings['occlusion_culling']:
+                in_view &= ~occlusion_mask(pix, pix_r, depth, self._radii, in_view)
+
+        self._in_view = in_view
+        for n, name in enumerate(self._body_names):
+            self._planets[name].visible = bool(in_view[n])
 
     def _optimize_shaders(self):
         """Optimize and cache shaders"""
@@ -480,14 +563,39 @@ class StarSystemVisuals:
                     planet.texture.set_mipmap(self._mipmap_enabled)
                     planet.texture.resize(max_size=self._max_texture_size)
 
-    def update_vizz(self, agg_data):
-        """Update the visualization with performance monitoring"""
+    def update_vizz(self, agg_data=None):
+        """
+            Update the visualization with performance monitoring. The body states are read
+            from the StateRing each frame; agg_data only needs to hold the aggregated
+            field values that have changed (see SimSystem.get_agg_deltas).
+        """
         if not self._IS_INITIALIZED:
             return
-        
-        # Start frame timing
+
+        # Start frame timing, the frame ends once the canvas has drawn it (see _end_draw)
         self._perf_monitor.start_frame()
-        
+
+        if agg_data:
+            for f_id, values in agg_data.items():
+                self._agg_cache.setdefault(f_id, {}).update(values)
+            #   parent_name never changes for a body, so it only arrives again, for every body,
+            #   when the set of bodies of the model has changed
+            if 'parent_name' in agg_data:
+                self._agg_cache['parent_name'] = dict(agg_data['parent_name'])
+                self._rows_stale = True
+            if 'radius' in agg_data:
+                self._update_radii()
+                if self._use_instancing:
+                    self._inst_planets.set_radii(self._radsets)
+            if 'body_color' in agg_data or 'body_alpha' in agg_data:
+                self._colors_stale = True
+        self._read_states()
+        self._mark_data = self.get_mark_data()
+        self._symbol_sizes = np.where(self._present, self._mark_data['size'], 0)  # sizes by FOV of body
+        self._cull_bodies()
+        self._manage_lod()
+        self._upload_textures()
+
         # Start batch timing
         self._perf_monitor.start_batch()
         
@@ -499,65 +607,66 @@ class StarSystemVisuals:
         # End batch timing
         self._perf_monitor.end_batch()
         
-        # Start draw timing
-        self._perf_monitor.start_draw()
-        
         # Update remaining visual elements
-        self._last_t = self._curr_t
-        self._symbol_sizes = self.get_symb_sizes()  # update symbol sizes based upon FOV of body
-        _p_face_colors = []
-        # _c_face_colors = []
-        _edge_colors = []
-
-        self._agg_cache = agg_data
+        self._perf_monitor.start('transform_update')
 
-        self._new_states = self._buff0.buf
-        print(f"new_states.shape = {self._new_states.shape}")
-        pass
-        # self._bods_pos = list(self._agg_cache['pos'].values())
+        #   the surfaces of all the bodies are placed and oriented at once when instanced
+        if self._use_instancing:
+            axes = np.array([self._agg_cache['axes'][name] for name in self._body_names], dtype=np.float64)
+            self._inst_planets.set_states(self._bods_pos,
+                                          body_rotations(self._new_states[self._state_rows, 2], axes),
+                                          self._in_view,
+                                          lod=self._lod_levels,
+                                          )
 
         for n, sb_name in enumerate(self._body_names):                                                    # <--
+            row = self._state_rows[n]
+            if row < 0:                         # the body has left the model
+                if sb_name in self._tracks:
+                    self._tracks[sb_name].visible = False
+                continue
             x_ax = self._agg_cache['axes'][sb_name][0]
             y_ax = self._agg_cache['axes'][sb_name][1]
             z_ax = self._agg_cache['axes'][sb_name][2]
-            RA, DEC, W = self._new_states[n, :, 2]
+            RA, DEC, W = self._new_states[row, 2]
             # RA   = self._agg_cache['rot'][sb_name][0]
             # DEC  = self._agg_cache['rot'][sb_name][1]
             # W    = self._agg_cache['rot'][sb_name][2]
             # pos  = self._agg_cache['pos'][sb_name]
             pos = self._bods_pos[n]
-            parent = self._agg_cache['parent_name'][sb_name]
             is_primary = self._agg_cache['is_primary'][sb_name]
 
-            if self._planets[sb_name].visible:
+            if not self._use_instancing and self._planets[sb_name].visible:
                 xform = self._planets[sb_name].transform
                 xform.reset()
-                xform.rotate(W * np.pi / 180, z_ax)
-                xform.rotate(DEC * np.pi / 180, y_ax)
-                xform.rotate(RA * np.pi / 180, x_ax)
+                xform.scale(self._radsets[n])   # the planets share a unit sphere, see GeometryPool
+                xform.rotate(W, z_ax)           # MatrixTransform.rotate() takes degrees
+                xform.rotate(DEC, y_ax)
+                xform.rotate(RA, x_ax)
                 # if not is_primary:
                 #     xform.scale(_SCALE_FACTOR)
 
-                xform.translate(pos.value)
+                xform.translate(pos)
                 self._planets[sb_name].transform = xform
 
             if not is_primary:
                 self._tracks[sb_name].transform.reset()
-                self._tracks[sb_name].transform.translate(self._agg_cache['pos'][parent].value)
-
-            # TODO: these do not require updating unless they change...
-            _pf_clr = Color(self._agg_cache['body_color'][sb_name])
-            _pf_clr.alpha = self._agg_cache['body_alpha'][sb_name]
-            # _cf_clr = _pf_clr
-            _p_face_colors.append(_pf_clr)
-            # _c_face_colors.append(_cf_clr)
-
-        self._plnt_markers.set_data(pos=np.array(self._bods_pos),
-                                    face_color=ColorArray(_p_face_colors),
-                                    edge_color=Color([1, 0, 0, _pm_e_alpha]),
-                                    size=self._symbol_sizes,
-                                    symbol=self._symbols,
-                                    )
+                self._tracks[sb_name].transform.translate(self._abs_pos[self._parent_rows[row]])
+
+        self._perf_monitor.stop('transform_update')
+        self._perf_monitor.start('marker_upload')
+
+        #   the face colors only change when a body_color or body_alpha delta arrives
+        if self._colors_stale:
+            face_colors = self._face_colors()
+            self._marker_mgr.set_face_color(face_colors)
+            if self._use_instancing:
+                self._inst_planets.set_colors(face_colors)
+            self._colors_stale = False
+        self._marker_mgr.set_pos(self._bods_pos)
+        self._marker_mgr.set_size(self._symbol_sizes)
+        self._marker_mgr.flush()
+        self._perf_monitor.stop('marker_upload')
         # self._cntr_markers.set_data(pos=np.array(self._bods_pos),
         #                             face_color=ColorArray(_c_face_colors),
         #                             edge_color=[0, 1, 0, _cm_e_alpha],
@@ -565,54 +674,52 @@ class StarSystemVisuals:
         #                             symbol=['diamond' for _ in range(self._body_count)],                  # <--
         #                             )
         self._scene.update()
-        self._curr_t = time.perf_counter()
-        update_time = self._curr_t - self._last_t
-        print(f'Visuals updated in {update_time:.4f} seconds...')
-        logging.info("\nSYMBOL SIZES :\t%s", self._symbol_sizes)
-        logging.info("VISUAL UPDATE TIME :\t%s", update_time)
-        # logging.info("\nCAM_REL_DIST :\n%s", [np.linalg.norm(rel_pos) for rel_pos in self._pos_rel2cam])
+        _log.log(TRACE, "\nSYMBOL SIZES :\t%s", self._symbol_sizes)
+        # _log.log(TRACE, "\nCAM_REL_DIST :\n%s", [np.linalg.norm(rel_pos) for rel_pos in self._pos_rel2cam])
 
-    def get_symb_sizes(self, obs_cam=None):
+    def _face_colors(self):
+        """ The (N, 4) RGBA marker face color of each body from its body_color and body_alpha. """
+        rgba = np.array([Color(self._agg_cache['body_color'][name]).rgba for name in self._body_names])
+        rgba[:, 3] = [self._agg_cache['body_alpha'][name] for name in self._body_names]
+
+        return rgba
+
+    def get_mark_data(self, obs_cam=None):
         """
-            Calculates the s=ize in pixels at which a SimBody will appear in the view from
-            the perspective of a specified camera.
+            Calculates the size in pixels at which each SimBody appears in the view from the
+            perspective of a specified camera, in one pass over the position and radius arrays.
+
         Parameters
         ----------
         obs_cam :  A Camera object from which the apparent sizes are measured
 
         Returns
         -------
-        An np.array containing a pixel width for each SimBody
-
-        TODO: instead of only symbol sizes, include face and edge color, etc.
-                  Probably rename this method to 'get_mark_data(self, from_cam=None)'
+        dict    : pix_diam  np.ndarray(N,)  the apparent diameter of each body in pixels
+                  size      np.ndarray(N,)  the marker size of each body: MIN_SYMB_SIZE at least,
+                                            0 once the body is MAX_SYMB_SIZE across or more
+                  visible   np.ndarray(N,)  bool, whether the body is large enough that its
+                                            Planet is drawn in place of its marker
         """
         if not obs_cam:
             obs_cam = self._curr_camera
+        if self._radii is None:
+            self._update_radii()
 
-        symb_sizes = []
-        sb_name: str
-        for sb_name in self._body_names:                                                       # <--
-            body_fov = from_pos(obs_cam.center,
-                                self._agg_cache['pos'][sb_name].value,
-                                self._agg_cache['radius'][sb_name][0],
-                                )['fov']
-            pix_diam = 0
-            raw_diam = math.ceil(self._scene.parent.size[0] * body_fov / obs_cam.fov)                # <--
-
-            if raw_diam < MIN_SYMB_SIZE:
-                pix_diam = MIN_SYMB_SIZE
-            elif raw_diam < MAX_SYMB_SIZE:
-                pix_diam = raw_diam
-            elif raw_diam >= MAX_SYMB_SIZE:
-                pix_diam = 0
-                self._planets[sb_name].visible = True
-            else:
-                self._planets[sb_name].visible = False
+        dist = np.linalg.norm(self._bods_pos - np.asarray(obs_cam.center), axis=1)
+        with np.errstate(divide='ignore'):
+            body_fov = np.where(dist > 1e-09,
+                                np.degrees(2.0 * np.arctan2(self._radii, dist)),
+                                MIN_FOV)
+        pix_diam = np.ceil(self._scene.parent.size[0] * body_fov / max(obs_cam.fov, MIN_FOV))
+        visible = pix_diam >= MAX_SYMB_SIZE
+        size = np.where(visible, 0, np.maximum(pix_diam, MIN_SYMB_SIZE))
 
-            symb_sizes.append(pix_diam)
+        return dict(pix_diam=pix_diam, size=size, visible=visible)
 
-        return np.array(symb_sizes)
+    def get_symb_sizes(self, obs_cam=None):
+        """ The marker size of each SimBody, see get_mark_data. """
+        return self.get_mark_data(obs_cam)['size']
 
     @staticmethod
     def _check_simbods(simbods=None):
@@ -621,27 +728,44 @@ class StarSystemVisuals:
         """
         check = True
         if simbods is None:
-            print("Must provide a SimBody dict... FAILED")
+            _log.warning('must provide a SimBody dict')
             check = False
         elif type(simbods) is not dict:
-            print("must provide a dictionary of SimBody objects... FAILED")
+            _log.warning('must provide a dictionary of SimBody objects')
             check = False
         else:
             for key, val in simbods.items():
                 if type(val) is not SimBody:
-                    print(key, "is NOT a SimBody... FAILED.")
+                    _log.warning('%s is not a SimBody', key)
                     check = False
 
         return check
 
+    def body_pos(self, name):
+        """ The position of a body relative to the primary, from the last frame read. """
+        return self._bods_pos[self._body_names.index(name)]
+
+    def body_state(self, name):
+        """ The (3, 3) state of a body relative to its parent, from the last frame read. """
+        return self._new_states[self._state_rows[self._body_names.index(name)]].copy()
+
+    @property
+    def agg_cache(self):
+        """ The aggregated field values received from the model, {field_id: {body name: value}}. """
+        return self._agg_cache
+
     @property
     def bods_pos(self):
         return self._bods_pos
 
+    @property
+    def state_jd(self):
+        return self._state_jd
+
     @property
     def skymap(self):
         if self._skymap is None:
-            print("No SkyMap defined...")
+            _log.warning('no SkyMap defined')
         else:
             return self._skymap
 
@@ -650,7 +774,7 @@ class StarSystemVisuals:
         if type(new_skymap) is SkyMap:
             self._skymap = new_skymap
         else:
-            print("Must provide a SkyMap object...")
+            _log.warning('must provide a SkyMap object')
 
     @property
     def planets(self, name=None):
@@ -675,21 +799,19 @@ class StarSystemVisuals:
         if stats['fps'] < 30:
             self._batch_size = max(100, self._batch_size - 100)
             self._max_visible_objects = max(100, self._max_visible_objects - 100)
-            if hasattr(self, '_curr_camera'):
-                # Reduce LOD when performance is low
-                self._curr_camera.fov = min(90, self._curr_camera.fov + 5)
         elif stats['fps'] > 58:
             self._batch_size = min(2000, self._batch_size + 100)
             self._max_visible_objects = min(2000, self._max_visible_objects + 100)
-            if hasattr(self, '_curr_camera'):
-                # Restore LOD when performance is good
-                self._curr_camera.fov = max(MIN_FOV, self._curr_camera.fov - 1)
 
     def _on_performance_warning(self, warning):
         """Handle performance warnings"""
-        logging.warning(f"Performance warning: {warning}")
+        _log.warning("Performance warning: %s", warning)
+
+    def _start_draw(self, event=None):
+        # Start draw timing
+        self._perf_monitor.start_draw()
 
-    def _end_draw(self):
+    def _end_draw(self, event=None):
         # End draw timing
         self._perf_monitor.end_draw()
         
@@ -0,0 +1,144 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# texture_loader.py
+# This module loads planet textures off the GUI thread.
+# Requests go to a small pool of worker threads, which map the mip level of the width asked for
+# (see texture_mips), building the pyramid of the texture first if it has none, and decode the
+# file directly only if the pyramid cannot be written. Finished arrays wait in a queue
+# until the GUI thread polls for them and uploads a few per frame, so the window never blocks
+# on a texture and each planet shows its body color until its texture arrives.
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from sim_logging import get_logger
+from texture_mips import MipCache
+
+DEF_TEX_WORKERS  = max(1, min(4, (os.cpu_count() or 2) - 1))
+DEF_TEX_WIDTH    = 1024     # width of the textures decoded when the visuals are created
+TEX_UPLOADS_PER_FRAME = 2   # the most finished textures handed to the GUI thread per poll
+
+_log = get_logger(__name__)
+
+
+def decode_texture(fname, width=None):
+    """
+        Decode a texture file into an RGBA array, downscaled to a width.
+
+    Parameters
+    ----------
+    fname       : str       the image file
+    width       : int       the width to downscale to, keeping the aspect; None for full size
+
+    Returns
+    -------
+    np.ndarray(H, W, 4) of uint8
+    """
+    with Image.open(fname) as im:
+        if width and im.width > width:
+            im.draft('RGB', (width, im.height * width // im.width))     # cheap pre-scale, JPEG only
+            im = im.resize((width, max(1, round(im.height * width / im.width))),
+                           Image.Resampling.BOX)
+
+        return np.asarray(im.convert('RGBA'))
+
+
+class TextureLoader:
+    """
+        Loads textures on worker threads and hands them back to the thread that polls.
+        request() and poll() must both be called from the same (GUI) thread.
+    """
+    def __init__(self, num_workers=DEF_TEX_WORKERS, mips=None):
+        self._mips    = MipCache() if mips is None else mips
+        self._use_mip = True
+        self._pool    = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='tex_loader')
+        self._done    = queue.SimpleQueue()     # (key, width), future; filled by the workers
+        self._pending = {}                      # {(key, width): future} not yet polled
+
+    def request(self, key, fname, width=DEF_TEX_WIDTH):
+        """
+            Queue a texture for loading, unless the same one is already on its way.
+
+        Parameters
+        ----------
+        key         : str       what the texture is for, usually a body name
+        fname       : str       the image file
+        width       : int       the width to downscale to
+
+        Returns
+        -------
+        bool        : True if a new load was queued
+        """
+        if self._pool is None or (key, width) in self._pending:
+            return False
+
+        future = self._pool.submit(self._load, fname, width)
+        self._pending[(key, width)] = future
+        future.add_done_callback(lambda f, k=(key, width): self._done.put((k, f)))
+
+        return True
+
+    def _load(self, fname, width):
+        """ Runs on a worker: the mip level of a texture, or the decoded file as a fallback. """
+        if self._use_mip:
+            try:
+                return self._mips.level(fname, width)
+            except OSError as err:
+                _log.warning('decoding textures directly, cannot build mip levels: %s', err)
+                self._use_mip = False
+
+        return decode_texture(fname, width)
+
+    def poll(self, max_items=TEX_UPLOADS_PER_FRAME):
+        """
+            Collect the textures that have finished loading.
+
+        Parameters
+        ----------
+        max_items   : int       the most textures to return, None for all of them
+
+        Returns
+        -------
+        list of (key, width, np.ndarray)
+        """
+        ready = []
+        while max_items is None or len(ready) < max_items:
+            try:
+                (key, width), future = self._done.get_nowait()
+            except queue.Empty:
+                break
+
+            self._pending.pop((key, width), None)
+            if future.cancelled():
+                continue
+            if future.exception() is not None:
+                _log.warning('could not load the texture for %s: %s', key, future.exception())
+                continue
+
+            ready.append((key, width, future.result()))
+
+        return ready
+
+    def close(self):
+        """ Drop the queued requests and stop the workers. """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._pending.clear()
+
+    @property
+    def mips(self):
+        return self._mips
+
+    @property
+    def pending(self):
+        return len(self._pending)
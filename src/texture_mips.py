@@ -0,0 +1,168 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# texture_mips.py
+# This module keeps a mip pyramid of every texture on disk as raw RGBA arrays.
+# Each texture is decoded once and downscaled into the widths in MIP_WIDTHS, and each level is
+# saved as its own .npy file under data/tex_mips. At runtime the levels are memory-mapped, so
+# switching the level of detail of a texture is a lookup instead of a decode and a resample.
+# The file names carry a hash of the source file's path, size and mtime plus MIP_VERSION, so
+# an edited texture or a change of the format is never served from stale levels.
+# Run this module to build the pyramids of all the textures ahead of time.
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from sim_logging import get_logger, setup_logging
+
+MIP_VERSION   = 1
+MIP_WIDTHS    = (2048, 1024, 512, 256)
+MIP_CACHE_DIR = Path(__file__).resolve().parent.parent / 'data' / 'tex_mips'
+TEX_DIR       = Path(__file__).resolve().parent.parent / 'resources' / 'textures'
+
+_log = get_logger(__name__)
+
+
+def nearest_width(width, widths=MIP_WIDTHS):
+    """ The smallest level at least as wide as width, or the widest level. """
+    fits = [w for w in widths if w >= width]
+    return min(fits) if fits else max(widths)
+
+
+def mip_stem(fname):
+    """ The file name stem shared by the levels of a texture, see the module notes. """
+    path = Path(fname).resolve()
+    st = path.stat()
+    digest = hashlib.sha1(f'{MIP_VERSION}:{path}:{st.st_size}:{st.st_mtime_ns}'.encode()).hexdigest()[:12]
+
+    return f'{path.stem}_{digest}'
+
+
+def build_mips(fname, widths=MIP_WIDTHS, cache_dir=MIP_CACHE_DIR):
+    """
+        Decode a texture once and save every level of its pyramid, each downscaled from the
+        level above it. Levels wider than the source are saved at the source width.
+
+    Parameters
+    ----------
+    fname       : str       the image file
+    widths      : tuple     the widths of the levels
+    cache_dir   : Path      where to save the levels
+
+    Returns
+    -------
+    dict        : {width: path of the saved level}
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    stem = mip_stem(fname)
+    paths = {}
+    with Image.open(fname) as im:
+        level = im.convert('RGBA')
+
+    for width in sorted(widths, reverse=True):
+        if level.width > width:
+            level = level.resize((width, max(1, round(level.height * width / level.width))),
+                                 Image.Resampling.LANCZOS)
+
+        path = cache_dir / f'{stem}_{width}.npy'
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as f:
+            np.save(f, np.asarray(level))
+        os.replace(tmp, path)
+        paths[width] = path
+
+    return paths
+
+
+class MipCache:
+    """
+        The memory-mapped levels of the texture pyramids, built on first use when missing.
+        Levels may be asked for from several threads; only one pyramid is built at a time.
+    """
+    def __init__(self, cache_dir=MIP_CACHE_DIR, widths=MIP_WIDTHS):
+        self._dir    = Path(cache_dir)
+        self._widths = tuple(widths)
+        self._maps   = {}           # {(fname, width): np.memmap}
+        self._stems  = {}           # {fname: mip_stem(fname)}
+        self._lock   = threading.Lock()
+
+    def _stem(self, fname):
+        if fname not in self._stems:
+            self._stems[fname] = mip_stem(fname)
+        return self._stems[fname]
+
+    def mapped(self, fname, width):
+        """
+            A level that is already built, memory-mapped; this never decodes anything.
+
+        Returns
+        -------
+        np.ndarray(H, W, 4) of uint8, or None if the level has not been built
+        """
+        width = nearest_width(width, self._widths)
+        key = (fname, width)
+        if key not in self._maps:
+            try:
+                path = self._dir / f'{self._stem(fname)}_{width}.npy'
+                if not path.is_file():
+                    return None
+                self._maps[key] = np.load(path, mmap_mode='r')
+
+            except (OSError, ValueError) as err:
+                _log.warning('could not map the mip level %d of %s: %s', width, fname, err)
+                return None
+
+        return self._maps[key]
+
+    def level(self, fname, width):
+        """ A level of a texture, building its pyramid first if needed. """
+        level = self.mapped(fname, width)
+        if level is None:
+            with self._lock:
+                level = self.mapped(fname, width)       # another thread may have built it
+                if level is None:
+                    build_mips(fname, self._widths, self._dir)
+                    level = self.mapped(fname, width)
+
+        return level
+
+    def build_all(self, tex_dir=TEX_DIR):
+        """ Build the pyramid of every PNG texture in a directory that does not have one yet. """
+        for fname in sorted(Path(tex_dir).glob('*.png')):
+            if self.mapped(str(fname), self._widths[-1]) is None:
+                _log.info('building the mip levels of %s', fname.name)
+                build_mips(fname, self._widths, self._dir)
+
+    def prune(self):
+        """ Remove the levels that no current texture file maps to. """
+        if not self._dir.is_dir():
+            return
+
+        live = {mip_stem(f) for f in Path(TEX_DIR).glob('*.png')}
+        for path in self._dir.glob('*.npy'):
+            if path.stem.rsplit('_', 1)[0] not in live:
+                path.unlink(missing_ok=True)
+
+    @property
+    def widths(self):
+        return self._widths
+
+
+if __name__ == "__main__":
+    def main():
+        setup_logging(level='INFO', console=True)
+        mips = MipCache()
+        mips.build_all()
+        mips.prune()
+
+    main()
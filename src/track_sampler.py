@@ -0,0 +1,136 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# track_sampler.py
+# This module samples orbit tracks with an adaptive point density.
+# Each step is sized so that neither the velocity (the tangent of the track) nor the true
+# anomaly turns by more than max_turn, which puts the points where the track bends and packs
+# them around periapsis, where an even spacing in time leaves the fewest. The step is first
+# estimated from the turn rates at the last point, then halved until the turns actually made
+# between the two points are within max_turn, since on a highly eccentric orbit the rates at
+# apoapsis say nothing of the periapsis passage a long step would jump over. A near-circular
+# orbit needs about 2*pi / max_turn points.
+import numpy as np
+
+from sim_propagator import UV_ALPHA_EPS, kepler_uv
+
+TRACK_MAX_TURN    = np.radians(2.0)     # largest turn of the tangent or true anomaly per step
+TRACK_MAX_POINTS  = 720                 # cap on the points in one track
+TRACK_MAX_HALVING = 40                  # most times one step is halved to meet max_turn
+TRACK_MAX_STEP    = 0.25                # longest step as a fraction of the period
+TRACK_TURN_RTOL   = 1.0e-6              # round-off allowed on max_turn before a step is halved
+OPEN_TRACK_RADIUS = 4.0                 # open tracks reach out to this multiple of |r0|
+
+
+def orbit_period(r0, v0, mu):
+    """ The period in seconds of the orbit through (r0, v0), or None if it is not closed. """
+    r_mag = np.linalg.norm(r0)
+    alpha = 2.0 / r_mag - np.dot(v0, v0) / mu
+    if alpha * r_mag <= UV_ALPHA_EPS:
+        return None
+
+    return 2.0 * np.pi / np.sqrt(mu * alpha ** 3)
+
+
+def turn_angle(a, b):
+    """ The angle in radians between two vectors, in [0, pi]. """
+    return np.arctan2(np.linalg.norm(np.cross(a, b)), np.dot(a, b))
+
+
+def track_points(r0, v0, mu, t_end=None, r_max=None,
+                 max_turn=TRACK_MAX_TURN, max_points=TRACK_MAX_POINTS):
+    """
+        Generate the points of a track, starting at r0 and moving along the orbit in steps
+        sized by the turns of the velocity and the true anomaly. Each point is propagated from
+        (r0, v0) so that no error builds up along the track.
+
+    Parameters
+    ----------
+    r0, v0      : np.ndarray(3,)    the starting state (km, km/s)
+    mu          : float             gravitational parameter of the attractor (km^3/s^2)
+    t_end       : float             seconds of flight at which to stop, negative to run backward.
+                                    Defaults to one revolution of a closed orbit, or to no limit
+                                    for an open orbit, which then needs r_max
+    r_max       : float             stop after the first point further out than this (km)
+    max_turn    : float             largest turn of either angle between two points (radians)
+    max_points  : int               the most points to generate
+
+    Yields
+    ------
+    (float, np.ndarray(3,))     : the seconds of flight and position (km) of each point
+    """
+    r0 = np.asarray(r0, dtype=np.float64)
+    v0 = np.asarray(v0, dtype=np.float64)
+    if t_end is None:
+        t_end = orbit_period(r0, v0, mu)
+        if t_end is None:
+            if r_max is None:
+                raise ValueError('>>>ERROR: the track of an open orbit needs t_end or r_max.')
+            t_end = np.inf
+
+    period = orbit_period(r0, v0, mu)
+    sign = 1.0 if t_end >= 0 else -1.0
+    t, r, v = 0.0, r0, v0
+    yield t, r
+
+    for _ in range(max_points - 1):
+        if t == t_end:
+            return
+
+        r_mag = np.linalg.norm(r)
+        v_sq = np.dot(v, v)
+        #   the turn rates of the velocity (the tangent) and of the radius (the true anomaly)
+        omega = max(np.linalg.norm(np.cross(v, mu * r / r_mag ** 3)) / v_sq,
+                    np.linalg.norm(np.cross(r, v)) / r_mag ** 2)
+        if omega > 0:
+            step = max_turn / omega
+        else:                                       # a radial trajectory does not turn
+            step = max_turn * r_mag / np.sqrt(v_sq)
+        if period is not None:
+            step = min(step, TRACK_MAX_STEP * period)
+
+        for _ in range(TRACK_MAX_HALVING):
+            t_n = t + sign * step
+            if sign * (t_n - t_end) > 0:
+                t_n = t_end
+
+            r_n, v_n = kepler_uv(r0, v0, mu, t_n)
+            r_n, v_n = r_n[0], v_n[0]
+            if max(turn_angle(r, r_n), turn_angle(v, v_n)) <= max_turn * (1.0 + TRACK_TURN_RTOL):
+                break
+            step *= 0.5
+
+        t, r, v = t_n, r_n, v_n
+        yield t, r
+
+        if r_max is not None and np.linalg.norm(r) > r_max:
+            return
+
+
+def sample_track(r0, v0, mu, max_turn=TRACK_MAX_TURN, max_points=TRACK_MAX_POINTS):
+    """
+        Sample a whole track: one revolution of a closed orbit, or the inbound and outbound
+        legs of an open orbit out to OPEN_TRACK_RADIUS times the starting distance.
+
+    Returns
+    -------
+    np.ndarray(M, 3)    : positions (km), M <= max_points
+    """
+    if orbit_period(r0, v0, mu) is not None:
+        return np.array([r for _, r in track_points(r0, v0, mu, max_turn=max_turn,
+                                                    max_points=max_points)])
+
+    r_max = OPEN_TRACK_RADIUS * np.linalg.norm(r0)
+    half = max_points // 2
+    inbound = [r for _, r in track_points(r0, v0, mu, t_end=-np.inf, r_max=r_max,
+                                          max_turn=max_turn, max_points=half)]
+    outbound = [r for _, r in track_points(r0, v0, mu, r_max=r_max,
+                                           max_turn=max_turn, max_points=max_points - half)]
+
+    return np.array(inbound[:0:-1] + outbound)
+
@@ -0,0 +1,147 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# view_culling.py
+# This module decides which bodies are worth drawing from the current camera.
+# The bounding sphere of every body is projected through the 4x4 matrix that maps the scene
+# into the pixels of the view, all bodies in one matrix product, giving the center and radius
+# of each sphere on screen. A body is culled when its disc misses the view, when it is smaller
+# than a pixel, or when it sits wholly behind a nearer body whose disc covers it.
+# Matrices follow the vispy convention of row vectors: p_view = [x, y, z, 1] @ matrix.
+import numpy as np
+from vispy.visuals.transforms import ChainTransform, NullTransform
+from vispy.visuals.transforms.base_transform import InverseTransform
+
+CULL_MIN_PIX   = 0.5        # bodies with a smaller radius on screen are culled (pixels)
+OCCLUDER_PIX   = 8.0        # only bodies at least this large on screen are tested as occluders
+
+
+def scene_matrix(transform):
+    """
+        The 4x4 matrix of a vispy transform from the scene to the pixels of a view,
+        such as ViewBox.scene.transform. The transform of a perspective camera is a dynamic
+        chain, which vispy never collapses into one matrix, so the matrices of its parts are
+        multiplied here in the order the chain maps through them, its last transform first.
+
+    Returns
+    -------
+    np.ndarray(4, 4), or None if the transform is not linear
+    """
+    if not transform.Linear:
+        return None
+
+    if isinstance(transform, ChainTransform):
+        matrix = np.eye(4)
+        for part in reversed(transform.simplified.transforms):
+            part_matrix = scene_matrix(part)
+            if part_matrix is None:
+                return None
+            matrix = matrix @ part_matrix
+        return matrix
+
+    if isinstance(transform, InverseTransform):
+        matrix = scene_matrix(transform.inverse)
+        return None if matrix is None else np.linalg.inv(matrix)
+
+    if isinstance(transform, NullTransform):
+        return np.eye(4)
+
+    if hasattr(transform, 'as_matrix'):
+        transform = transform.as_matrix()
+
+    try:
+        return np.asarray(transform.matrix, dtype=np.float64)
+    except AttributeError:
+        return None
+
+
+def project_spheres(centers, radii, matrix):
+    """
+        Project bounding spheres into the view.
+        The center and one point on each of three axes of every sphere are mapped together,
+        and the radius on screen is the largest distance of those points from the center.
+
+    Parameters
+    ----------
+    centers     : np.ndarray(N, 3)  the sphere centers in scene coordinates
+    radii       : np.ndarray(N,)    the sphere radii in scene units
+    matrix      : np.ndarray(4, 4)  scene to view pixels, see scene_matrix
+
+    Returns
+    -------
+    pix         : np.ndarray(N, 2)  the centers on screen (pixels)
+    pix_r       : np.ndarray(N,)    the radii on screen (pixels)
+    depth       : np.ndarray(N,)    the homogeneous w of each center, positive in front of the camera
+    """
+    count = len(centers)
+    pts = np.empty((count, 4, 4), dtype=np.float64)
+    pts[:, :, :3] = centers[:, None, :]
+    pts[:, 1:, :3] += radii[:, None, None] * np.eye(3)
+    pts[:, :, 3] = 1.0
+    mapped = pts @ matrix
+    depth = mapped[:, 0, 3]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scr = mapped[:, :, :2] / mapped[:, :, 3:]
+    pix = scr[:, 0]
+    pix_r = np.max(np.linalg.norm(scr[:, 1:] - pix[:, None], axis=2), axis=1)
+
+    return pix, pix_r, depth
+
+
+def frustum_mask(pix, pix_r, depth, radii, view_size, min_pix=CULL_MIN_PIX):
+    """
+        Which spheres show at least min_pix of radius inside the view.
+        A sphere around or just behind the camera is always kept.
+
+    Parameters
+    ----------
+    pix, pix_r, depth   : see project_spheres
+    radii               : np.ndarray(N,)    the sphere radii in scene units
+    view_size           : (float, float)    width and height of the view (pixels)
+
+    Returns
+    -------
+    np.ndarray(N,) of bool
+    """
+    near = np.abs(depth) <= radii
+    with np.errstate(invalid='ignore'):
+        inside = ((pix[:, 0] + pix_r >= 0) & (pix[:, 0] - pix_r <= view_size[0]) &
+                  (pix[:, 1] + pix_r >= 0) & (pix[:, 1] - pix_r <= view_size[1]) &
+                  (pix_r >= min_pix))
+
+    return near | ((depth > 0) & inside)
+
+
+def occlusion_mask(pix, pix_r, depth, radii, candidates, min_occluder=OCCLUDER_PIX):
+    """
+        Which spheres are hidden by a nearer sphere whose disc on screen covers theirs.
+        This is conservative: spheres that are only partly covered are never hidden.
+
+    Parameters
+    ----------
+    pix, pix_r, depth   : see project_spheres
+    radii               : np.ndarray(N,)    the sphere radii in scene units
+    candidates          : np.ndarray(N,)    bool, the spheres still in view
+    min_occluder        : float             the smallest radius on screen of an occluder (pixels)
+
+    Returns
+    -------
+    np.ndarray(N,) of bool  : True where a sphere is occluded
+    """
+    hidden = np.zeros(len(pix), dtype=bool)
+    occ = np.nonzero(candidates & (pix_r >= min_occluder) & (depth > radii))[0]
+    if not len(occ):
+        return hidden
+
+    #   (K occluders, N spheres): wholly beyond the far side and inside the disc of the occluder
+    behind = (depth[None, :] - radii[None, :]) > (depth[occ, None] + radii[occ, None])
+    gap = np.linalg.norm(pix[None, :, :] - pix[occ, None, :], axis=2)
+    covered = gap + pix_r[None, :] <= pix_r[occ, None]
+    hidden = np.any(behind & covered, axis=0) & candidates
+
+    return hidden
@@ -0,0 +1,36 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# test_datastore.py
+# sphere_mesh() over a body radius set (R, R_mean, R_polar), which must give an oblate spheroid
+# with R along both x and y, not a triaxial ellipsoid with R_mean along y.
+import numpy as np
+import pytest
+
+from datastore import axis_radii, sphere_mesh
+
+RAD_SET = (71492.0, 69911.0, 66854.0)       # Jupiter's R, R_mean and R_polar (km)
+
+
+def test_axis_radii():
+    assert axis_radii(RAD_SET) == pytest.approx((71492.0, 71492.0, 66854.0))
+    assert axis_radii(2.0) == pytest.approx((2.0, 2.0, 2.0))
+
+
+@pytest.mark.parametrize('offset', [False, True])
+def test_sphere_mesh_oblate(offset):
+    R, _, R_p = RAD_SET
+    mesh = sphere_mesh(12, radius=RAD_SET, offset=offset)
+    verts = mesh['verts'].astype(np.float64)
+
+    #   every vertex lies on the spheroid with R along x and y and R_polar along z
+    assert np.sum((verts[:, :2] / R) ** 2, axis=1) + (verts[:, 2] / R_p) ** 2 == pytest.approx(1.0, rel=1e-5)
+    assert np.abs(verts[:, 0]).max() == pytest.approx(R, rel=1e-6)
+    assert np.abs(verts[:, 1]).max() == pytest.approx(R, rel=1e-6)
+    assert np.abs(verts[:, 2]).max() == pytest.approx(R_p, rel=1e-6)
+    assert np.linalg.norm(mesh['norms'], axis=1) == pytest.approx(1.0, rel=1e-5)
@@ -0,0 +1,67 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# test_sim_propagator.py
+# kepler_uv() against the analytic solution of Kepler's equation, for highly eccentric orbits
+# where an unguarded Newton iteration on the universal anomaly diverges.
+import numpy as np
+import pytest
+
+from sim_propagator import BATCH_RTOL, kepler_uv
+
+MU  = 398600.4418       # km^3/s^2
+SMA = 7.0e4             # km
+
+
+def apsis_state(ecc, apoapsis):
+    """ The state at periapsis or apoapsis of an orbit in the xy plane, and its mean anomaly. """
+    if apoapsis:
+        r = SMA * (1.0 + ecc)
+        return np.array([-r, 0.0, 0.0]), np.array([0.0, -np.sqrt(MU * (2.0 / r - 1.0 / SMA)), 0.0]), np.pi
+    r = SMA * (1.0 - ecc)
+    return np.array([r, 0.0, 0.0]), np.array([0.0, np.sqrt(MU * (2.0 / r - 1.0 / SMA)), 0.0]), 0.0
+
+
+def kepler_radius(ecc, M):
+    """ |r| from Kepler's equation, solved by bisection over each revolution. """
+    M = np.mod(M, 2.0 * np.pi)
+    lo, hi = np.zeros_like(M), np.full_like(M, 2.0 * np.pi)
+    for _ in range(100):
+        E = 0.5 * (lo + hi)
+        low = E - ecc * np.sin(E) < M
+        lo, hi = np.where(low, E, lo), np.where(low, hi, E)
+    return SMA * (1.0 - ecc * np.cos(0.5 * (lo + hi)))
+
+
+@pytest.mark.parametrize('apoapsis', (False, True))
+@pytest.mark.parametrize('ecc', (0.9, 0.97, 0.99, 0.995))
+def test_kepler_uv_high_eccentricity(ecc, apoapsis):
+    r0, v0, M0 = apsis_state(ecc, apoapsis)
+    period = 2.0 * np.pi * np.sqrt(SMA ** 3 / MU)
+    t = np.linspace(0.01, 0.99, 99) * period
+    t = np.concatenate((t, -t, t + 7.0 * period))
+
+    r, v = kepler_uv(r0, v0, MU, t[None, :])
+    r_mag = np.linalg.norm(r[0], axis=1)
+    energy = 0.5 * np.einsum('ij,ij->i', v[0], v[0]) - MU / r_mag
+
+    expect = kepler_radius(ecc, M0 + 2.0 * np.pi * t / period)
+    np.testing.assert_allclose(r_mag, expect, rtol=BATCH_RTOL)
+    np.testing.assert_allclose(energy, -MU / (2.0 * SMA), rtol=BATCH_RTOL)
+
+
+@pytest.mark.parametrize('speed', (np.sqrt(2.0 * MU / 7.0e3), 12.0))
+def test_kepler_uv_open_orbits(speed):
+    """ Parabolic and hyperbolic orbits, forward and backward, keep their energy and momentum. """
+    r0, v0 = np.array([7.0e3, 0.0, 0.0]), np.array([0.0, speed, 0.0])
+    t = np.array([[-1e6, -100.0, 0.0, 1.0, 100.0, 1e5, 1e7]])
+
+    r, v = kepler_uv(r0, v0, MU, t)
+    energy = 0.5 * np.einsum('ij,ij->i', v[0], v[0]) - MU / np.linalg.norm(r[0], axis=1)
+    np.testing.assert_allclose(energy, 0.5 * speed ** 2 - MU / 7.0e3, atol=1e-9 * MU / 7.0e3)
+    np.testing.assert_allclose(np.cross(r[0], v[0])[:, 2], 7.0e3 * speed, rtol=BATCH_RTOL)
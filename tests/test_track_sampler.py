@@ -0,0 +1,50 @@
+#  Copyright <YEAR> <COPYRIGHT HOLDER>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# test_track_sampler.py
+# The sampled tracks of highly eccentric orbits, which must reach periapsis and keep every
+# turn between two points within max_turn wherever the track starts.
+import numpy as np
+import pytest
+
+from track_sampler import TRACK_MAX_POINTS, TRACK_MAX_TURN, sample_track
+
+MU  = 398600.4418       # km^3/s^2
+SMA = 7.0e4             # km
+
+
+@pytest.mark.parametrize('apoapsis', [False, True])
+@pytest.mark.parametrize('ecc', [0.0, 0.9, 0.97, 0.99, 0.995])
+def test_sample_track_eccentric(ecc, apoapsis):
+    r_p, r_a = SMA * (1.0 - ecc), SMA * (1.0 + ecc)
+    r = r_a if apoapsis else r_p
+    side = -1.0 if apoapsis else 1.0
+    r0 = np.array([side * r, 0.0, 0.0])
+    v0 = np.array([0.0, side * np.sqrt(MU * (2.0 / r - 1.0 / SMA)), 0.0])
+
+    track = sample_track(r0, v0, MU)
+    r_mag = np.linalg.norm(track, axis=1)
+    theta = np.unwrap(np.arctan2(track[:, 1], track[:, 0]))
+
+    assert len(track) <= TRACK_MAX_POINTS
+    assert np.all(r_mag <= r_a * (1.0 + 1e-6))
+    assert r_mag.min() == pytest.approx(r_p, rel=1e-3)
+    assert theta[-1] - theta[0] == pytest.approx(2.0 * np.pi)
+    assert np.abs(np.diff(theta)).max() <= TRACK_MAX_TURN * (1.0 + 1e-6)
+
+
+def test_sample_track_hyperbolic():
+    r0 = np.array([7000.0, 0.0, 0.0])
+    v0 = np.array([0.0, 1.5 * np.sqrt(2.0 * MU / 7000.0), 0.0])
+
+    track = sample_track(r0, v0, MU)
+    theta = np.arctan2(track[:, 1], track[:, 0])
+
+    assert np.linalg.norm(track, axis=1).min() == pytest.approx(7000.0)
+    assert np.all(np.diff(theta) > 0)
+    assert np.abs(np.diff(theta)).max() <= TRACK_MAX_TURN * (1.0 + 1e-6)